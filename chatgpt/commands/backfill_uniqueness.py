@@ -0,0 +1,113 @@
+import argparse
+import json
+import os
+
+import vana
+from chatgpt.nodes.base_node import BaseNode
+from chatgpt.nodes.validator import transform_file_data
+from chatgpt.utils.backfill import UniquenessBackfill
+from chatgpt.utils.batch_reads import BatchReader
+from chatgpt.utils.fingerprint import FingerprintIndex, get_backfill_dir, get_index_dir
+from chatgpt.utils.minhash import ConversationIndex
+from vana.commands.base_command import BaseCommand
+
+
+class BackfillUniquenessCommand(BaseCommand):
+    """
+    Adds the files already on the DLP contract to the uniqueness indexes of this validator.
+
+    A newly deployed validator starts with empty indexes, so it cannot tell whether a file repeats one that was
+    added before it started. This command downloads and decrypts past files and fingerprints them into
+    ``OD_FINGERPRINT_INDEX_DIR``/backfill, which the validator searches along with its own index. It can run while
+    the validator is running.
+
+    Only files the contract marks as valid are indexed. Progress is checkpointed, so an interrupted backfill continues
+    where it stopped when run again, after retrying the files that failed.
+
+    Optional arguments:
+        - ``--start_file_id`` (int): The first file to backfill. Defaults to 1.
+        - ``--end_file_id`` (int): The last file to backfill. Defaults to the last file on the contract.
+        - ``--workers`` (int): Files downloaded and fingerprinted at the same time.
+        - ``--files_per_second`` (float): Maximum files started per second, 0 for no limit.
+        - ``--restart``: Ignore the checkpoint of a previous run, including the files that failed.
+
+    Example usage::
+
+        ./vanacli dlp backfill_uniqueness --workers=2 --files_per_second=0.5
+    """
+
+    def run(cli: "vana.cli"):
+        """
+        Backfills the uniqueness indexes with the files on the DLP contract
+        :arg cli: The CLI object
+        """
+        config = BaseNode.config()
+        config.dlp.contract = BaseNode.setup_config(config)
+        chain_manager = vana.ChainManager(config=config)
+
+        with open(config.dlp.abi_path) as f:
+            dlp_contract = chain_manager.web3.eth.contract(address=config.dlp.contract, abi=json.load(f))
+
+        end_file_id = cli.config.end_file_id or chain_manager.read_contract_fn(dlp_contract.functions.filesCount())
+        backfill_dir = get_backfill_dir()
+        # Files the validator already indexed itself are skipped
+        fingerprint_index = FingerprintIndex(backfill_dir, extra_directories=[get_index_dir()])
+        conversation_index = ConversationIndex(backfill_dir, extra_directories=[get_index_dir()])
+        backfill = UniquenessBackfill(
+            BatchReader(chain_manager), dlp_contract, transform_file_data, fingerprint_index, conversation_index,
+            checkpoint_path=os.path.join(backfill_dir, "backfill-checkpoint.json"),
+            workers=cli.config.workers,
+            files_per_second=cli.config.files_per_second or None,
+        )
+        try:
+            backfill.run(end_file_id, first_file_id=cli.config.start_file_id, resume=not cli.config.restart)
+        finally:
+            fingerprint_index.close()
+            conversation_index.close()
+        vana.logging.info(f"Backfilled {backfill.indexed} files into {backfill_dir}, {backfill.skipped} were "
+                          f"already indexed, {backfill.not_valid} were not valid and {len(backfill.failed)} failed")
+
+    @staticmethod
+    def check_config(config: "vana.Config"):
+        pass
+
+    @staticmethod
+    def add_args(parser: argparse.ArgumentParser):
+        backfill_parser = parser.add_parser(
+            "backfill_uniqueness", help="""Adds the files already on the DLP contract to the uniqueness indexes"""
+        )
+        backfill_parser.add_argument(
+            "--start_file_id",
+            type=int,
+            required=False,
+            default=1,
+            help="""The first file to backfill.""",
+        )
+        backfill_parser.add_argument(
+            "--end_file_id",
+            type=int,
+            required=False,
+            default=None,
+            help="""The last file to backfill, the last file on the contract by default.""",
+        )
+        backfill_parser.add_argument(
+            "--workers",
+            type=int,
+            required=False,
+            default=4,
+            help="""Files downloaded and fingerprinted at the same time.""",
+        )
+        backfill_parser.add_argument(
+            "--files_per_second",
+            type=float,
+            required=False,
+            default=1,
+            help="""Maximum files started per second, so that a validator on the same host is not starved. 0 for
+            no limit.""",
+        )
+        backfill_parser.add_argument(
+            "--restart",
+            action="store_true",
+            default=False,
+            help="""Ignore the checkpoint of a previous run and start over.""",
+        )
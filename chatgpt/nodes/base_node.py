@@ -19,11 +19,18 @@ import chatgpt
 import copy
 import json
 import os
+import threading
 import vana
 from abc import ABC, abstractmethod
+from chatgpt.utils.batch_reads import BatchReader
+from chatgpt.utils.block_clock import BlockClock
 from chatgpt.utils.config import check_config, add_args, config
 from chatgpt.utils.misc import ttl_get_block
-from chatgpt.utils.validator import as_wad
+from chatgpt.utils.providers import ProviderPool
+from chatgpt.utils.transactions import TransactionManager
+from chatgpt.utils.validator import as_wad, from_wad
+from chatgpt.utils.validator_registry import ValidatorRegistry
+from chatgpt.utils.weights import WeightPublisher
 
 
 class BaseNode(ABC):
@@ -49,9 +56,11 @@ class BaseNode(ABC):
 
     wallet: vana.Wallet
 
+    block_clock: BlockClock = None
+
     @property
     def block(self):
-        return ttl_get_block(self)
+        return self.block_clock.block if self.block_clock else ttl_get_block(self)
 
     @staticmethod
     def setup_config(config: vana.Config):
@@ -88,17 +97,49 @@ class BaseNode(ABC):
 
         self.last_synced_block = None
 
+        # Set by the block clock when an epoch or tempo boundary is crossed, consumed by sync()
+        self.resync_due = threading.Event()
+        self.weights_due = threading.Event()
+
+        # Guards the state's weights, which background services read and update concurrently
+        self.state_lock = threading.RLock()
+
         # TODO: this try-except block was added mindlessly to prevent crashes and may need to be refactored
         try:
             self.wallet = vana.Wallet(config=self.config)
             self.chain_manager = vana.ChainManager(config=self.config)
+            self.chain_manager.web3.provider = ProviderPool(
+                [self.chain_manager.config.chain.chain_endpoint, *(self.config.node.rpc_endpoints or [])],
+                rate_limit=self.config.node.rpc_rate_limit,
+            )
             self.state = self.chain_manager.state(self.config.dlpuid) if self.chain_manager else None
+            self.tx_manager = TransactionManager(
+                self.chain_manager,
+                self.wallet.hotkey,
+                replace_after=self.config.node.tx_replace_after,
+                max_pending=self.config.node.max_pending_transactions,
+            )
+            self.tx_manager.start()
+            self.batch_reader = BatchReader(self.chain_manager, batch_size=self.config.node.rpc_batch_size)
+
+            self.weight_publisher = WeightPublisher(
+                threshold=self.config.dlp.weights_threshold,
+                max_interval=self.config.dlp.weights_max_interval,
+                partial=self.config.dlp.partial_weights,
+            )
+
+            self.block_clock = BlockClock(self.chain_manager)
+            self.block_clock.every(self.config.node.epoch_length, lambda block: self.resync_due.set())
+            self.block_clock.every(self.config.dlp.tempo, lambda block: self.weights_due.set())
+            self.block_clock.start()
 
             with open(self.config.dlp.abi_path) as f:
                 self.dlp_contract = self.chain_manager.web3.eth.contract(
                     address=self.config.dlp.contract,
                     abi=json.load(f)
                 )
+            self.validator_registry = ValidatorRegistry(self.chain_manager, self.dlp_contract,
+                                                        ttl=self.config.node.validator_cache_ttl)
 
             with open(self.config.dlp.token_abi_path) as f:
                 self.dlp_token_contract = self.chain_manager.web3.eth.contract(
@@ -114,6 +155,7 @@ class BaseNode(ABC):
 
                 # Check if the validator is registered on the network before proceeding further.
                 self.check_registered()
+                self.load_published_weights()
 
                 vana.logging.info(
                     f"Running node on data liquidity pool: {self.config.dlpuid} with hotkey {self.wallet.hotkey.address} using network: {self.chain_manager.config.chain.chain_endpoint}")
@@ -145,39 +187,70 @@ class BaseNode(ABC):
         Wrapper for synchronizing the state of the network for the given miner or validator.
         """
         if self.chain_manager:
-            current_block = self.block
-            if self.last_synced_block == current_block:
-                vana.logging.info(f"Sync already performed for block {current_block}. Skipping.")
-                return
+            self.sync_state()
+            self.sync_weights()
 
-            self.last_synced_block = current_block
+    def sync_state(self):
+        """
+        Checks the node's registration and re-syncs the state once per epoch.
+        """
+        current_block = self.block
+        if self.last_synced_block == current_block:
+            vana.logging.info(f"Sync already performed for block {current_block}. Skipping.")
+            return
 
-            # Ensure validator hotkey is still registered on the network.
-            self.check_registered()
+        self.last_synced_block = current_block
 
-            if current_block % self.config.node.epoch_length == 0:
+        # Ensure validator hotkey is still registered on the network.
+        self.check_registered()
+
+        if self.resync_due.is_set():
+            self.resync_due.clear()
+            with self.state_lock:
                 self.resync_state()
                 self.state.save()
 
-            if current_block % self.config.dlp.tempo == 0:
-                self.save_weights()
+    def sync_weights(self):
+        """
+        Writes the weights on-chain once per tempo.
+        """
+        if self.weights_due.is_set():
+            self.weights_due.clear()
+            self.save_weights()
 
     def save_weights(self):
         """
         Save the weights of all validators to the chain.
         """
-        self.state.weights[self.wallet.hotkey.address] = 1.0  # The current node always has a weight of 1
-        vana.logging.info(f"Writing weights on-chain: {self.state.weights}")
-        update_weights_fn = self.dlp_contract.functions.updateWeights(
-            list(self.state.weights.keys()),
-            [as_wad(weight) for weight in self.state.weights.values()]
-        )
-        self.chain_manager.send_transaction(update_weights_fn, self.wallet.hotkey)
+        with self.state_lock:
+            self.state.weights[self.wallet.hotkey.address] = 1.0  # The current node always has a weight of 1
+            weights = dict(self.state.weights)
+        current_block = self.block
+        if not self.weight_publisher.should_publish(weights, current_block):
+            vana.logging.debug("Weights have not changed enough since the last update, not writing them on-chain")
+            return
+
+        validators, values = self.weight_publisher.payload(weights)
+        vana.logging.info(f"Writing weights on-chain: {dict(zip(validators, values))}")
+        update_weights_fn = self.dlp_contract.functions.updateWeights(validators, [as_wad(weight) for weight in values])
+        self.weight_publisher.started(weights, current_block)
+        tx = self.tx_manager.submit(update_weights_fn,
+                                    on_receipt=lambda tx: self.weight_publisher.finished(tx.succeeded))
+        if tx is None:
+            self.weight_publisher.finished(False)
+
+    def load_published_weights(self):
+        """
+        Reads the weights this node last wrote on-chain, so that unchanged weights are not sent again after a restart.
+        """
+        published = self.chain_manager.read_contract_fn(
+            self.dlp_contract.functions.validatorWeights(self.wallet.hotkey.address))
+        if published:
+            validators, weights = published
+            self.weight_publisher.load(validators, [from_wad(weight) for weight in weights], self.block)
 
     def check_registered(self):
-        validator_count = self.chain_manager.read_contract_fn(self.dlp_contract.functions.activeValidatorsListsCount())
-        active_validator_addresses: list[str] = self.chain_manager.read_contract_fn(
-            self.dlp_contract.functions.activeValidatorsLists(validator_count))
+        active_validator_addresses: list[str] = self.validator_registry.validators()
         self.state.set_hotkeys(active_validator_addresses)
 
         if not active_validator_addresses.__contains__(self.wallet.hotkey.address):
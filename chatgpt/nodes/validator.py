@@ -18,28 +18,39 @@
 import sys
 import argparse
 import asyncio
+import collections
+import functools
+import hashlib
+import os
+import shutil
 import threading
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import vana
 from chatgpt.nodes.base_node import BaseNode
 from chatgpt.utils.config import add_validator_args
-from chatgpt.utils.proof_of_contribution import proof_of_contribution
+from chatgpt.utils.deadlines import CancelToken, StageTimeout, run_stage
+from chatgpt.utils.events import ContractEventFollower
+from chatgpt.utils.file_cache import FileRecordCache
+from chatgpt.utils.file_discovery import FileDiscovery
+from chatgpt.models.contribution import Contribution
+from chatgpt.utils.journal import FileProcessingJournal, StateJournal
+from chatgpt.utils.metrics import FILES, QUEUE_DEPTH, MetricsServer
+from chatgpt.utils.peer_scoring import PeerScoringQueue, PeerScoringTask
+from chatgpt.utils.proof_of_contribution import decrypt_file, download_file, score_file
+from chatgpt.utils.result_cache import ResultCache, sha256_file
+from chatgpt.utils.runtime import ServiceRunner
+from chatgpt.utils.scheduling import (LARGE_LANE, SMALL_LANE, DeadlineScheduler, ProcessingTimeEstimator,
+                                      probe_file_size)
+from chatgpt.utils.scoring import PerformanceBatch, exponential_moving_average, mean_by_group
+from chatgpt.utils.tracing import SpanExporter, Tracer, span
 from chatgpt.utils.validator import as_wad
-from dataclasses import dataclass, field
-from traceback import print_exception
-from typing import Dict, List, Any, Tuple
+from typing import Dict, List, Any, Callable, Tuple
+from vana.state import get_save_dir
 import time
 
 
-@dataclass
-class PeerScoringTask:
-    file_id: int
-    active_validators: List[str]
-    own_submission: Dict[str, Any]
-    added_at_block: int
-    processed_validators: List[str] = field(default_factory=list)
-
-
 def transform_tuple(data_tuple: Tuple[Any, ...], field_specs: List[Tuple[str, bool]]) -> Dict[str, Any]:
     """
     Transforms a tuple of data into a dictionary with field names as keys.
@@ -74,6 +85,7 @@ def transform_file_data(file_data_tuple: Tuple[Any, ...]) -> Dict[str, Any]:
         ("addedTimestamp", False),
         ("addedAtBlock", False),
         ("valid", False),
+        ("finalized", False),
         ("score", True),
         ("authenticity", True),
         ("ownership", True),
@@ -112,6 +124,9 @@ class Validator(BaseNode):
 
     node_type: str = "ValidatorNode"
 
+    # Threads the services block in while they wait for work, apart from the default executor that runs the stages
+    service_waits: ThreadPoolExecutor = None
+
     @classmethod
     def add_args(cls, parser: argparse.ArgumentParser):
         super().add_args(parser)
@@ -121,28 +136,110 @@ class Validator(BaseNode):
         super().__init__(config=config)
 
         if self.wallet:
+            event_driven = self.config.node.file_discovery == "events"
+            self.state.needs_peer_scoring = PeerScoringQueue(self.config.node.max_wait_blocks,
+                                                             event_driven=event_driven)
+            save_dir = get_save_dir(self.config.chain.network, self.config.dlpuid)
+            self.journal = StateJournal(save_dir)
+            self.replay_journal()
+            self.file_journal = FileProcessingJournal(save_dir)
+            self.file_cache = FileRecordCache(self.batch_reader, self.dlp_contract, transform_file_data,
+                                              os.path.join(save_dir, "file-records.jsonl"))
+            # Exact copies of already evaluated exports are answered without evaluating them again
+            self.result_cache = ResultCache(os.path.join(save_dir, "file-results.jsonl"))
+            # Spans of sampled and slow files, to find which step of a file was slow
+            self.tracer = Tracer(SpanExporter(self.config.node.trace_file or os.path.join(save_dir, "traces.jsonl")),
+                                 sample_rate=self.config.node.trace_sample_rate,
+                                 slow_seconds=self.config.node.trace_slow_seconds)
+
             # Init sync with the network. Updates the state.
             self.sync()
 
-            # Create asyncio event loop to manage async tasks.
-            self.loop = asyncio.get_event_loop()
+            # Set by the block clock every tempo, consumed by the main loop
+            self.peer_scoring_due = threading.Event()
+            self.block_clock.every(self.config.dlp.tempo, lambda block: self.peer_scoring_due.set())
+
+            # Files given up on because a stage ran past its deadline, by stage
+            self.timed_out_files = collections.Counter()
+            # Failed attempts of files that are retried, until they are given up on
+            self.failed_attempts = collections.Counter()
 
             # Instantiate runners
-            self.should_exit: bool = False
+            self.services: ServiceRunner = None
+            self.metrics_server: MetricsServer = None
             self.is_running: bool = False
             self.thread: threading.Thread = None
-            self.lock = asyncio.Lock()
 
             vana.logging.info(
                 f"Running validator on network: {self.config.chain.chain_endpoint} with dlpuid: {self.config.dlpuid}"
             )
 
-            if not hasattr(self.state, 'needs_peer_scoring'):
-                setattr(self.state, 'needs_peer_scoring', [])
+            # Discovered files are ordered by how likely they are to be verified before the speed score runs out
+            self.scheduler = DeadlineScheduler(
+                ProcessingTimeEstimator(),
+                max_wait_blocks=self.config.node.max_wait_blocks,
+                block_time=self.config.node.block_time,
+                large_file_size=self.config.node.large_file_size,
+            ) if event_driven else None
+            self.file_discovery = self.start_file_discovery() if event_driven else None
+
+            # Files that were in progress when the validator last stopped are resumed first
+            unfinished = self.file_journal.unfinished()
+            if unfinished:
+                vana.logging.info(f"Resuming {len(unfinished)} files from the processing journal")
+                if self.file_discovery:
+                    for file_id in unfinished:
+                        self.file_discovery.add(file_id)
+
+    def replay_journal(self):
+        """
+        Restores the peer scoring queue and weights recorded since the last snapshot.
+        """
+        tasks, weights = self.journal.replay()
+        for task in tasks:
+            self.state.needs_peer_scoring.add(task)
+        self.state.weights.update(weights)
+        vana.logging.info(f"Restored {len(tasks)} peer scoring tasks and {len(weights)} weights from the journal")
+
+    def compact_journal(self):
+        """
+        Folds the journal into a snapshot so that it does not grow without bound.
+
+        Changes to the peer scoring state are journaled under ``state_lock``, so none of them can land between taking
+        the snapshot and emptying the journal.
+        """
+        with self.state_lock:
+            if self.journal.log.size == 0:
+                return
+            self.journal.compact(self.state.needs_peer_scoring, dict(self.state.weights))
+
+    def start_file_discovery(self) -> FileDiscovery:
+        """
+        Seeds the file queue from the first file this validator has not verified yet, then keeps it up to date by
+        following the contract's events.
+        """
+        start_block = self.block
+        next_file = self.chain_manager.read_contract_fn(
+            self.dlp_contract.functions.getNextFileToVerify(self.wallet.hotkey.address))
+        if next_file and next_file[0] != 0:
+            start_block = transform_file_data(next_file)["addedAtBlock"]
+
+        follower = ContractEventFollower(self.chain_manager, self.dlp_contract, start_block)
+        file_discovery = FileDiscovery(follower, self.wallet.hotkey.address)
+        if self.scheduler:
+            # Files verified by this validator, e.g. before a restart, are dropped wherever they are queued
+            file_discovery.on_discard(self.scheduler.discard)
+        # Peer scores only need to be read once the peer has reported them
+        follower.subscribe("FileVerified", lambda event: self.state.needs_peer_scoring.mark_reported(
+            event["args"]["fileId"], event["args"]["validatorAddress"]))
+        self.validator_registry.follow(follower)
+        follower.start(self.block_clock)
+        vana.logging.info(f"Discovering files from contract events starting at block {start_block}")
+        return file_discovery
 
     def record_file_score(self, file_id: int, score_data: Dict[str, Any]):
         active_validators = self.get_active_validators()
-        current_block = self.chain_manager.get_current_block()
+        current_block = self.block
 
         task = PeerScoringTask(
             file_id=file_id,
@@ -151,217 +248,408 @@ class Validator(BaseNode):
             added_at_block=current_block
         )
 
-        self.state.needs_peer_scoring.append(task)
-        self.state.save()
+        with self.state_lock:
+            self.state.needs_peer_scoring.add(task)
+            self.journal.task_added(task)
 
     def get_active_validators(self) -> List[str]:
-        validator_count = self.chain_manager.read_contract_fn(self.dlp_contract.functions.activeValidatorsListsCount())
-        return self.chain_manager.read_contract_fn(self.dlp_contract.functions.activeValidatorsLists(validator_count))
+        return self.validator_registry.validators()
 
     async def process_peer_scoring_queue(self):
-        validator_scores = {}
-        current_block = self.chain_manager.get_current_block()
-
-        for task in self.state.needs_peer_scoring[:]:
-            file_data_tuple = self.chain_manager.read_contract_fn(self.dlp_contract.functions.files(task.file_id))
-
-            if not file_data_tuple:
+        batch = PerformanceBatch(self.config.node.max_wait_blocks)
+        current_block = self.block
+        queue = self.state.needs_peer_scoring
+
+        # Only read the pairs whose score may have changed, with one batched pass for the scores. Scoring only needs
+        # the block each file was added at, which never changes, so files are read from the chain once.
+        pairs = queue.pairs_to_check()
+        file_data = await asyncio.to_thread(self.file_cache.get_many, [file_id for file_id, _ in pairs], current_block,
+                                            fields=["addedAtBlock"])
+        for file_id, validator in pairs:
+            if file_id not in file_data:
+                # The read failed, check this pair again on the next pass
+                queue.mark_reported(file_id, validator)
+
+        pairs = [(file_id, validator) for file_id, validator in pairs if file_id in file_data]
+        file_score_tuples = await asyncio.to_thread(self.batch_reader.read, [
+            self.dlp_contract.functions.fileScores(file_id, validator) for file_id, validator in pairs
+        ])
+
+        for (file_id, validator), file_score_tuple in zip(pairs, file_score_tuples):
+            if file_score_tuple is None:
+                queue.mark_reported(file_id, validator)
                 continue
 
-            file_data = transform_file_data(file_data_tuple)
-
-            for validator in task.active_validators[:]:
-                if validator in task.processed_validators:
-                    continue
-
-                file_score_tuple = self.chain_manager.read_contract_fn(
-                    self.dlp_contract.functions.fileScores(task.file_id, validator)
-                )
-                validator_score = transform_file_score(file_score_tuple)
-
-                if validator_score:
-                    performance_score = self.score_validator_performance(task.own_submission, validator_score,
-                                                                         file_data)
-                    if validator not in validator_scores:
-                        validator_scores[validator] = []
-                    validator_scores[validator].append(performance_score)
-                    task.active_validators.remove(validator)
-                    task.processed_validators.append(validator)
-                elif current_block - task.added_at_block >= self.config.node.max_wait_blocks:
-                    vana.logging.info(
-                        f"Validator {validator} did not respond in time for file {task.file_id}. Scoring 0.")
-                    if validator not in validator_scores:
-                        validator_scores[validator] = []
-                    validator_scores[validator].append(0)
-                    task.active_validators.remove(validator)
-                    task.processed_validators.append(validator)
-
-            if not task.active_validators:
-                self.state.needs_peer_scoring.remove(task)
-
-        self.update_validator_weights(validator_scores)
-        self.state.save()
+            validator_score = transform_file_score(file_score_tuple)
+            if validator_score.get("reportedAtBlock"):
+                batch.add(validator, queue.get(file_id).own_submission, validator_score, file_data[file_id])
+                with self.state_lock:
+                    queue.mark_processed(file_id, validator)
+                    self.journal.validator_processed(file_id, validator)
+
+        # Validators that did not report before the deadline are scored 0
+        expired_file_ids = set()
+        with self.state_lock:
+            for file_id, validator in queue.expire(current_block):
+                vana.logging.info(f"Validator {validator} did not respond in time for file {file_id}. Scoring 0.")
+                batch.add_missed(validator)
+                expired_file_ids.add(file_id)
+            for file_id in expired_file_ids:
+                self.journal.task_expired(file_id)
+
+        # All performance scores of the pass are computed together
+        self.update_validator_weights(batch.scores_by_validator())
 
     def score_validator_performance(self, own_submission: Dict[str, Any], validator_score: Dict[str, Any],
                                     file_data: Dict[str, Any]) -> float:
-        initial_weights = {
-            'score': 50,
-            'authenticity': 10,
-            'ownership': 10,
-            'quality': 10,
-            'uniqueness': 10,
-            'speed': 10
-        }
-
-        weights = {k: v for k, v in initial_weights.items() if k in own_submission or k == 'speed'}
-        total_weight = sum(weights.values())
-        weights = {k: v / total_weight for k, v in weights.items()}
-
-        scores = {}
-
-        for dimension in ['score', 'authenticity', 'ownership', 'quality', 'uniqueness']:
-            if dimension in own_submission and dimension in validator_score:
-                scores[dimension] = 1 - abs(own_submission[dimension] - validator_score[dimension])
-            else:
-                scores[dimension] = 0 if dimension in own_submission else 1
-
-        if 'addedAtBlock' in file_data and 'reportedAtBlock' in validator_score:
-            file_added_block = file_data['addedAtBlock']
-            reported_block = validator_score['reportedAtBlock']
-            max_block_difference = self.config.node.max_wait_blocks
-            scores['speed'] = 0
-
-            if reported_block >= file_added_block:
-                block_difference = reported_block - file_added_block
-                scores['speed'] = max(0, 1 - (block_difference / max_block_difference))
-
-        return sum(weights[k] * scores[k] for k in weights)
+        batch = PerformanceBatch(self.config.node.max_wait_blocks)
+        batch.add("", own_submission, validator_score, file_data)
+        return float(batch.scores()[0])
 
     def update_validator_weights(self, validator_scores: Dict[str, List[float]]):
         # Calculate new weights based on the accumulated scores
-        new_weights = {}
-        for validator, scores in validator_scores.items():
-            avg_score = sum(scores) / len(scores)
-            new_weights[validator] = avg_score
-
-        # Update weights in the state
-        for validator, weight in new_weights.items():
-            self.state.add_weight(validator, weight)
-
-    async def forward(self):
+        validators = [validator for validator, scores in validator_scores.items() if len(scores)]
+        scores = np.concatenate([np.asarray(validator_scores[v], dtype=np.float64) for v in validators]) \
+            if validators else np.zeros(0)
+        means = mean_by_group(scores, np.array([len(validator_scores[v]) for v in validators]))
+        new_weights = dict(zip(validators, means.tolist()))
+
+        # Update weights in the state, either with the state's own moving average or the configured one
+        ema_alpha = self.config.dlp.score_ema_alpha
+        with self.state_lock:
+            if ema_alpha is not None:
+                new_weights = exponential_moving_average(self.state.weights, new_weights, ema_alpha)
+            for validator, weight in new_weights.items():
+                if ema_alpha is not None:
+                    self.state.weights[validator] = weight
+                else:
+                    self.state.add_weight(validator, weight)
+                self.journal.weight_set(validator, self.state.weights[validator])
+
+    async def forward(self, lane: str = SMALL_LANE):
         """
         The forward function is called by the validator every time step.
         It is responsible for querying the network and scoring the responses.
         """
-        validator_hotkey = self.wallet.get_hotkey()
-        validator_address = validator_hotkey.address
-
+        file_id = None
+        file_token = None
         try:
-            # Get the next file to verify
-            get_next_file_to_verify_fn = self.dlp_contract.functions.getNextFileToVerify(validator_address)
-            next_file = self.chain_manager.read_contract_fn(get_next_file_to_verify_fn)
-            if not next_file or next_file[0] == 0:
-                vana.logging.info("No files to verify. Sleeping for 5 seconds.")
-                await asyncio.sleep(5)
+            next_file = await self.next_file_to_verify(lane)
+            if not next_file:
                 return
+            file_id = next_file[0]
+            with self.tracer.trace("verify_file", file_id=file_id, lane=lane):
+                # Unpack all values from next_file
+                (
+                    file_id, owner_address, url, encrypted_key, added_timestamp,
+                    added_at_block, valid, finalized, score, authenticity, ownership,
+                    quality, uniqueness, reward, reward_withdrawn, verifications_count
+                ) = next_file
+
+                vana.logging.debug(
+                    f"Received file_id: {file_id}, owner_address: {owner_address}, url: {url}, "
+                    f"encrypted_key: {encrypted_key}, added_timestamp: {added_timestamp}, "
+                    f"added_at_block: {added_at_block}, valid: {valid}, finalized: {finalized}, score: {score}, "
+                    f"authenticity: {authenticity}, ownership: {ownership}, quality: {quality}, "
+                    f"uniqueness: {uniqueness}, reward: {reward}, reward_withdrawn: {reward_withdrawn}, "
+                    f"verifications_count: {verifications_count}"
+                )
 
-            # Unpack all values from next_file
-            (
-                file_id, owner_address, url, encrypted_key, added_timestamp,
-                added_at_block, valid, finalized, score, authenticity, ownership,
-                quality, uniqueness, reward, reward_withdrawn, verifications_count
-            ) = next_file
-
-            vana.logging.debug(
-                f"Received file_id: {file_id}, owner_address: {owner_address}, url: {url}, "
-                f"encrypted_key: {encrypted_key}, added_timestamp: {added_timestamp}, "
-                f"added_at_block: {added_at_block}, valid: {valid}, finalized: {finalized}, score: {score}, "
-                f"authenticity: {authenticity}, ownership: {ownership}, quality: {quality}, "
-                f"uniqueness: {uniqueness}, reward: {reward}, reward_withdrawn: {reward_withdrawn}, "
-                f"verifications_count: {verifications_count}"
-            )
-
-            contribution = await proof_of_contribution(file_id, url, encrypted_key)
-            vana.logging.info(f"File is valid: {contribution.is_valid}, file score: {contribution.score()}")
-
-            # Call verifyFile function on the DLP contract to set the file's scores
-            verify_file_fn = self.dlp_contract.functions.verifyFile(
-                file_id,
-                contribution.is_valid,
-                as_wad(contribution.score()),
-                as_wad(contribution.scores.authenticity),
-                as_wad(contribution.scores.ownership),
-                as_wad(contribution.scores.quality),
-                as_wad(contribution.scores.uniqueness))
-            self.chain_manager.send_transaction(verify_file_fn, self.wallet.hotkey)
-
-            # Add this file to the peer scoring queue
-            self.record_file_score(file_id, {
-                "score": contribution.score(),
-                "is_valid": contribution.is_valid,
-                "authenticity": contribution.scores.authenticity,
-                "ownership": contribution.scores.ownership,
-                "quality": contribution.scores.quality,
-                "uniqueness": contribution.scores.uniqueness
-            })
+                if (self.file_journal.reached(file_id, FileProcessingJournal.SUBMITTED)
+                        and await asyncio.to_thread(self.is_file_score_reported, file_id)):
+                    vana.logging.info(f"Score for file {file_id} was already submitted. Skipping.")
+                    self.file_journal.record(file_id, FileProcessingJournal.CONFIRMED)
+                    FILES.labels(outcome="skipped").inc()
+                    return
+
+                started = time.monotonic()
+                file_token = CancelToken(self.config.node.timeout, stage="file")
+                contribution = await self.evaluate_file(file_id, url, encrypted_key, file_token)
+                vana.logging.info(f"File is valid: {contribution.is_valid}, file score: {contribution.score()}")
+
+                # Call verifyFile function on the DLP contract to set the file's scores
+                verify_file_fn = self.dlp_contract.functions.verifyFile(
+                    file_id,
+                    contribution.is_valid,
+                    as_wad(contribution.score()),
+                    as_wad(contribution.scores.authenticity),
+                    as_wad(contribution.scores.ownership),
+                    as_wad(contribution.scores.quality),
+                    as_wad(contribution.scores.uniqueness))
+                # Submit without waiting for the receipt, the transaction manager tracks it in the background. The
+                # deadline only bounds the wait for room in the mempool, a broadcast is always seen through so that
+                # the file is never given up on with its score already sent.
+                tx = await run_stage(file_token, "submit", self.config.node.submit_timeout,
+                                     lambda token: self.tx_manager.submit(
+                                         verify_file_fn,
+                                         on_receipt=lambda tx: self.on_verify_file_receipt(file_id, tx),
+                                         token=token),
+                                     abandon=False)
+                if tx is None:
+                    raise RuntimeError(f"Failed to submit the score for file {file_id}")
+                self.file_journal.record(file_id, FileProcessingJournal.SUBMITTED, tx_hash=tx.tx_hash)
+                self.failed_attempts.pop(file_id, None)
+                FILES.labels(outcome="submitted").inc()
+                if self.scheduler:
+                    self.scheduler.completed(file_id, time.monotonic() - started)
+
+                # Add this file to the peer scoring queue
+                await asyncio.to_thread(self.record_file_score, file_id, {
+                    "score": contribution.score(),
+                    "is_valid": contribution.is_valid,
+                    "authenticity": contribution.scores.authenticity,
+                    "ownership": contribution.scores.ownership,
+                    "quality": contribution.scores.quality,
+                    "uniqueness": contribution.scores.uniqueness
+                })
+
+        except StageTimeout as e:
+            # Retrying would hold a forward slot just as long again, the file is left to the other validators
+            vana.logging.warning(f"Gave up on file {file_id}: {e}")
+            self.timed_out_files[e.stage] += 1
+            FILES.labels(outcome="timeout").inc()
+            self.file_journal.record(file_id, FileProcessingJournal.FAILED, reason=f"timeout:{e.stage}")
+            self.failed_attempts.pop(file_id, None)
+            shutil.rmtree(os.path.join(self.file_journal.work_dir, str(file_id)), ignore_errors=True)
 
         except Exception as e:
             vana.logging.error(f"Error during forward process: {e}")
             vana.logging.error(traceback.format_exc())
+            FILES.labels(outcome="error").inc()
+            if self.file_discovery and file_id:
+                self.retry_file(file_id)
             await asyncio.sleep(5)
 
-    async def concurrent_forward(self):
-        coroutines = [
-            self.forward()
-            for _ in range(self.config.node.num_concurrent_forwards)
-        ]
-        await asyncio.gather(*coroutines)
+        finally:
+            # Stops work still running in threads after a timeout, e.g. a download that ignored its deadline
+            if file_token:
+                file_token.cancel()
 
-    def run(self):
+    def retry_file(self, file_id: int):
         """
-        Initiates and manages the main loop for the validator on the network.
+        Queues a file that failed to be verified again, until it has failed ``max_file_attempts`` times.
+        """
+        if self.file_journal.reached(file_id, FileProcessingJournal.SUBMITTED):
+            # The score was sent and its transaction is likely not mined yet, verifying again would send it twice
+            vana.logging.warning(f"Not retrying file {file_id}, its score was already submitted")
+            self.failed_attempts.pop(file_id, None)
+            return
+
+        self.failed_attempts[file_id] += 1
+        if self.failed_attempts[file_id] < self.config.node.max_file_attempts:
+            self.file_discovery.add(file_id)
+            return
+
+        vana.logging.warning(f"Gave up on file {file_id} after {self.failed_attempts.pop(file_id)} failed attempts")
+        self.file_journal.record(file_id, FileProcessingJournal.FAILED, reason="error")
+        shutil.rmtree(os.path.join(self.file_journal.work_dir, str(file_id)), ignore_errors=True)
+
+    async def evaluate_file(self, file_id: int, url: str, encrypted_key: str,
+                            token: CancelToken = None) -> Contribution:
+        """
+        Downloads, decrypts and scores a file, recording each completed stage in the file processing journal so that
+        a restart picks up from the last one.
+
+        Each stage has its own timeout, within the file's deadline carried by ``token``. ``StageTimeout`` is raised
+        for the first stage that runs out of time.
+
+        The decrypted file is hashed while it is written. A file whose content was evaluated before reuses that
+        contribution from the result cache instead of being evaluated again.
+        """
+        token = token or CancelToken(self.config.node.timeout, stage="file")
+        node_config = self.config.node
+        journal = self.file_journal
+        progress = journal.get(file_id)
+        if journal.reached(file_id, FileProcessingJournal.EVALUATED):
+            vana.logging.info(f"Reusing the evaluation of file {file_id} from the processing journal")
+            return Contribution(**progress["contribution"])
+
+        file_dir = journal.file_dir(file_id)
+        encrypted_file_path = progress.get("encrypted_file_path")
+        decrypted_file_path = progress.get("decrypted_file_path")
+        content_hash = progress.get("content_hash")
+
+        if not (journal.reached(file_id, FileProcessingJournal.DECRYPTED) and os.path.exists(decrypted_file_path)):
+            if not (journal.reached(file_id, FileProcessingJournal.DOWNLOADED) and os.path.exists(encrypted_file_path)):
+                encrypted_file_path = await run_stage(token, "download", node_config.download_timeout,
+                                                      download_file, url, file_dir)
+                if encrypted_file_path is None:
+                    return Contribution(file_id=file_id, is_valid=False)
+                journal.record(file_id, FileProcessingJournal.DOWNLOADED, encrypted_file_path=encrypted_file_path)
+
+            digest = hashlib.sha256()
+            decrypted_file_path = await run_stage(token, "decrypt", node_config.decrypt_timeout,
+                                                  decrypt_file, encrypted_file_path, encrypted_key, file_dir,
+                                                  digest=digest)
+            content_hash = digest.hexdigest()
+            journal.record(file_id, FileProcessingJournal.DECRYPTED, decrypted_file_path=decrypted_file_path,
+                           content_hash=content_hash)
+            os.remove(encrypted_file_path)
+        elif content_hash is None:
+            content_hash = await asyncio.to_thread(sha256_file, decrypted_file_path)
+
+        contribution = self.result_cache.lookup(content_hash, file_id)
+        if contribution is not None:
+            vana.logging.info(f"File {file_id} has the same content as file "
+                              f"{self.result_cache.get(content_hash)['file_id']}, reusing its evaluation")
+        else:
+            contribution = await run_stage(token, "evaluate", node_config.evaluate_timeout, score_file, file_id,
+                                           decrypted_file_path, llm_timeout=node_config.llm_timeout)
+            self.result_cache.put(content_hash, contribution, evaluated_at=time.time())
+        journal.record(file_id, FileProcessingJournal.EVALUATED, contribution=contribution.model_dump())
+        shutil.rmtree(file_dir, ignore_errors=True)
+        return contribution
+
+    def is_file_score_reported(self, file_id: int) -> bool:
+        with span("contract.fileScores"):
+            file_score = self.chain_manager.read_contract_fn(
+                self.dlp_contract.functions.fileScores(file_id, self.wallet.hotkey.address))
+        return bool(file_score and transform_file_score(file_score)["reportedAtBlock"])
+
+    def on_verify_file_receipt(self, file_id: int, tx):
+        if tx.succeeded:
+            self.file_journal.record(file_id, FileProcessingJournal.CONFIRMED, tx_hash=tx.tx_hash)
+        elif tx.receipt is not None:
+            # The contract rejected the score, e.g. because the file was finalized in the meantime
+            self.file_journal.record(file_id, FileProcessingJournal.FAILED, tx_hash=tx.tx_hash)
+        # Otherwise the nonce was used by another transaction, the file is checked against the contract on restart
+
+    async def next_file_to_verify(self, lane: str = SMALL_LANE):
+        """
+        Returns the next file to verify as a raw ``files()`` tuple, or None if there is nothing to do.
+        """
+        if self.scheduler:
+            scheduled = await self.wait_in_thread(self.scheduler.wait_next, lane, lambda: self.block, timeout=5)
+            return scheduled.data if scheduled else None
+
+        get_next_file_to_verify_fn = self.dlp_contract.functions.getNextFileToVerify(self.wallet.hotkey.address)
+        next_file = await asyncio.to_thread(self.chain_manager.read_contract_fn, get_next_file_to_verify_fn)
+        if not next_file or next_file[0] == 0:
+            vana.logging.info("No files to verify. Sleeping for 5 seconds.")
+            await asyncio.sleep(5)
+            return None
+        return next_file
+
+    async def file_intake_step(self):
+        """
+        Moves a discovered file into the scheduler, with its size probed from the storage URL.
+        """
+        file_id = await self.wait_in_thread(self.file_discovery.next_file_id, timeout=1)
+        if file_id is None:
+            return
+
+        next_file = await asyncio.to_thread(self.chain_manager.read_contract_fn,
+                                            self.dlp_contract.functions.files(file_id))
+        if not next_file:
+            self.file_discovery.add(file_id)
+            raise RuntimeError(f"Failed to read file {file_id}")
+
+        file_data = transform_file_data(next_file)
+        if file_data["finalized"]:
+            vana.logging.info(f"File {file_id} was finalized before it could be verified. Skipping.")
+            return
+
+        size = await asyncio.to_thread(probe_file_size, file_data["url"])
+        self.scheduler.add(file_id, file_data["addedAtBlock"], size, next_file)
+
+    async def run(self):
+        """
+        Runs the validator's services on one event loop until it is stopped: verification workers, peer scoring, state
+        sync and weight publishing each have their own schedule, so none of them waits for the others.
         """
         # Check that validator is registered on the network.
-        self.sync()
+        await asyncio.to_thread(self.sync)
 
         vana.logging.info(f"Validator starting at block: {self.block}")
 
-        # This loop maintains the validator's operations until intentionally stopped.
+        QUEUE_DEPTH.labels(queue="peer_scoring").set_function(lambda: len(self.state.needs_peer_scoring))
+        QUEUE_DEPTH.labels(queue="pending_transactions").set_function(lambda: self.tx_manager.pending_count)
+        if self.scheduler:
+            QUEUE_DEPTH.labels(queue="scheduled_files").set_function(lambda: len(self.scheduler))
+        if self.file_discovery:
+            QUEUE_DEPTH.labels(queue="discovered_files").set_function(lambda: len(self.file_discovery))
+        if self.config.node.metrics_port is not None:
+            self.metrics_server = MetricsServer(self.config.node.metrics_port, self.config.node.metrics_host).start()
+
+        self.services = ServiceRunner()
+        num_workers = self.config.node.num_concurrent_forwards
+        # One thread per service that waits for work: the verification workers, file intake, peer scoring, state
+        # sync and weights
+        self.service_waits = ThreadPoolExecutor(max_workers=num_workers + 4, thread_name_prefix="service-wait")
+        for worker in range(num_workers):
+            # With several workers, one of them keeps large files from holding up the small ones
+            lane = LARGE_LANE if num_workers > 1 and worker == num_workers - 1 else SMALL_LANE
+            self.services.add(f"verification-{worker}", functools.partial(self.verification_step, lane))
+        if self.scheduler:
+            self.services.add("file-intake", self.file_intake_step)
+        self.services.add("peer-scoring", self.peer_scoring_step)
+        self.services.add("state-sync", self.state_sync_step)
+        self.services.add("weights", self.weights_step)
+
         try:
-            while True:
-                vana.logging.info(f"step({self.step}) block({self.block})")
-
-                # Run multiple forwards concurrently.
-                self.loop.run_until_complete(self.concurrent_forward())
-
-                # Process peer scoring queue every tempo period
-                current_block = self.chain_manager.get_current_block()
-                if current_block % self.config.dlp.tempo == 0:
-                    self.loop.run_until_complete(self.process_peer_scoring_queue())
-
-                # Check if we should exit.
-                if self.should_exit:
-                    break
-
-                # Sync state and potentially set weights.
-                self.sync()
-
-                self.step += 1
-
-        # If someone intentionally stops the validator, it'll safely terminate operations.
-        except KeyboardInterrupt:
-            if hasattr(self, 'node_server') and self.node_server:
-                self.node_server.stop()
-                self.node_server.unserve(dlp_uid=self.config.dlpuid, chain_manager=self.chain_manager)
-            vana.logging.success("Validator killed by keyboard interrupt.")
-            exit()
-
-        # In case of unforeseen errors, the validator will log the error and continue operations.
-        except Exception as err:
-            vana.logging.error("Error during validation", str(err))
-            vana.logging.debug(
-                print_exception(type(err), err, err.__traceback__)
-            )
+            await self.services.run()
+        finally:
+            await asyncio.to_thread(self.shutdown)
+            self.service_waits.shutdown(wait=False)
+
+    async def wait_in_thread(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Runs a blocking wait, e.g. for an event or the next scheduled file, on the services' own threads. Waiting in
+        the default executor would hold its threads for good, and the stages run by ``run_stage`` would queue behind
+        them while their deadlines count down.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.service_waits, functools.partial(fn, *args, **kwargs))
+
+    async def verification_step(self, lane: str):
+        await self.forward(lane)
+        self.step += 1
+
+    async def peer_scoring_step(self):
+        # Process peer scoring queue every tempo period
+        if await self.wait_in_thread(self.peer_scoring_due.wait, 1):
+            self.peer_scoring_due.clear()
+            await self.process_peer_scoring_queue()
+
+    async def state_sync_step(self):
+        block = await self.wait_in_thread(self.block_clock.wait_for_block, self.last_synced_block or 0, 1)
+        if block is not None and block != self.last_synced_block:
+            vana.logging.info(f"step({self.step}) block({block}) pending_txs({self.tx_manager.pending_count}) "
+                              f"peer_scoring_queue({len(self.state.needs_peer_scoring)})")
+            await asyncio.to_thread(self.sync_state)
+
+    async def weights_step(self):
+        if await self.wait_in_thread(self.weights_due.wait, 1):
+            await asyncio.to_thread(self.sync_weights)
+
+    def stop(self):
+        """
+        Asks the services to stop. Safe to call from any thread.
+        """
+        if self.services:
+            self.services.stop()
+
+    def shutdown(self):
+        """
+        Stops the background threads and flushes everything to disk once the services have stopped.
+        """
+        if self.file_discovery:
+            self.file_discovery.follower.stop()
+        # Give submitted transactions a chance to be confirmed, so that their files are not verified again
+        self.tx_manager.wait(timeout=30)
+        self.tx_manager.stop()
+        self.block_clock.stop()
+        self.journal.close()
+        self.file_journal.close()
+        self.file_cache.close()
+        self.result_cache.close()
+        self.tracer.close()
+        if getattr(self, 'metrics_server', None):
+            self.metrics_server.stop()
+        if hasattr(self, 'node_server') and self.node_server:
+            self.node_server.stop()
+            self.node_server.unserve(dlp_uid=self.config.dlpuid, chain_manager=self.chain_manager)
+        vana.logging.info("Validator services stopped.")
 
     def run_in_background_thread(self):
         """
@@ -370,8 +658,7 @@ class Validator(BaseNode):
         """
         if not self.is_running:
             vana.logging.debug("Starting validator in background thread.")
-            self.should_exit = False
-            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread = threading.Thread(target=lambda: asyncio.run(self.run()), daemon=True)
             self.thread.start()
             self.is_running = True
             vana.logging.debug("Started")
@@ -382,8 +669,8 @@ class Validator(BaseNode):
         """
         if self.is_running:
             vana.logging.debug("Stopping validator in background thread.")
-            self.should_exit = True
-            self.thread.join(5)
+            self.stop()
+            self.thread.join(60)
             self.is_running = False
             vana.logging.debug("Stopped")
 
@@ -404,15 +691,11 @@ class Validator(BaseNode):
             traceback: A traceback object encoding the stack trace.
                        None if the context was exited without an exception.
         """
-        if self.is_running:
-            vana.logging.debug("Stopping validator in background thread.")
-            self.should_exit = True
-            self.thread.join(5)
-            self.is_running = False
-            vana.logging.debug("Stopped")
+        self.stop_run_thread()
 
     def resync_state(self):
         self.state.sync(chain_manager=self.chain_manager)
+        self.compact_journal()
 
 
 if __name__ == "__main__":
@@ -422,6 +705,9 @@ if __name__ == "__main__":
             try:
                 validator = Validator()
                 asyncio.run(validator.run())
+            except KeyboardInterrupt:
+                vana.logging.success("Validator killed by keyboard interrupt.")
+                break
             except Exception as e:
                 vana.logging.error(f"An error occurred: {str(e)}")
                 vana.logging.error(traceback.format_exc())
@@ -0,0 +1,191 @@
+# The MIT License (MIT)
+# Copyright © 2024 Corsali, Inc. dba Vana
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import vana
+
+from chatgpt.utils.batch_reads import BatchReader
+from chatgpt.utils.deadlines import CancelToken
+from chatgpt.utils.fingerprint import FingerprintIndex, fingerprint_zip
+from chatgpt.utils.journal import write_json_atomically
+from chatgpt.utils.minhash import ConversationIndex, conversation_signatures
+from chatgpt.utils.proof_of_contribution import decrypt_file, download_file
+from chatgpt.utils.providers import TokenBucket
+
+
+class UniquenessBackfill:
+    """
+    Adds files that were added to the DLP before this validator started to the uniqueness indexes, so that new files
+    are compared against the DLP's history rather than only against what the validator has seen itself.
+
+    Files are read from the contract in batches, then downloaded, decrypted and fingerprinted by a bounded pool of
+    workers, with at most ``files_per_second`` started per second so that a validator running alongside is not
+    starved of bandwidth and CPU.
+
+    Only files the contract marks as valid are indexed, like the validator only indexes the files it validates, so
+    that rejected uploads do not lower the uniqueness of later files.
+
+    Progress is checkpointed as the highest file ID below which every file was handled, along with the files that
+    failed. A restarted backfill retries those files, then resumes after the checkpoint. Files that were already
+    indexed are skipped, since both indexes are persistent.
+    """
+
+    def __init__(self, batch_reader: BatchReader, dlp_contract, transform: Callable[[Any], Dict[str, Any]],
+                 fingerprint_index: FingerprintIndex, conversation_index: ConversationIndex, checkpoint_path: str,
+                 workers: int = 4, files_per_second: Optional[float] = None, file_timeout: float = 300,
+                 batch_size: int = 100):
+        """
+        :param batch_reader: Reader for the contract's ``files(file_id)`` records
+        :param dlp_contract: The DLP contract
+        :param transform: Converts a raw ``files()`` result into a dict, e.g. ``transform_file_data``
+        :param fingerprint_index: Index to add the file fingerprints to
+        :param conversation_index: Index to add the conversation signatures to
+        :param checkpoint_path: JSON file to record progress in
+        :param workers: Files processed at the same time
+        :param files_per_second: Files started per second, or None for no limit
+        :param file_timeout: Seconds to download, decrypt and fingerprint a file before giving up on it
+        :param batch_size: Files read from the contract and queued at a time
+        """
+        self.batch_reader = batch_reader
+        self.dlp_contract = dlp_contract
+        self.transform = transform
+        self.fingerprint_index = fingerprint_index
+        self.conversation_index = conversation_index
+        self.checkpoint_path = checkpoint_path
+        self.workers = workers
+        self.rate_limiter = TokenBucket(files_per_second, capacity=1) if files_per_second else None
+        self.file_timeout = file_timeout
+        self.batch_size = batch_size
+
+        self.indexed = 0
+        self.skipped = 0
+        self.not_valid = 0
+        self.failed: List[int] = []
+        self._lock = threading.Lock()
+
+    def load_checkpoint(self) -> int:
+        """
+        Returns the highest file ID below which every file was handled by a previous run, 0 if there was none.
+        """
+        if not os.path.exists(self.checkpoint_path):
+            return 0
+        with open(self.checkpoint_path) as f:
+            checkpoint = json.load(f)
+        self.failed = checkpoint.get("failed", [])
+        return checkpoint.get("completed_up_to", 0)
+
+    def save_checkpoint(self, completed_up_to: int):
+        write_json_atomically(self.checkpoint_path, {
+            "completed_up_to": completed_up_to,
+            "failed": sorted(self.failed),
+        })
+
+    def run(self, last_file_id: int, first_file_id: int = 1, resume: bool = True):
+        """
+        Backfills the indexes with files ``first_file_id`` to ``last_file_id``.
+        :param last_file_id: Last file to backfill, e.g. the contract's ``filesCount()``
+        :param first_file_id: First file to backfill
+        :param resume: Whether to retry the files that failed in a previous run and continue after its checkpoint
+        """
+        completed_up_to = first_file_id - 1
+        self.failed = []
+        if resume:
+            completed_up_to = max(completed_up_to, self.load_checkpoint())
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            retry = sorted(self.failed)
+            if retry:
+                vana.logging.info(f"Retrying {len(retry)} files that failed before")
+            for start in range(0, len(retry), self.batch_size):
+                self._backfill_batch(executor, retry[start:start + self.batch_size])
+                self.save_checkpoint(completed_up_to)
+
+            vana.logging.info(f"Backfilling files {completed_up_to + 1} to {last_file_id}")
+            for start in range(completed_up_to + 1, last_file_id + 1, self.batch_size):
+                file_ids = list(range(start, min(start + self.batch_size, last_file_id + 1)))
+                self._backfill_batch(executor, file_ids)
+
+                completed_up_to = file_ids[-1]
+                self.save_checkpoint(completed_up_to)
+                vana.logging.info(f"Backfilled up to file {completed_up_to}: {self.indexed} indexed, "
+                                  f"{self.skipped} already indexed, {self.not_valid} not valid, "
+                                  f"{len(self.failed)} failed")
+
+    def _backfill_batch(self, executor: ThreadPoolExecutor, file_ids: List[int]):
+        records = self.batch_reader.read([self.dlp_contract.functions.files(file_id) for file_id in file_ids])
+        futures = []
+        for file_id, record in zip(file_ids, records):
+            if file_id in self.fingerprint_index and file_id in self.conversation_index:
+                self.skipped += 1
+                self._discard_failure(file_id)
+                continue
+            record = self.transform(record) if record else None
+            if not record or not record.get("fileId"):
+                self._record_failure(file_id)
+                continue
+            if not record.get("valid"):
+                self.not_valid += 1
+                self._discard_failure(file_id)
+                continue
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            futures.append(executor.submit(self.index_file, file_id, record))
+        for future in futures:
+            future.result()
+
+    def index_file(self, file_id: int, record: Dict[str, Any]):
+        """
+        Downloads, decrypts and fingerprints a file into both indexes. Failures are recorded, not raised.
+        """
+        work_dir = tempfile.mkdtemp()
+        token = CancelToken(self.file_timeout, stage="backfill")
+        try:
+            encrypted_file_path = download_file(record["url"], work_dir, token=token)
+            if encrypted_file_path is None:
+                self._record_failure(file_id)
+                return
+            decrypted_file_path = decrypt_file(encrypted_file_path, record["encryptedKey"], work_dir, token=token)
+            os.remove(encrypted_file_path)
+
+            self.fingerprint_index.add(file_id, fingerprint_zip(decrypted_file_path))
+            self.conversation_index.add(file_id, conversation_signatures(decrypted_file_path))
+            with self._lock:
+                self.indexed += 1
+            self._discard_failure(file_id)
+        except Exception as e:
+            vana.logging.warning(f"Could not backfill file {file_id}: {e}")
+            self._record_failure(file_id)
+        finally:
+            token.cancel()
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def _record_failure(self, file_id: int):
+        with self._lock:
+            if file_id not in self.failed:
+                self.failed.append(file_id)
+
+    def _discard_failure(self, file_id: int):
+        with self._lock:
+            if file_id in self.failed:
+                self.failed.remove(file_id)
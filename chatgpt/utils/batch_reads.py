@@ -0,0 +1,129 @@
+# The MIT License (MIT)
+# Copyright © 2024 Corsali, Inc. dba Vana
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+from typing import Any, Dict, List, Optional, Sequence
+
+import requests
+import vana
+from hexbytes import HexBytes
+from web3._utils.abi import get_abi_output_types, map_abi_data
+from web3._utils.normalizers import BASE_RETURN_NORMALIZERS
+
+
+class BatchReader:
+    """
+    Executes read-only contract calls as JSON-RPC batch requests, so that N ``eth_call``s cost
+    ``ceil(N / batch_size)`` round-trips instead of N.
+
+    Results are decoded exactly like ``ContractFunction.call()`` would decode them. If the provider is not an HTTP
+    endpoint, or the endpoint rejects batch requests, calls fall back to ``chain_manager.read_contract_fn`` one by one.
+    """
+
+    def __init__(self, chain_manager: "vana.ChainManager", batch_size: int = 100):
+        self.chain_manager = chain_manager
+        self.batch_size = batch_size
+        self.session = requests.Session()
+        self.round_trips = 0
+
+    def read(self, functions: Sequence[Any], block_identifier="latest") -> List[Any]:
+        """
+        Calls every contract function and returns the decoded results in the same order.
+        :param functions: Contract functions, e.g. ``[dlp_contract.functions.files(1), ...]``
+        :param block_identifier: Block number or tag to execute the calls at
+        :return: List of results, with None for calls that failed
+        """
+        results = []
+        for start in range(0, len(functions), self.batch_size):
+            chunk = functions[start:start + self.batch_size]
+            chunk_results = self._read_batch(chunk, block_identifier) if self._endpoint_uri() else None
+            if chunk_results is None:
+                chunk_results = [self._read_single(function) for function in chunk]
+            results.extend(chunk_results)
+        return results
+
+    def _endpoint_uri(self) -> Optional[str]:
+        web3 = getattr(self.chain_manager, "web3", None)
+        provider = getattr(web3, "provider", None)
+        return getattr(provider, "endpoint_uri", None)
+
+    def _read_single(self, function) -> Any:
+        self.round_trips += 1
+        return self.chain_manager.read_contract_fn(function)
+
+    def _read_batch(self, functions: Sequence[Any], block_identifier) -> Optional[List[Any]]:
+        if isinstance(block_identifier, int):
+            block_identifier = hex(block_identifier)
+
+        payload = [
+            {
+                "jsonrpc": "2.0",
+                "id": i,
+                "method": "eth_call",
+                "params": [{"to": function.address, "data": function._encode_transaction_data()}, block_identifier],
+            }
+            for i, function in enumerate(functions)
+        ]
+
+        try:
+            responses = self._post(payload)
+        except Exception as e:
+            vana.logging.warning(f"Batch request failed, falling back to individual calls: {e}")
+            return None
+
+        if not isinstance(responses, list):
+            vana.logging.warning("Endpoint does not support batch requests, falling back to individual calls")
+            return None
+
+        by_id: Dict[int, Dict[str, Any]] = {response.get("id"): response for response in responses}
+        results = []
+        for i, function in enumerate(functions):
+            response = by_id.get(i, {})
+            if "result" not in response:
+                vana.logging.error(f"Failed to read from contract function: {response.get('error')}")
+                results.append(None)
+                continue
+            try:
+                results.append(self._decode(function, response["result"]))
+            except Exception as e:
+                vana.logging.error(f"Failed to decode contract function result: {e}")
+                results.append(None)
+        return results
+
+    def _post(self, payload: List[Dict[str, Any]]) -> Any:
+        provider = self.chain_manager.web3.provider
+        if hasattr(provider, "make_batch_request"):
+            # Let the provider pick the endpoint, e.g. a ProviderPool with failover
+            self.round_trips += 1
+            return provider.make_batch_request(payload)
+
+        request_kwargs = provider.get_request_kwargs() if hasattr(provider, "get_request_kwargs") else {}
+        request_kwargs = dict(request_kwargs)
+        request_kwargs.setdefault("timeout", 30)
+
+        self.round_trips += 1
+        response = self.session.post(provider.endpoint_uri, json=payload, **request_kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def _decode(self, function, result: str) -> Any:
+        codec = self.chain_manager.web3.codec
+        output_types = get_abi_output_types(function.abi)
+        output_data = codec.decode(output_types, HexBytes(result))
+        normalized_data = map_abi_data(BASE_RETURN_NORMALIZERS, output_types, output_data)
+        if len(normalized_data) == 1:
+            return normalized_data[0]
+        return normalized_data
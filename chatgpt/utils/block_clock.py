@@ -0,0 +1,129 @@
+# The MIT License (MIT)
+# Copyright © 2024 Corsali, Inc. dba Vana
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import threading
+from typing import Callable, List, Optional
+
+import vana
+
+
+class BlockClock:
+    """
+    Tracks the chain head for the whole node, so that every component reads the current block from memory instead
+    of making its own ``eth_blockNumber`` call.
+
+    Once started, a background thread polls the chain every ``poll_interval`` seconds. Callbacks registered with
+    ``on_block`` are invoked for every block the clock advances over, including blocks that were skipped between two
+    polls, so periodic work scheduled with ``every`` cannot miss its boundary. If the clock has not been started,
+    reading ``block`` polls the chain synchronously.
+    """
+
+    def __init__(self, chain_manager: "vana.ChainManager", poll_interval: float = 1.0, max_catch_up: int = 1000):
+        self.chain_manager = chain_manager
+        self.poll_interval = poll_interval
+        self.max_catch_up = max_catch_up
+
+        self._block: Optional[int] = None
+        self._callbacks: List[Callable[[int], None]] = []
+        self._lock = threading.Lock()
+        self._new_block = threading.Condition(self._lock)
+        self._should_exit = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def block(self) -> int:
+        """
+        The latest block number seen by the clock.
+        """
+        if self._thread is None or self._block is None:
+            return self.refresh()
+        return self._block
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def on_block(self, callback: Callable[[int], None]):
+        """
+        Registers a callback that is called with every new block number. Callbacks run on the clock's thread and
+        should return quickly, e.g. by setting an event that the actual work waits on.
+        """
+        self._callbacks.append(callback)
+
+    def every(self, interval: int, callback: Callable[[int], None]):
+        """
+        Registers a callback that is called on every block that is a multiple of ``interval``.
+        """
+        self.on_block(lambda block: callback(block) if block % interval == 0 else None)
+
+    def wait_for_block(self, after: int, timeout: Optional[float] = None) -> int:
+        """
+        Blocks until the clock has seen a block newer than ``after``.
+        :return: The latest block number
+        """
+        with self._new_block:
+            self._new_block.wait_for(lambda: self._block is not None and self._block > after, timeout=timeout)
+            return self._block
+
+    def refresh(self) -> int:
+        """
+        Reads the current block from the chain and fires callbacks for every block advanced over.
+        """
+        current_block = self.chain_manager.get_current_block()
+        with self._lock:
+            previous_block = self._block
+            if previous_block is not None and current_block <= previous_block:
+                return previous_block
+            self._block = current_block
+            self._new_block.notify_all()
+
+        if previous_block is None:
+            first_block = current_block
+        else:
+            first_block = max(previous_block + 1, current_block - self.max_catch_up + 1)
+
+        for block in range(first_block, current_block + 1):
+            for callback in self._callbacks:
+                try:
+                    callback(block)
+                except Exception as e:
+                    vana.logging.error(f"Error in block callback for block {block}: {e}")
+        return current_block
+
+    def start(self):
+        """
+        Starts polling the chain head in a background thread.
+        """
+        if self.is_running:
+            return
+        self._should_exit.clear()
+        self.refresh()
+        self._thread = threading.Thread(target=self._run, name="BlockClock", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        self._should_exit.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._should_exit.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                vana.logging.warning(f"Failed to read the current block: {e}")
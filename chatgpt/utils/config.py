@@ -97,6 +97,21 @@ def add_args(cls, parser):
                         help="The full path to the DLP Token Smart Contract ABI JSON file",
                         default=dlp_token_implementation_abi_path)
 
+    parser.add_argument("--dlp.weights_threshold",
+                        type=float,
+                        help="The total absolute change in weights since the last on-chain update needed to send a new one",
+                        default=0.05)
+
+    parser.add_argument("--dlp.weights_max_interval",
+                        type=int,
+                        help="The maximum number of blocks between on-chain weight updates while weights are changing",
+                        default=1000)
+
+    parser.add_argument("--dlp.partial_weights",
+                        action="store_true",
+                        help="Only send the weights that changed. Requires a DLP contract that merges weight updates.",
+                        default=False)
+
     parser.add_argument(
         "--node.epoch_length",
         type=int,
@@ -104,6 +119,50 @@ def add_args(cls, parser):
         default=10,
     )
 
+    parser.add_argument(
+        "--node.validator_cache_ttl",
+        type=float,
+        help="The number of seconds the active validator list is cached for when no validator events are seen.",
+        default=300,
+    )
+
+    parser.add_argument(
+        "--node.rpc_endpoints",
+        type=str,
+        nargs="*",
+        help="Additional RPC endpoints to balance reads over and fail over to, besides the chain endpoint. "
+             "Defaults to the comma-separated OD_CHAIN_RPC_ENDPOINTS environment variable.",
+        default=[uri for uri in os.environ.get("OD_CHAIN_RPC_ENDPOINTS", "").split(",") if uri],
+    )
+
+    parser.add_argument(
+        "--node.rpc_rate_limit",
+        type=float,
+        help="The maximum number of RPC requests per second over all endpoints. 0 disables the limit.",
+        default=0,
+    )
+
+    parser.add_argument(
+        "--node.max_pending_transactions",
+        type=int,
+        help="The maximum number of submitted transactions waiting for a receipt before new submissions block.",
+        default=64,
+    )
+
+    parser.add_argument(
+        "--node.rpc_batch_size",
+        type=int,
+        help="The maximum number of contract reads sent to the chain endpoint in a single JSON-RPC batch request.",
+        default=100,
+    )
+
+    parser.add_argument(
+        "--node.tx_replace_after",
+        type=float,
+        help="The number of seconds after which a transaction without a receipt is re-sent with a higher gas price.",
+        default=60,
+    )
+
 
 def add_validator_args(cls, parser):
     """Add validator specific arguments to the parser."""
@@ -118,8 +177,43 @@ def add_validator_args(cls, parser):
     parser.add_argument(
         "--node.timeout",
         type=float,
-        help="The timeout for each forward call in seconds.",
-        default=10,
+        help="The timeout for verifying one file in seconds, across all of its stages.",
+        default=300,
+    )
+
+    parser.add_argument(
+        "--node.download_timeout",
+        type=float,
+        help="The timeout for downloading a file in seconds.",
+        default=120,
+    )
+
+    parser.add_argument(
+        "--node.decrypt_timeout",
+        type=float,
+        help="The timeout for decrypting a file in seconds.",
+        default=60,
+    )
+
+    parser.add_argument(
+        "--node.evaluate_timeout",
+        type=float,
+        help="The timeout for scoring a decrypted file in seconds, including LLM validation.",
+        default=180,
+    )
+
+    parser.add_argument(
+        "--node.llm_timeout",
+        type=float,
+        help="The timeout for each LLM validation request in seconds.",
+        default=30,
+    )
+
+    parser.add_argument(
+        "--node.submit_timeout",
+        type=float,
+        help="The timeout for waiting for room in the mempool to submit a file's score in seconds.",
+        default=30,
     )
 
     parser.add_argument(
@@ -129,6 +223,43 @@ def add_validator_args(cls, parser):
         default=1,
     )
 
+    parser.add_argument(
+        "--node.max_file_attempts",
+        type=int,
+        help="The number of times verifying a file may fail with an error before it is given up on.",
+        default=3,
+    )
+
+    parser.add_argument(
+        "--node.file_discovery",
+        type=str,
+        choices=["events", "poll"],
+        help="How to find files to verify: follow the DLP contract's FileAdded events, or poll getNextFileToVerify.",
+        default="events",
+    )
+
+    parser.add_argument(
+        "--dlp.score_ema_alpha",
+        type=float,
+        help="Smoothing factor of the moving average applied to peer performance scores across tempos. "
+             "Defaults to the state's own moving average.",
+        default=None,
+    )
+
+    parser.add_argument(
+        "--node.block_time",
+        type=float,
+        help="The expected number of seconds per block, used to tell whether a file can still be verified in time.",
+        default=6,
+    )
+
+    parser.add_argument(
+        "--node.large_file_size",
+        type=int,
+        help="Files of at least this many bytes are verified on a separate lane when running concurrent forwards.",
+        default=50 * 1024 * 1024,
+    )
+
     parser.add_argument(
         "--node.max_wait_blocks",
         type=int,
@@ -136,6 +267,42 @@ def add_validator_args(cls, parser):
         default=100,
     )
 
+    parser.add_argument(
+        "--node.metrics_port",
+        type=int,
+        help="Port to serve Prometheus metrics on at /metrics. Metrics are not served if unset.",
+        default=None,
+    )
+
+    parser.add_argument(
+        "--node.metrics_host",
+        type=str,
+        help="Address to serve Prometheus metrics on.",
+        default="127.0.0.1",
+    )
+
+    parser.add_argument(
+        "--node.trace_file",
+        type=str,
+        help="File to write trace spans of verified files to, rotated as it grows. "
+             "Defaults to traces.jsonl in the validator's state directory.",
+        default=None,
+    )
+
+    parser.add_argument(
+        "--node.trace_sample_rate",
+        type=float,
+        help="The fraction of files whose trace spans are written.",
+        default=0.01,
+    )
+
+    parser.add_argument(
+        "--node.trace_slow_seconds",
+        type=float,
+        help="The trace spans of files that take at least this many seconds are always written.",
+        default=60,
+    )
+
 
 def config(cls):
     """
@@ -0,0 +1,106 @@
+# The MIT License (MIT)
+# Copyright © 2024 Corsali, Inc. dba Vana
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from chatgpt.utils.fingerprint import get_index_dir
+from chatgpt.utils.journal import AppendOnlyLog
+
+
+class ConversationResultStore:
+    """
+    Per-conversation results of previously evaluated exports: the metrics ``analyze_data`` aggregates, and the LLM
+    score of conversations that were sampled for LLM validation.
+
+    Users re-export and resubmit their history as it grows, so most conversations of a new export were evaluated
+    before. A conversation is identified by its ``conversation_id``, and a result is only reused while its
+    ``update_time`` and the SHA-256 of its content are unchanged. New messages are evaluated again, and so is content
+    that was edited, or resubmitted under the ID and timestamp of a conversation that scored well.
+
+    Results are persisted to an append-only file holding the latest result of each conversation. The file is rewritten
+    on open once superseded results make up most of it.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        :param path: File to persist results to, or None to keep them in memory only
+        """
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+        self._log = AppendOnlyLog(path) if path else None
+        if self._log:
+            for record in self._log:
+                self._results[record["conversation_id"]] = record
+            if self._log.size > 2 * len(self._results):
+                self._log.rewrite(self._results.values())
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    @staticmethod
+    def _matches(record: Optional[Dict[str, Any]], update_time: Optional[float], content_hash: str) -> bool:
+        return (record is not None and record["update_time"] == update_time
+                and record.get("content_hash") == content_hash)
+
+    def get(self, conversation_id: Optional[str], update_time: Optional[float], content_hash: str) -> Dict[str, Any]:
+        """
+        Returns the stored result of a conversation, or an empty dict if it was not evaluated at this
+        ``update_time`` with this content. The result may have ``metrics``, an ``llm_score``, or both.
+        """
+        with self._lock:
+            record = self._results.get(conversation_id)
+            if not self._matches(record, update_time, content_hash):
+                return {}
+            return dict(record)
+
+    def put(self, conversation_id: str, update_time: float, content_hash: str, **result: Any):
+        """
+        Stores ``metrics`` and/or ``llm_score`` of a conversation, next to what is stored for the same
+        ``update_time`` and content. Results of another version of the conversation are replaced.
+        """
+        with self._lock:
+            record = self._results.get(conversation_id)
+            if not self._matches(record, update_time, content_hash):
+                record = {"conversation_id": conversation_id, "update_time": update_time,
+                          "content_hash": content_hash}
+            record = {**record, **result}
+            self._results[conversation_id] = record
+            if self._log:
+                self._log.append(record)
+
+    def close(self):
+        if self._log:
+            self._log.close()
+
+
+_store: Optional[ConversationResultStore] = None
+_store_lock = threading.Lock()
+
+
+def get_conversation_store() -> ConversationResultStore:
+    """
+    Returns the process-wide conversation result store, stored next to the uniqueness indexes in
+    ``OD_FINGERPRINT_INDEX_DIR``.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ConversationResultStore(os.path.join(get_index_dir(), "conversation-results.jsonl"))
+        return _store
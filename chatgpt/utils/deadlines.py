@@ -0,0 +1,157 @@
+# The MIT License (MIT)
+# Copyright © 2024 Corsali, Inc. dba Vana
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import asyncio
+import threading
+import time
+from typing import Any, Callable, List, Optional
+
+import vana
+
+from chatgpt.utils.metrics import STAGE_SECONDS
+from chatgpt.utils.tracing import span
+
+
+class Cancelled(Exception):
+    """
+    The operation was cancelled through its ``CancelToken``.
+    """
+
+
+class StageTimeout(Cancelled):
+    """
+    A stage of processing a file did not finish before its deadline.
+    """
+
+    def __init__(self, stage: str):
+        super().__init__(f"Stage '{stage}' timed out")
+        self.stage = stage
+
+
+class CancelToken:
+    """
+    Cooperative cancellation for blocking work running in a thread.
+
+    The work calls ``check`` between units of work (e.g. downloaded chunks, LLM requests) and bounds its own blocking
+    calls with ``remaining``. Calls that cannot check, like waiting on a subprocess or a socket, register a callback
+    with ``on_cancel`` that interrupts them, e.g. by killing the process or closing the connection.
+
+    A token expires at its deadline, and a child token is cancelled together with its parent.
+    """
+
+    def __init__(self, timeout: Optional[float] = None, parent: Optional["CancelToken"] = None,
+                 stage: Optional[str] = None):
+        self.stage = stage or (parent.stage if parent else None)
+        self.deadline = None if timeout is None else time.monotonic() + timeout
+        if parent and parent.deadline is not None:
+            self.deadline = parent.deadline if self.deadline is None else min(self.deadline, parent.deadline)
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], Any]] = []
+        self._cancelled = False
+        self._timed_out = False
+        if parent:
+            parent.on_cancel(lambda: self.cancel(timed_out=parent.timed_out))
+
+    def child(self, timeout: Optional[float] = None, stage: Optional[str] = None) -> "CancelToken":
+        return CancelToken(timeout, parent=self, stage=stage)
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled or self.expired
+
+    @property
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    @property
+    def timed_out(self) -> bool:
+        return self._timed_out or self.expired
+
+    def remaining(self, default: Optional[float] = None) -> Optional[float]:
+        """
+        Seconds left until the deadline, or ``default`` if the token has none.
+        """
+        if self.deadline is None:
+            return default
+        remaining = max(0.0, self.deadline - time.monotonic())
+        return remaining if default is None else min(remaining, default)
+
+    def check(self):
+        """
+        Raises if the token was cancelled or its deadline has passed.
+        """
+        if self.timed_out:
+            raise StageTimeout(self.stage or "unknown")
+        if self._cancelled:
+            raise Cancelled()
+
+    def on_cancel(self, callback: Callable[[], Any]):
+        """
+        Registers a callback to interrupt blocking work. It runs immediately if the token is already cancelled.
+        """
+        with self._lock:
+            if not self._cancelled:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def cancel(self, timed_out: bool = False):
+        with self._lock:
+            if self._cancelled:
+                return
+            self._cancelled = True
+            self._timed_out = timed_out
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                vana.logging.debug(f"Error while cancelling: {e}")
+
+
+async def run_stage(token: CancelToken, stage: str, timeout: Optional[float], fn: Callable[..., Any], *args,
+                    abandon: bool = True, **kwargs) -> Any:
+    """
+    Runs blocking ``fn`` in a thread with a deadline of ``timeout`` seconds, bounded by ``token``'s own deadline.
+
+    ``fn`` receives the stage's token as its ``token`` keyword argument. When the deadline passes, or the calling task
+    is cancelled, the token is cancelled so ``fn`` can release what it holds, and ``StageTimeout`` (or
+    ``asyncio.CancelledError``) is raised without waiting for the thread.
+
+    With ``abandon=False`` the stage waits for ``fn`` to return instead, for work whose side effects cannot be left
+    behind unrecorded, like broadcasting a transaction. ``fn`` is then trusted to honour the deadline itself.
+
+    The stage's duration is recorded in the ``chatgpt_stage_duration_seconds`` histogram, and as a span of the
+    current trace that the spans opened by ``fn`` are nested in.
+    """
+    stage_token = token.child(timeout, stage=stage)
+    stage_token.check()
+    started = time.perf_counter()
+    with span(stage, timeout=stage_token.remaining()):
+        try:
+            if not abandon:
+                return await asyncio.to_thread(fn, *args, token=stage_token, **kwargs)
+            return await asyncio.wait_for(asyncio.to_thread(fn, *args, token=stage_token, **kwargs),
+                                          timeout=stage_token.remaining())
+        except asyncio.TimeoutError:
+            stage_token.cancel(timed_out=True)
+            raise StageTimeout(stage)
+        except asyncio.CancelledError:
+            stage_token.cancel()
+            raise
+        finally:
+            STAGE_SECONDS.labels(stage=stage).observe(time.perf_counter() - started)
@@ -0,0 +1,126 @@
+# The MIT License (MIT)
+# Copyright © 2024 Corsali, Inc. dba Vana
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional
+
+import vana
+from eth_utils import event_abi_to_log_topic
+
+from chatgpt.utils.block_clock import BlockClock
+
+
+class ContractEventFollower:
+    """
+    Follows a contract's event logs over incremental ``eth_getLogs`` block ranges.
+
+    All subscribed events are fetched with a single ``eth_getLogs`` call per range and dispatched to their handlers
+    in chain order. When attached to a ``BlockClock``, a background thread polls once per new block.
+    """
+
+    def __init__(self, chain_manager: "vana.ChainManager", contract, start_block: int, max_block_range: int = 1000):
+        self.chain_manager = chain_manager
+        self.contract = contract
+        self.next_block = start_block
+        self.max_block_range = max_block_range
+
+        self._handlers: Dict[bytes, List[Callable[[Any], None]]] = defaultdict(list)
+        self._events: Dict[bytes, Any] = {}
+        self._lock = threading.Lock()
+        self._should_exit = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def subscribe(self, event_name: str, handler: Callable[[Any], None]):
+        """
+        Calls ``handler`` with every decoded ``event_name`` log, e.g. ``subscribe("FileAdded", on_file_added)``.
+        """
+        event = getattr(self.contract.events, event_name)()
+        topic = event_abi_to_log_topic(event.abi)
+        self._events[topic] = event
+        self._handlers[topic].append(handler)
+
+    def poll(self, to_block: int) -> int:
+        """
+        Fetches and dispatches all subscribed events up to and including ``to_block``.
+        :return: The number of events dispatched
+        """
+        with self._lock:
+            dispatched = 0
+            block_range = self.max_block_range
+            while self.next_block <= to_block:
+                end_block = min(to_block, self.next_block + block_range - 1)
+                try:
+                    logs = self.chain_manager.web3.eth.get_logs({
+                        "address": self.contract.address,
+                        "fromBlock": self.next_block,
+                        "toBlock": end_block,
+                        "topics": [list(self._events.keys())],
+                    })
+                except Exception as e:
+                    # Most endpoints cap the range or number of results of a single query
+                    if block_range == 1:
+                        raise
+                    block_range = max(1, block_range // 2)
+                    vana.logging.debug(f"eth_getLogs failed ({e}), retrying with a range of {block_range} blocks")
+                    continue
+
+                for log in logs:
+                    dispatched += self._dispatch(log)
+                self.next_block = end_block + 1
+            return dispatched
+
+    def start(self, block_clock: BlockClock):
+        """
+        Polls in a background thread every time ``block_clock`` advances.
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._should_exit.clear()
+        self._thread = threading.Thread(target=self._run, args=(block_clock,), name="ContractEventFollower",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        self._should_exit.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self, block_clock: BlockClock):
+        while not self._should_exit.is_set():
+            block = block_clock.wait_for_block(self.next_block - 1, timeout=1)
+            if block is None or block < self.next_block:
+                continue
+            try:
+                self.poll(block)
+            except Exception as e:
+                vana.logging.warning(f"Failed to fetch contract events: {e}")
+                self._should_exit.wait(1)
+
+    def _dispatch(self, log) -> int:
+        topic = bytes(log["topics"][0])
+        event = self._events.get(topic)
+        if event is None:
+            return 0
+        decoded = event.process_log(log)
+        for handler in self._handlers[topic]:
+            try:
+                handler(decoded)
+            except Exception as e:
+                vana.logging.error(f"Error handling {decoded['event']} event: {e}")
+        return 1
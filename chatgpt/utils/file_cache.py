@@ -0,0 +1,114 @@
+# The MIT License (MIT)
+# Copyright © 2024 Corsali, Inc. dba Vana
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence
+
+from chatgpt.utils.batch_reads import BatchReader
+from chatgpt.utils.journal import AppendOnlyLog
+from chatgpt.utils.metrics import CACHE_LOOKUPS
+
+
+class FileRecordCache:
+    """
+    Read-through cache for the DLP contract's ``files(file_id)`` records.
+
+    Fields that never change once a file is added are cached permanently, and persisted to an append-only file so
+    that a restarted validator starts warm. Whole records, including mutable fields such as ``verificationsCount``
+    and ``finalized``, are only reused within the block they were read at.
+    """
+
+    IMMUTABLE_FIELDS = ("fileId", "ownerAddress", "url", "encryptedKey", "addedTimestamp", "addedAtBlock")
+
+    def __init__(self, batch_reader: BatchReader, dlp_contract, transform: Callable[[Any], Dict[str, Any]],
+                 path: Optional[str] = None):
+        """
+        :param batch_reader: Reader used for cache misses
+        :param dlp_contract: The DLP contract
+        :param transform: Converts a raw ``files()`` result into a dict, e.g. ``transform_file_data``
+        :param path: File to persist immutable fields to, or None to keep them in memory only
+        """
+        self.batch_reader = batch_reader
+        self.dlp_contract = dlp_contract
+        self.transform = transform
+        self.hits = 0
+        self.misses = 0
+
+        self._immutable: Dict[int, Dict[str, Any]] = {}
+        self._block: Optional[int] = None
+        self._records: Dict[int, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+        self._log = AppendOnlyLog(path) if path else None
+        if self._log:
+            for record in self._log:
+                self._immutable[record["fileId"]] = record
+
+    def get(self, file_id: int, block: int, fields: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
+        return self.get_many([file_id], block, fields).get(file_id)
+
+    def get_many(self, file_ids: Sequence[int], block: int,
+                 fields: Optional[Iterable[str]] = None) -> Dict[int, Dict[str, Any]]:
+        """
+        Returns the records of ``file_ids`` as of ``block``, reading only the ones that are not cached.
+        :param file_ids: Files to look up
+        :param block: Current block, mutable fields read at an earlier block are read again
+        :param fields: Fields the caller needs. If they are all immutable, permanently cached records are enough.
+        :return: Mapping of file id to record, without the files that could not be read
+        """
+        immutable_only = fields is not None and set(fields) <= set(self.IMMUTABLE_FIELDS)
+        found: Dict[int, Dict[str, Any]] = {}
+        missing = []
+        with self._lock:
+            if self._block != block:
+                self._block = block
+                self._records = {}
+            for file_id in dict.fromkeys(file_ids):
+                record = self._records.get(file_id)
+                if record is None and immutable_only:
+                    record = self._immutable.get(file_id)
+                if record is None:
+                    missing.append(file_id)
+                else:
+                    found[file_id] = record
+            self.hits += len(found)
+            self.misses += len(missing)
+        CACHE_LOOKUPS.labels(cache="file_records", result="hit").inc(len(found))
+        CACHE_LOOKUPS.labels(cache="file_records", result="miss").inc(len(missing))
+
+        if missing:
+            results = self.batch_reader.read([self.dlp_contract.functions.files(file_id) for file_id in missing])
+            for file_id, result in zip(missing, results):
+                if result:
+                    found[file_id] = self._store(file_id, self.transform(result), block)
+        return found
+
+    def _store(self, file_id: int, record: Dict[str, Any], block: int) -> Dict[str, Any]:
+        with self._lock:
+            if self._block == block:
+                self._records[file_id] = record
+            # A zero file id means the file does not exist (yet)
+            if record.get("fileId") and file_id not in self._immutable:
+                immutable = {field: record[field] for field in self.IMMUTABLE_FIELDS if field in record}
+                self._immutable[file_id] = immutable
+                if self._log:
+                    self._log.append(immutable)
+        return record
+
+    def close(self):
+        if self._log:
+            self._log.close()
@@ -0,0 +1,97 @@
+# The MIT License (MIT)
+# Copyright © 2024 Corsali, Inc. dba Vana
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import heapq
+import threading
+from typing import Callable, List, Optional, Set
+
+import vana
+
+from chatgpt.utils.events import ContractEventFollower
+
+
+class FileDiscovery:
+    """
+    Local queue of files this validator still has to verify, fed by the DLP contract's ``FileAdded`` and
+    ``FileVerified`` events instead of polling ``getNextFileToVerify``.
+
+    Files are handed out in ascending ``fileId`` order and each file is handed out once, so concurrent forwards never
+    work on the same file.
+    """
+
+    def __init__(self, follower: ContractEventFollower, validator_address: str):
+        self.follower = follower
+        self.validator_address = validator_address
+
+        self._heap: List[int] = []
+        self._queued: Set[int] = set()
+        self._available = threading.Condition()
+        self._discard_callbacks: List[Callable[[int], None]] = []
+
+        follower.subscribe("FileAdded", self._on_file_added)
+        follower.subscribe("FileVerified", self._on_file_verified)
+
+    def __len__(self):
+        with self._available:
+            return len(self._queued)
+
+    def add(self, file_id: int):
+        """
+        Queues a file for verification, e.g. to retry it after a failed attempt.
+        """
+        with self._available:
+            if file_id not in self._queued:
+                self._queued.add(file_id)
+                heapq.heappush(self._heap, file_id)
+                self._available.notify()
+
+    def discard(self, file_id: int):
+        with self._available:
+            # Discarded IDs are skipped lazily when they reach the top of the heap
+            self._queued.discard(file_id)
+        for callback in self._discard_callbacks:
+            callback(file_id)
+
+    def on_discard(self, callback: Callable[[int], None]):
+        """
+        Registers a callback for files that no longer need verifying, e.g. to drop them from the files already handed
+        out to the scheduler.
+        """
+        self._discard_callbacks.append(callback)
+
+    def next_file_id(self, timeout: Optional[float] = None) -> Optional[int]:
+        """
+        Removes and returns the lowest queued file ID, waiting up to ``timeout`` seconds for one to be added.
+        :return: The file ID, or None if the queue stayed empty
+        """
+        with self._available:
+            if not self._available.wait_for(lambda: self._queued, timeout=timeout):
+                return None
+            while True:
+                file_id = heapq.heappop(self._heap)
+                if file_id in self._queued:
+                    self._queued.remove(file_id)
+                    return file_id
+
+    def _on_file_added(self, event):
+        file_id = event["args"]["fileId"]
+        vana.logging.debug(f"File {file_id} added at block {event['blockNumber']}")
+        self.add(file_id)
+
+    def _on_file_verified(self, event):
+        if event["args"]["validatorAddress"].lower() == self.validator_address.lower():
+            self.discard(event["args"]["fileId"])
@@ -0,0 +1,272 @@
+# The MIT License (MIT)
+# Copyright © 2024 Corsali, Inc. dba Vana
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import codecs
+import os
+import re
+import threading
+import time
+import zipfile
+from typing import List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+
+from chatgpt.utils.segments import Segment, SegmentIds, SegmentStore
+
+N_FEATURES = 128
+
+# A word that may continue in the next chunk, with HashingVectorizer's default token pattern
+_TRAILING_WORD = re.compile(r"\w+$")
+
+
+def feature_hash_string(s: str, n_features: int = N_FEATURES) -> np.ndarray:
+    """
+    Hashes a string into a fixed-size, L2-normalized feature vector.
+    :param s: String to hash
+    :param n_features: Higher number captures more details but increases the hash size.
+    :return: float32 vector of length ``n_features``
+    """
+    return FeatureHasher(n_features).update(s).fingerprint()
+
+
+def normalize(vector: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+class FeatureHasher:
+    """
+    Incrementally hashes text into term counts, so that a large text can be fingerprinted chunk by chunk.
+
+    Chunks may split a word or a multi-byte character anywhere. The unfinished word at the end of a chunk is held
+    back until the next one, so the counts equal those of ``HashingVectorizer`` over the whole text.
+    """
+
+    max_carry = 1024 * 1024
+
+    def __init__(self, n_features: int = N_FEATURES):
+        self.vectorizer = HashingVectorizer(n_features=n_features, norm=None, alternate_sign=False)
+        self.counts = np.zeros(n_features, dtype=np.float64)
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        self._carry = ""
+
+    def update(self, data) -> "FeatureHasher":
+        """
+        Adds a chunk of text, as ``str`` or UTF-8 ``bytes``.
+        """
+        text = self._carry + (self._decoder.decode(data) if isinstance(data, bytes) else data)
+        split = self._trailing_word_start(text)
+        self._carry = text[split:]
+        self._hash(text[:split])
+        return self
+
+    def _trailing_word_start(self, text: str) -> int:
+        # Only the end of the text is searched, in a window that grows while it is filled by the same word
+        window = 64
+        while True:
+            start = max(0, len(text) - window)
+            match = _TRAILING_WORD.search(text, start)
+            if not match:
+                return len(text)
+            if match.start() > start or start == 0:
+                return match.start()
+            if window >= self.max_carry:
+                # A word this long is hashed in pieces
+                return len(text)
+            window *= 2
+
+    def _hash(self, text: str):
+        if text:
+            self.counts += self.vectorizer.transform([text]).toarray()[0]
+
+    def fingerprint(self) -> np.ndarray:
+        """
+        Returns the L2-normalized float32 fingerprint of everything added so far.
+        """
+        self._hash(self._carry + self._decoder.decode(b"", final=True))
+        self._carry = ""
+        return normalize(self.counts.astype(np.float32))
+
+
+def zip_members_in_order(zip_ref: zipfile.ZipFile) -> List[zipfile.ZipInfo]:
+    """
+    Returns the files of a zip in the order ``os.walk`` would visit them once extracted, with directories and files
+    sorted: the files of a directory before those of its subdirectories.
+    """
+    def key(info: zipfile.ZipInfo):
+        directory, _, name = info.filename.rpartition("/")
+        return ("/" + directory) if directory else "", name
+
+    return sorted((info for info in zip_ref.infolist() if not info.is_dir()), key=key)
+
+
+def fingerprint_zip(zip_path: str, n_features: int = N_FEATURES, chunk_size: int = 1024 * 1024) -> np.ndarray:
+    """
+    Fingerprints the concatenated contents of the files in a zip, streaming each member in chunks without extracting
+    it. The result equals hashing the contents of the extracted files read in sorted order, as a single string.
+    """
+    hasher = FeatureHasher(n_features)
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        for info in zip_members_in_order(zip_ref):
+            with zip_ref.open(info) as member:
+                while chunk := member.read(chunk_size):
+                    hasher.update(chunk)
+    return hasher.fingerprint()
+
+
+class FingerprintIndex:
+    """
+    Fingerprints of every previously validated file, for finding the most similar ones to a new file.
+
+    Fingerprints are L2-normalized float32 rows of a ``SegmentStore``, so each segment is one contiguous matrix and
+    the cosine similarity of a new fingerprint to it is a single matrix-vector product. The best matches of each
+    segment are selected with ``np.argpartition`` instead of a full sort, then merged.
+
+    With a ``directory``, segments are memory-mapped files that survive restarts and are shared by every process
+    reading the same directory. Indexes in ``extra_directories``, written by another process such as a backfill, are
+    searched too, and refreshed every ``refresh_interval`` seconds.
+    """
+
+    store_name = "fingerprints"
+
+    def __init__(self, directory: Optional[str] = None, n_features: int = N_FEATURES, segment_rows: int = 65536,
+                 readonly: bool = False, extra_directories: Sequence[str] = (), refresh_interval: float = 60):
+        self.n_features = n_features
+        self.store = SegmentStore(directory, self.store_name, n_features, np.float32, segment_rows=segment_rows,
+                                  readonly=readonly)
+        self.extra_stores = [
+            SegmentStore(extra_directory, self.store_name, n_features, np.float32, segment_rows=segment_rows,
+                         readonly=True)
+            for extra_directory in extra_directories
+        ]
+        self.refresh_interval = refresh_interval
+        self._refreshed_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._segment_ids = SegmentIds([self.store, *self.extra_stores])
+        self._file_ids: Set[int] = set()
+        self._load_new_file_ids()
+
+    def _load_new_file_ids(self):
+        # Only segments that were not read before are, outside the lock so that queries and adds are not held up
+        new_ids = self._segment_ids.new_ids()
+        with self._lock:
+            for ids in new_ids:
+                self._file_ids.update(ids.tolist())
+
+    def _segments(self) -> List[Segment]:
+        return [segment for store in [self.store, *self.extra_stores] for segment in store.segments()]
+
+    def __len__(self) -> int:
+        return sum(len(store) for store in [self.store, *self.extra_stores])
+
+    def __contains__(self, file_id: int) -> bool:
+        return file_id in self._file_ids
+
+    def add(self, file_id: int, fingerprint: np.ndarray) -> bool:
+        """
+        Adds a file's fingerprint. A file that is already indexed is not added again.
+        :return: Whether the fingerprint was added
+        """
+        vector = normalize(np.asarray(fingerprint, dtype=np.float32).reshape(self.n_features))
+        with self._lock:
+            if file_id in self._file_ids:
+                return False
+            self._file_ids.add(file_id)
+            self.store.append([file_id], vector)
+        return True
+
+    def query(self, fingerprint: np.ndarray, k: int = 5, exclude: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        Finds the indexed files most similar to ``fingerprint``.
+        :param fingerprint: Fingerprint of the new file
+        :param k: Number of matches to return
+        :param exclude: File ID to leave out, e.g. the file itself when it is scored again
+        :return: Up to ``k`` (file ID, cosine similarity) pairs, most similar first
+        """
+        vector = normalize(np.asarray(fingerprint, dtype=np.float32).reshape(self.n_features))
+        if self.extra_stores and time.monotonic() - self._refreshed_at >= self.refresh_interval:
+            self.refresh()
+        top_ids, top_similarities = [], []
+        for segment in self._segments():
+            similarities = segment.rows @ vector
+            if exclude is not None:
+                similarities[segment.ids == exclude] = -np.inf
+            segment_k = min(k, len(similarities))
+            top = np.argpartition(similarities, len(similarities) - segment_k)[len(similarities) - segment_k:]
+            top_ids.append(segment.ids[top])
+            top_similarities.append(similarities[top])
+        if not top_ids:
+            return []
+
+        ids, similarities = np.concatenate(top_ids), np.concatenate(top_similarities)
+        order = np.argsort(similarities)[::-1][:k]
+        return [(int(ids[i]), float(similarities[i])) for i in order if np.isfinite(similarities[i])]
+
+    def max_similarity(self, fingerprint: np.ndarray, exclude: Optional[int] = None) -> float:
+        """
+        Cosine similarity to the closest indexed file, 0 if there is none.
+        """
+        matches = self.query(fingerprint, k=1, exclude=exclude)
+        return matches[0][1] if matches else 0.0
+
+    def refresh(self):
+        """
+        Picks up fingerprints added by another process sharing the directory, or to the extra directories.
+        """
+        for store in [self.store, *self.extra_stores]:
+            store.refresh()
+        self._refreshed_at = time.monotonic()
+        self._load_new_file_ids()
+
+    def close(self):
+        for store in [self.store, *self.extra_stores]:
+            store.close()
+
+
+_index: Optional[FingerprintIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_index_dir() -> str:
+    """
+    Directory of the uniqueness indexes, ``OD_FINGERPRINT_INDEX_DIR``. It defaults to
+    ``~/.vana/fingerprints/<network>``, with the network from ``OD_CHAIN_NETWORK``.
+    """
+    network = os.environ.get("OD_CHAIN_NETWORK", "satori")
+    return os.environ.get("OD_FINGERPRINT_INDEX_DIR",
+                          os.path.join(os.path.expanduser("~"), ".vana", "fingerprints", network))
+
+
+def get_backfill_dir() -> str:
+    """
+    Directory the uniqueness indexes are backfilled into, next to the validator's own in ``get_index_dir()``. Each
+    index directory has a single writer, so a backfill can run alongside the validator.
+    """
+    return os.path.join(get_index_dir(), "backfill")
+
+
+def get_fingerprint_index() -> FingerprintIndex:
+    """
+    Returns the process-wide fingerprint index, stored in ``get_index_dir()``. It also searches the backfilled
+    fingerprints in ``get_backfill_dir()``.
+    """
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = FingerprintIndex(get_index_dir(), extra_directories=[get_backfill_dir()])
+        return _index
@@ -0,0 +1,253 @@
+# The MIT License (MIT)
+# Copyright © 2024 Corsali, Inc. dba Vana
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import json
+import os
+import threading
+from dataclasses import asdict
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+import vana
+
+from chatgpt.utils.peer_scoring import PeerScoringTask
+
+
+def write_json_atomically(path: str, data: Any):
+    """
+    Writes a JSON file so that readers see either the previous or the new content, never a partial file.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class AppendOnlyLog:
+    """
+    A JSON-lines file that records are only ever appended to.
+
+    Each ``append`` writes a single line, so its cost does not depend on how much has been written before. A
+    partially written last line, e.g. after a crash, is ignored when reading.
+    """
+
+    def __init__(self, path: str, fsync: bool = False):
+        self.path = path
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a")
+        if self._file.tell() > 0 and not self._ends_with_newline():
+            # Start after a record that was cut short instead of appending to it
+            self._file.write("\n")
+            self._file.flush()
+        self.size = sum(1 for _ in self)
+
+    def append(self, record: Dict[str, Any]):
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self.size += 1
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    vana.logging.warning(f"Skipping corrupt record in {self.path}")
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def truncate(self):
+        self.rewrite([])
+
+    def rewrite(self, records: Iterable[Dict[str, Any]]):
+        """
+        Atomically replaces the whole log with ``records``.
+        """
+        records = list(records)
+        tmp_path = f"{self.path}.tmp"
+        with self._lock:
+            with open(tmp_path, "w") as f:
+                for record in records:
+                    f.write(json.dumps(record, separators=(",", ":")) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._file.close()
+            os.replace(tmp_path, self.path)
+            self._file = open(self.path, "a")
+            self.size = len(records)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class StateJournal:
+    """
+    Write-ahead journal for the validator's peer scoring queue and weights.
+
+    Every mutation is appended as one record, instead of re-serializing the whole state after each verified file.
+    ``compact`` folds the journal into a snapshot, and ``replay`` rebuilds the state from the snapshot plus the
+    records written since.
+    """
+
+    snapshot_name = "peer-scoring-snapshot.json"
+    journal_name = "peer-scoring-journal.jsonl"
+
+    def __init__(self, directory: str, fsync: bool = False):
+        self.snapshot_path = os.path.join(directory, self.snapshot_name)
+        self.log = AppendOnlyLog(os.path.join(directory, self.journal_name), fsync=fsync)
+
+    def task_added(self, task: PeerScoringTask):
+        self.log.append({"op": "task", "task": asdict(task)})
+
+    def validator_processed(self, file_id: int, validator: str):
+        self.log.append({"op": "processed", "file_id": file_id, "validator": validator})
+
+    def task_expired(self, file_id: int):
+        self.log.append({"op": "expired", "file_id": file_id})
+
+    def weight_set(self, validator: str, weight: float):
+        self.log.append({"op": "weight", "validator": validator, "weight": weight})
+
+    def replay(self) -> Tuple[List[PeerScoringTask], Dict[str, float]]:
+        """
+        Rebuilds the peer scoring tasks and weights from the snapshot and the journal.
+        :return: Tasks that still have validators pending, and the latest weight of each validator
+        """
+        tasks: Dict[int, PeerScoringTask] = {}
+        weights: Dict[str, float] = {}
+
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path) as f:
+                snapshot = json.load(f)
+            tasks = {task["file_id"]: PeerScoringTask(**task) for task in snapshot.get("tasks", [])}
+            weights = snapshot.get("weights", {})
+
+        for record in self.log:
+            op = record.get("op")
+            if op == "task":
+                task = PeerScoringTask(**record["task"])
+                tasks[task.file_id] = task
+            elif op == "processed" and record["file_id"] in tasks:
+                tasks[record["file_id"]].processed_validators.append(record["validator"])
+            elif op == "expired":
+                tasks.pop(record["file_id"], None)
+            elif op == "weight":
+                weights[record["validator"]] = record["weight"]
+
+        pending = [task for task in tasks.values() if set(task.active_validators) - set(task.processed_validators)]
+        return pending, weights
+
+    def compact(self, tasks: Iterable[PeerScoringTask], weights: Dict[str, float]):
+        """
+        Writes the current state as the new snapshot and empties the journal.
+        """
+        write_json_atomically(self.snapshot_path, {
+            "tasks": [asdict(task) for task in tasks],
+            "weights": weights,
+        })
+        self.log.truncate()
+
+    def close(self):
+        self.log.close()
+
+
+class FileProcessingJournal:
+    """
+    Durable record of how far each file got through verification, so that a restarted validator can resume a file
+    from its last completed stage instead of starting over.
+
+    Each stage transition is appended with the data needed to resume from it (file paths, the evaluated contribution,
+    the transaction hash). Files that reach a final stage are dropped when the journal is reopened.
+    """
+
+    journal_name = "file-processing-journal.jsonl"
+
+    DOWNLOADED = "downloaded"
+    DECRYPTED = "decrypted"
+    EVALUATED = "evaluated"
+    SUBMITTED = "submitted"
+    CONFIRMED = "confirmed"
+    FAILED = "failed"
+
+    STAGES = [DOWNLOADED, DECRYPTED, EVALUATED, SUBMITTED, CONFIRMED]
+    FINAL_STAGES = {CONFIRMED, FAILED}
+
+    def __init__(self, directory: str, fsync: bool = True):
+        self.work_dir = os.path.join(directory, "files")
+        self.log = AppendOnlyLog(os.path.join(directory, self.journal_name), fsync=fsync)
+        self._lock = threading.Lock()
+        self._files: Dict[int, Dict[str, Any]] = {}
+
+        for record in self.log:
+            progress = self._files.setdefault(record["file_id"], {})
+            progress.update(record)
+        self._files = {
+            file_id: progress for file_id, progress in self._files.items()
+            if progress["stage"] not in self.FINAL_STAGES
+        }
+        self.log.rewrite(self._files.values())
+
+    def get(self, file_id: int) -> Dict[str, Any]:
+        """
+        Returns everything recorded for a file that is still in progress, or an empty dict.
+        """
+        with self._lock:
+            return dict(self._files.get(file_id, {}))
+
+    def reached(self, file_id: int, stage: str) -> bool:
+        """
+        Whether the file has completed ``stage`` (or a later one).
+        """
+        current = self.get(file_id).get("stage")
+        return current in self.STAGES and self.STAGES.index(current) >= self.STAGES.index(stage)
+
+    def unfinished(self) -> List[int]:
+        with self._lock:
+            return sorted(self._files)
+
+    def file_dir(self, file_id: int) -> str:
+        """
+        Directory that survives restarts, for the intermediate files of ``file_id``.
+        """
+        path = os.path.join(self.work_dir, str(file_id))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def record(self, file_id: int, stage: str, **data: Any):
+        record = {"file_id": file_id, "stage": stage, **data}
+        self.log.append(record)
+        with self._lock:
+            if stage in self.FINAL_STAGES:
+                self._files.pop(file_id, None)
+            else:
+                self._files.setdefault(file_id, {}).update(record)
+
+    def close(self):
+        self.log.close()
@@ -0,0 +1,339 @@
+# The MIT License (MIT)
+# Copyright © 2024 Corsali, Inc. dba Vana
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import bisect
+import math
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import vana
+
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class _ThreadCell:
+    """
+    Holds a thread's values in its ``threading.local``, so that it is collected when the thread exits.
+    """
+
+    __slots__ = ("values", "__weakref__")
+
+    def __init__(self, values: List[float]):
+        self.values = values
+
+
+class _PerThreadValues:
+    """
+    Pre-allocated values that each thread updates in its own list, so updates never take a lock or contend with
+    other threads. Readers add up the lists of every live thread, and the values of threads that have exited, which
+    are folded into a single base list so that short-lived threads do not leave their lists behind.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._local = threading.local()
+        self._cells: Dict[int, List[float]] = {}
+        self._base = [0.0] * size
+        self._next_key = 0
+        # Re-entrant, the garbage collector may retire a thread's list while the lock is held
+        self._lock = threading.RLock()
+
+    def cell(self) -> List[float]:
+        holder = getattr(self._local, "cell", None)
+        if holder is None:
+            # Only the first update from each thread registers its list
+            holder = self._local.cell = _ThreadCell([0.0] * self.size)
+            with self._lock:
+                key = self._next_key
+                self._next_key += 1
+                self._cells[key] = holder.values
+            weakref.finalize(holder, self._retire, key)
+        return holder.values
+
+    def _retire(self, key: int):
+        with self._lock:
+            values = self._cells.pop(key)
+            for i, value in enumerate(values):
+                self._base[i] += value
+
+    def totals(self) -> List[float]:
+        with self._lock:
+            totals = list(self._base)
+            cells = list(self._cells.values())
+        for cell in cells:
+            for i in range(self.size):
+                totals[i] += cell[i]
+        return totals
+
+
+class _Metric:
+    """
+    A named metric with optional labels. ``labels`` returns the child for a combination of label values, which
+    is created once and can be kept by the caller.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Optional["MetricsRegistry"] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], "_Metric"] = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, **labels: str) -> "_Metric":
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self) -> "_Metric":
+        raise NotImplementedError
+
+    def _samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        raise NotImplementedError
+
+    def samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        """
+        Yields (name, labels, value) for every child.
+        """
+        if not self.labelnames:
+            yield from self._samples()
+            return
+        with self._lock:
+            children = list(self._children.items())
+        for key, child in children:
+            for name, labels, value in child._samples():
+                yield name, {**dict(zip(self.labelnames, key)), **labels}, value
+
+
+class Counter(_Metric):
+    """
+    A value that only goes up, e.g. bytes downloaded or cache hits.
+    """
+
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values = _PerThreadValues(1)
+
+    def _new_child(self) -> "Counter":
+        return Counter(self.name, self.documentation)
+
+    def inc(self, amount: float = 1):
+        self._values.cell()[0] += amount
+
+    @property
+    def value(self) -> float:
+        return self._values.totals()[0]
+
+    def _samples(self):
+        yield self.name, {}, self.value
+
+
+class Gauge(_Metric):
+    """
+    A value that goes up and down, e.g. a queue depth. Instead of being set, it can read its value from a function
+    when the metrics are collected.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._value = 0.0
+        self._function: Optional[Callable[[], float]] = None
+
+    def _new_child(self) -> "Gauge":
+        return Gauge(self.name, self.documentation)
+
+    def set(self, value: float):
+        self._value = value
+
+    def set_function(self, function: Callable[[], float]):
+        self._function = function
+
+    @property
+    def value(self) -> float:
+        return self._function() if self._function else self._value
+
+    def _samples(self):
+        try:
+            yield self.name, {}, self.value
+        except Exception as e:
+            vana.logging.debug(f"Could not collect {self.name}: {e}")
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values, e.g. latencies, counted in fixed buckets.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Optional["MetricsRegistry"] = None, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+        # One count per bucket plus +Inf, then the sum of the observed values
+        self._values = _PerThreadValues(len(self.buckets) + 2)
+
+    def _new_child(self) -> "Histogram":
+        return Histogram(self.name, self.documentation, buckets=self.buckets)
+
+    def observe(self, value: float):
+        cell = self._values.cell()
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    @contextmanager
+    def time(self):
+        """
+        Observes how long the block takes, in seconds.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    @property
+    def count(self) -> float:
+        return sum(self._values.totals()[:-1])
+
+    def _samples(self):
+        totals = self._values.totals()
+        cumulative = 0.0
+        for bound, count in zip((*self.buckets, math.inf), totals):
+            cumulative += count
+            yield f"{self.name}_bucket", {"le": _format_value(bound)}, cumulative
+        yield f"{self.name}_sum", {}, totals[-1]
+        yield f"{self.name}_count", {}, cumulative
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class MetricsRegistry:
+    """
+    The metrics served by a ``MetricsServer``.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        """
+        Renders every metric in the Prometheus text exposition format.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                label_text = ",".join(f'{key}="{_escape(str(label))}"' for key, label in labels.items())
+                lines.append(f"{name}{{{label_text}}} {_format_value(value)}" if label_text
+                             else f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = Histogram("chatgpt_stage_duration_seconds",
+                          "Time spent in each stage of verifying a file, in seconds", ["stage"], registry=REGISTRY)
+FILES = Counter("chatgpt_files_total", "Files the validator finished with, by outcome", ["outcome"],
+                registry=REGISTRY)
+DOWNLOADED_BYTES = Counter("chatgpt_downloaded_bytes_total", "Bytes downloaded from file storage", registry=REGISTRY)
+CACHE_LOOKUPS = Counter("chatgpt_cache_lookups_total", "Cache lookups, by cache and whether they hit",
+                        ["cache", "result"], registry=REGISTRY)
+RPC_REQUESTS = Counter("chatgpt_rpc_requests_total", "JSON-RPC requests sent, by method", ["method"],
+                       registry=REGISTRY)
+LLM_TOKENS = Counter("chatgpt_llm_tokens_total", "Tokens used by LLM validation requests", ["kind"],
+                     registry=REGISTRY)
+QUEUE_DEPTH = Gauge("chatgpt_queue_depth", "Items waiting in each of the validator's queues", ["queue"],
+                    registry=REGISTRY)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer:
+    """
+    Serves the metrics of a registry at ``/metrics`` for Prometheus to scrape, from a background thread.
+    """
+
+    def __init__(self, port: int, host: str = "127.0.0.1", registry: MetricsRegistry = REGISTRY):
+        handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def start(self) -> "MetricsServer":
+        self.thread.start()
+        vana.logging.info(f"Serving metrics at http://{self.server.server_address[0]}:{self.port}/metrics")
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,263 @@
+# The MIT License (MIT)
+# Copyright © 2024 Corsali, Inc. dba Vana
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import json
+import re
+import threading
+import time
+import zipfile
+import zlib
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+import numpy as np
+
+from chatgpt.utils.fingerprint import get_backfill_dir, get_index_dir
+from chatgpt.utils.segments import Segment, SegmentIds, SegmentStore
+
+NUM_PERM = 64
+BANDS = 8
+SHINGLE_SIZE = 3
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+
+# Fixed seeds, so signatures stay comparable across processes and restarts
+_rng = np.random.default_rng(20240601)
+_PERM_A = _rng.integers(1, 2 ** 63, NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_PERM_B = _rng.integers(0, 2 ** 63, NUM_PERM, dtype=np.uint64)
+_SHINGLE_MULTIPLIERS = _rng.integers(1, 2 ** 63, SHINGLE_SIZE, dtype=np.uint64) | np.uint64(1)
+_BAND_MULTIPLIERS = _rng.integers(1, 2 ** 63, NUM_PERM // BANDS, dtype=np.uint64) | np.uint64(1)
+
+
+def conversation_texts(zip_path: str) -> List[str]:
+    """
+    Extracts the text of each conversation in a ChatGPT export, from its title and message parts.
+    """
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        if 'conversations.json' not in zip_ref.namelist():
+            return []
+        with zip_ref.open('conversations.json') as f:
+            conversations = json.load(f)
+
+    texts = []
+    for conversation in conversations:
+        parts = [conversation.get("title") or ""]
+        for node in (conversation.get("mapping") or {}).values():
+            message = (node or {}).get("message") or {}
+            for part in (message.get("content") or {}).get("parts") or []:
+                if isinstance(part, str):
+                    parts.append(part)
+        texts.append(" ".join(parts))
+    return texts
+
+
+def shingle_hashes(text: str) -> np.ndarray:
+    """
+    Hashes the overlapping word ``SHINGLE_SIZE``-grams of a text to 64-bit integers.
+    """
+    tokens = _TOKEN_PATTERN.findall(text.lower())
+    if not tokens:
+        return np.zeros(0, dtype=np.uint64)
+    token_hashes = np.fromiter((zlib.crc32(token.encode()) for token in tokens), dtype=np.uint64, count=len(tokens))
+    if len(token_hashes) < SHINGLE_SIZE:
+        token_hashes = np.concatenate((token_hashes, np.zeros(SHINGLE_SIZE - len(token_hashes), dtype=np.uint64)))
+    count = len(token_hashes) - SHINGLE_SIZE + 1
+    hashes = np.zeros(count, dtype=np.uint64)
+    for offset, multiplier in enumerate(_SHINGLE_MULTIPLIERS):
+        hashes += token_hashes[offset:offset + count] * multiplier
+    return np.unique(hashes)
+
+
+def minhash_signatures(texts: Iterable[str], chunk_size: int = 4096) -> np.ndarray:
+    """
+    Computes a MinHash signature per text, with ``NUM_PERM`` multiply-shift hash functions over its shingles.
+    :return: (len(texts), NUM_PERM) uint32 array. Texts without any word get a signature of all 0xFFFFFFFF
+    """
+    signatures = []
+    for text in texts:
+        shingles = shingle_hashes(text)
+        signature = np.full(NUM_PERM, _MAX_HASH, dtype=np.uint64)
+        for start in range(0, len(shingles), chunk_size):
+            chunk = shingles[start:start + chunk_size, None]
+            hashed = (chunk * _PERM_A + _PERM_B) >> np.uint64(32)
+            np.minimum(signature, hashed.min(axis=0), out=signature)
+        signatures.append(signature.astype(np.uint32))
+    return np.array(signatures, dtype=np.uint32).reshape(-1, NUM_PERM)
+
+
+def conversation_signatures(zip_path: str) -> np.ndarray:
+    """
+    MinHash signatures of the conversations of a ChatGPT export that contain any words.
+    """
+    signatures = minhash_signatures(conversation_texts(zip_path))
+    return signatures[(signatures != np.uint32(_MAX_HASH)).any(axis=1)]
+
+
+def band_keys(signatures: np.ndarray) -> np.ndarray:
+    """
+    Hashes each band of ``NUM_PERM // BANDS`` rows of the signatures into one 64-bit bucket key.
+    :return: (len(signatures), BANDS) uint64 array
+    """
+    rows = signatures.astype(np.uint64).reshape(len(signatures), BANDS, NUM_PERM // BANDS)
+    keys = (rows * _BAND_MULTIPLIERS).sum(axis=2, dtype=np.uint64)
+    return keys ^ (keys >> np.uint64(29))
+
+
+def band_index(ids: np.ndarray, signatures: np.ndarray, chunk_size: int = 65536) -> Dict[str, np.ndarray]:
+    """
+    Builds the LSH lookup arrays of a segment: per band, the bucket keys of its rows in sorted order, and the row
+    each key belongs to.
+    """
+    keys = np.concatenate([band_keys(signatures[start:start + chunk_size])
+                           for start in range(0, len(signatures), chunk_size)] or [np.zeros((0, BANDS), np.uint64)])
+    order = np.argsort(keys, axis=0, kind="stable")
+    return {
+        "band_keys": np.ascontiguousarray(np.take_along_axis(keys, order, axis=0).T),
+        "band_rows": np.ascontiguousarray(order.T.astype(np.int32)),
+    }
+
+
+class ConversationIndex:
+    """
+    MinHash signatures of every conversation in previously validated exports, bucketed with banded LSH.
+
+    Two conversations land in the same bucket of a band when all rows of that band of their signatures agree, which
+    is likely for near-duplicates and unlikely otherwise. Candidates from any band are confirmed by comparing whole
+    signatures, whose fraction of equal rows estimates the Jaccard similarity of the conversations' shingles.
+
+    Signatures are rows of a ``SegmentStore``, tagged with the file they belong to. Each segment stores its bucket
+    keys sorted per band, which are looked up with binary search, so a lookup costs O(log n) per segment and the
+    store keeps O(log n) segments.
+
+    Indexes in ``extra_directories``, written by another process such as a backfill, are searched too, and refreshed
+    every ``refresh_interval`` seconds.
+    """
+
+    store_name = "conversations"
+
+    def __init__(self, directory: Optional[str] = None, threshold: float = 0.8, segment_rows: int = 65536,
+                 readonly: bool = False, extra_directories: Sequence[str] = (), refresh_interval: float = 60):
+        self.threshold = threshold
+        self.store = SegmentStore(directory, self.store_name, NUM_PERM, np.uint32, segment_rows=segment_rows,
+                                  build_extras=band_index, readonly=readonly)
+        self.extra_stores = [
+            SegmentStore(extra_directory, self.store_name, NUM_PERM, np.uint32, segment_rows=segment_rows,
+                         build_extras=band_index, readonly=True)
+            for extra_directory in extra_directories
+        ]
+        self.refresh_interval = refresh_interval
+        self._refreshed_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._segment_ids = SegmentIds([self.store, *self.extra_stores])
+        self._indexed_files: Set[int] = set()
+        self._load_new_indexed_files()
+
+    def _load_new_indexed_files(self):
+        # Only segments that were not read before are, outside the lock so that lookups and adds are not held up
+        new_ids = self._segment_ids.new_ids()
+        with self._lock:
+            for ids in new_ids:
+                self._indexed_files.update(ids.tolist())
+
+    def _segments(self) -> List[Segment]:
+        return [segment for store in [self.store, *self.extra_stores] for segment in store.segments()]
+
+    def __len__(self) -> int:
+        return sum(len(store) for store in [self.store, *self.extra_stores])
+
+    def __contains__(self, file_id: int) -> bool:
+        return file_id in self._indexed_files
+
+    def add(self, file_id: int, signatures: np.ndarray) -> bool:
+        """
+        Adds the conversation signatures of a file. A file that is already indexed is not added again.
+        :return: Whether the signatures were added
+        """
+        signatures = np.asarray(signatures, dtype=np.uint32).reshape(-1, NUM_PERM)
+        with self._lock:
+            if file_id in self._indexed_files:
+                return False
+            self._indexed_files.add(file_id)
+            self.store.append(np.full(len(signatures), file_id, dtype=np.int64), signatures)
+        return True
+
+    def similarities(self, signatures: np.ndarray, exclude: Optional[int] = None) -> np.ndarray:
+        """
+        Estimates, for each conversation, the Jaccard similarity to the closest indexed conversation it shares an LSH
+        bucket with.
+        :param signatures: (n, NUM_PERM) signatures of a new export's conversations
+        :param exclude: File ID whose conversations are left out, e.g. the file itself when it is scored again
+        :return: (n,) similarities between 0 and 1, 0 where no candidate was found
+        """
+        signatures = np.asarray(signatures, dtype=np.uint32).reshape(-1, NUM_PERM)
+        keys = band_keys(signatures)
+        best = np.zeros(len(signatures))
+        if self.extra_stores and time.monotonic() - self._refreshed_at >= self.refresh_interval:
+            self.refresh()
+        for segment in self._segments():
+            sorted_keys, sorted_rows = segment.extras["band_keys"], segment.extras["band_rows"]
+            candidates: Dict[int, List[np.ndarray]] = defaultdict(list)
+            for band in range(BANDS):
+                lefts = np.searchsorted(sorted_keys[band], keys[:, band], side="left")
+                rights = np.searchsorted(sorted_keys[band], keys[:, band], side="right")
+                for i in np.flatnonzero(rights > lefts).tolist():
+                    candidates[i].append(sorted_rows[band, lefts[i]:rights[i]])
+            for i, rows in candidates.items():
+                rows = np.unique(np.concatenate(rows))
+                if exclude is not None:
+                    rows = rows[segment.ids[rows] != exclude]
+                if len(rows):
+                    best[i] = max(best[i], (segment.rows[rows] == signatures[i]).mean(axis=1).max())
+        return best
+
+    def duplicate_fraction(self, signatures: np.ndarray, exclude: Optional[int] = None) -> float:
+        """
+        Fraction of a new export's conversations that are near-duplicates of already indexed ones.
+        """
+        if len(signatures) == 0:
+            return 0.0
+        return float((self.similarities(signatures, exclude=exclude) >= self.threshold).mean())
+
+    def refresh(self):
+        """
+        Picks up conversations added by another process sharing the directory, or to the extra directories.
+        """
+        for store in [self.store, *self.extra_stores]:
+            store.refresh()
+        self._refreshed_at = time.monotonic()
+        self._load_new_indexed_files()
+
+    def close(self):
+        for store in [self.store, *self.extra_stores]:
+            store.close()
+
+
+_index: Optional[ConversationIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_conversation_index() -> ConversationIndex:
+    """
+    Returns the process-wide conversation index, stored next to the fingerprint index in
+    ``OD_FINGERPRINT_INDEX_DIR``. It also searches the backfilled conversations in ``get_backfill_dir()``.
+    """
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = ConversationIndex(get_index_dir(), extra_directories=[get_backfill_dir()])
+        return _index
@@ -0,0 +1,150 @@
+# The MIT License (MIT)
+# Copyright © 2024 Corsali, Inc. dba Vana
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import heapq
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+
+@dataclass
+class PeerScoringTask:
+    file_id: int
+    active_validators: List[str]
+    own_submission: Dict[str, Any]
+    added_at_block: int
+    processed_validators: List[str] = field(default_factory=list)
+
+
+class PeerScoringQueue:
+    """
+    Files waiting for other validators' scores, indexed so that a scoring pass only touches pairs that can change.
+
+    Tasks are keyed by ``file_id``, the (file, validator) pairs still waiting for a score are kept in per-file sets,
+    and a min-heap keyed by ``added_at_block + max_wait_blocks`` yields the tasks whose deadline has passed without
+    scanning the others.
+
+    When ``event_driven`` is set, a pair is only returned by ``pairs_to_check`` once when its task is added and again
+    after ``mark_reported`` is called for it (e.g. from a ``FileVerified`` event). Otherwise every pending pair is
+    checked on every pass.
+    """
+
+    def __init__(self, max_wait_blocks: int, tasks: Iterable[PeerScoringTask] = (), event_driven: bool = False):
+        self.max_wait_blocks = max_wait_blocks
+        self.event_driven = event_driven
+
+        self._tasks: Dict[int, PeerScoringTask] = {}
+        self._pending: Dict[int, Set[str]] = {}
+        self._deadlines: List[Tuple[int, int]] = []
+        self._to_check: Dict[int, Set[str]] = {}
+        self._lock = threading.RLock()
+
+        for task in tasks:
+            self.add(task)
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def __contains__(self, file_id: int) -> bool:
+        return file_id in self._tasks
+
+    def __iter__(self) -> Iterator[PeerScoringTask]:
+        return iter(list(self._tasks.values()))
+
+    @property
+    def pending_count(self) -> int:
+        """
+        Number of (file, validator) pairs still waiting for a score.
+        """
+        return sum(len(validators) for validators in self._pending.values())
+
+    def get(self, file_id: int) -> Optional[PeerScoringTask]:
+        return self._tasks.get(file_id)
+
+    def pending(self, file_id: int) -> Set[str]:
+        return set(self._pending.get(file_id, ()))
+
+    def add(self, task: PeerScoringTask):
+        with self._lock:
+            pending = set(task.active_validators).difference(task.processed_validators)
+            if not pending:
+                return
+            self._tasks[task.file_id] = task
+            self._pending[task.file_id] = pending
+            if self.event_driven:
+                self._to_check[task.file_id] = set(pending)
+            heapq.heappush(self._deadlines, (task.added_at_block + self.max_wait_blocks, task.file_id))
+
+    def remove(self, file_id: int):
+        with self._lock:
+            # The heap entry is skipped lazily once it reaches the top
+            self._tasks.pop(file_id, None)
+            self._pending.pop(file_id, None)
+            self._to_check.pop(file_id, None)
+
+    def mark_reported(self, file_id: int, validator: str):
+        """
+        Flags a pair whose validator has submitted a score, so that the next pass reads it.
+        """
+        with self._lock:
+            if self.event_driven and validator in self._pending.get(file_id, ()):
+                self._to_check.setdefault(file_id, set()).add(validator)
+
+    def pairs_to_check(self) -> List[Tuple[int, str]]:
+        """
+        Returns the (file, validator) pairs whose score may have been submitted since the last pass.
+        """
+        with self._lock:
+            if not self.event_driven:
+                return [(file_id, validator) for file_id, validators in self._pending.items() for validator in validators]
+            pairs = [(file_id, validator) for file_id, validators in self._to_check.items() for validator in validators]
+            self._to_check = {}
+            return pairs
+
+    def mark_processed(self, file_id: int, validator: str):
+        """
+        Records that a validator has been scored for a file, dropping the task once every validator is scored.
+        """
+        with self._lock:
+            pending = self._pending.get(file_id)
+            if pending is None or validator not in pending:
+                return
+            pending.remove(validator)
+            self._tasks[file_id].processed_validators.append(validator)
+            to_check = self._to_check.get(file_id)
+            if to_check:
+                to_check.discard(validator)
+            if not pending:
+                self.remove(file_id)
+
+    def expire(self, current_block: int) -> List[Tuple[int, str]]:
+        """
+        Removes every task whose deadline is at or before ``current_block``.
+        :return: The (file, validator) pairs that were still pending when their deadline passed
+        """
+        expired = []
+        with self._lock:
+            while self._deadlines and self._deadlines[0][0] <= current_block:
+                deadline, file_id = heapq.heappop(self._deadlines)
+                task = self._tasks.get(file_id)
+                if task is None or task.added_at_block + self.max_wait_blocks != deadline:
+                    continue
+                for validator in sorted(self._pending.get(file_id, ())):
+                    expired.append((file_id, validator))
+                    task.processed_validators.append(validator)
+                self.remove(file_id)
+        return expired
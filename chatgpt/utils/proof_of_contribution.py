@@ -1,33 +1,65 @@
 import base64
 import gnupg
+import numpy as np
 import os
 import requests
 import tempfile
 import traceback
 import vana
 from chatgpt.models.contribution import Contribution
+from chatgpt.utils.conversation_store import get_conversation_store
+from chatgpt.utils.deadlines import Cancelled, CancelToken
+from chatgpt.utils.fingerprint import fingerprint_zip, get_fingerprint_index
+from chatgpt.utils.metrics import DOWNLOADED_BYTES
+from chatgpt.utils.minhash import conversation_signatures, get_conversation_index
+from chatgpt.utils.tracing import traced
 from chatgpt.utils.validator import evaluate_chatgpt_zip
+from typing import Optional, Tuple
 from urllib.parse import urlparse
 
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
 
 async def proof_of_contribution(file_id: int, input_url: str, input_encryption_key: str) -> Contribution:
-    contribution = Contribution(file_id=file_id, is_valid=False)
     decrypted_file_path = download_and_decrypt_file(input_url, input_encryption_key)
+    if decrypted_file_path is None:
+        return Contribution(file_id=file_id, is_valid=False)
 
-    if decrypted_file_path is not None:
-        contribution.scores.quality = proof_of_quality(decrypted_file_path)
-        contribution.scores.ownership = proof_of_ownership(decrypted_file_path)
-        contribution.scores.uniqueness = proof_of_uniqueness(decrypted_file_path)
-        contribution.scores.authenticity = proof_of_authenticity(decrypted_file_path)
-        contribution.is_valid = all([
-            contribution.scores.quality > 0.5,
-            contribution.scores.ownership >= 0.0,
-            contribution.scores.uniqueness >= 0.0,
-            contribution.scores.authenticity >= 0.0
-        ])
-
-        # Clean up
-        os.remove(decrypted_file_path)
+    contribution = score_file(file_id, decrypted_file_path)
+
+    # Clean up
+    os.remove(decrypted_file_path)
+    return contribution
+
+
+def score_file(file_id: int, decrypted_file_path: str, token: Optional[CancelToken] = None,
+               llm_timeout: Optional[float] = None) -> Contribution:
+    """
+    Run every proof against a decrypted file.
+    :param file_id: ID of the file on the DLP contract
+    :param decrypted_file_path: Path to the decrypted file
+    :param token: Cancels the scoring, e.g. when the file's deadline passes
+    :param llm_timeout: Timeout of each LLM request in seconds
+    :return: The file's contribution
+    """
+    contribution = Contribution(file_id=file_id, is_valid=False)
+    contribution.scores.quality = proof_of_quality(decrypted_file_path, token=token, llm_timeout=llm_timeout)
+    if token:
+        token.check()
+    contribution.scores.ownership = proof_of_ownership(decrypted_file_path)
+    fingerprints = uniqueness_fingerprints(decrypted_file_path)
+    contribution.scores.uniqueness = proof_of_uniqueness(decrypted_file_path, file_id=file_id,
+                                                         fingerprints=fingerprints)
+    contribution.scores.authenticity = proof_of_authenticity(decrypted_file_path)
+    contribution.is_valid = all([
+        contribution.scores.quality > 0.5,
+        contribution.scores.ownership >= 0.0,
+        contribution.scores.uniqueness >= 0.0,
+        contribution.scores.authenticity >= 0.0
+    ])
+    # Only validated files are compared against, so that rejected uploads do not lower the uniqueness of later files
+    if contribution.is_valid and fingerprints is not None:
+        index_validated_file(file_id, *fingerprints)
     return contribution
 
 
@@ -39,22 +71,85 @@ def download_and_decrypt_file(input_url, input_encryption_key):
     :return: Path to the decrypted file
     """
     temp_dir = tempfile.mkdtemp()
+    encrypted_file_path = download_file(input_url, temp_dir)
+    if encrypted_file_path is None:
+        return None
+    return decrypt_file(encrypted_file_path, input_encryption_key, temp_dir)
+
 
-    # Extract file extension from URL
+def get_file_extension(input_url) -> str:
+    """
+    Extract the file extension from a URL, defaulting to .zip
+    """
     parsed_url = urlparse(input_url)
     file_extension = os.path.splitext(parsed_url.path)[1]
     if not file_extension:
         file_extension = '.zip'
+    return file_extension
 
-    encrypted_file_path = os.path.join(temp_dir, f"encrypted_file{file_extension}")
-    response = requests.get(input_url)
 
-    if response.status_code != 200:
-        vana.logging.error(f"Failed to download file from {input_url}")
-        return None
+def download_file(input_url, output_dir, token: Optional[CancelToken] = None):
+    """
+    Download the encrypted file from the input URL, streaming it to disk in chunks.
+    :param input_url: URL of the encrypted file
+    :param output_dir: Directory to save the file to
+    :param token: Cancels the download. It also bounds the time to connect and between received chunks
+    :return: Path to the encrypted file
+    """
+    token = token or CancelToken()
+    encrypted_file_path = os.path.join(output_dir, f"encrypted_file{get_file_extension(input_url)}")
+    response = requests.get(input_url, stream=True, timeout=token.remaining())
+    token.on_cancel(response.close)
+
+    with response:
+        if response.status_code != 200:
+            vana.logging.error(f"Failed to download file from {input_url}")
+            return None
 
-    with open(encrypted_file_path, 'wb') as f:
-        f.write(response.content)
+        try:
+            with open(encrypted_file_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    token.check()
+                    f.write(chunk)
+                    DOWNLOADED_BYTES.inc(len(chunk))
+            token.check()
+        except BaseException:
+            # Do not leave a partial file behind to be mistaken for a complete download
+            if os.path.exists(encrypted_file_path):
+                os.remove(encrypted_file_path)
+            token.check()
+            raise
+    return encrypted_file_path
+
+
+class _CancellableGPG(gnupg.GPG):
+    """
+    Kills the gpg subprocesses it starts when ``token`` is cancelled.
+    """
+
+    def __init__(self, token: CancelToken, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.token = token
+
+    def _open_subprocess(self, *args, **kwargs):
+        self.token.check()
+        process = super()._open_subprocess(*args, **kwargs)
+        self.token.on_cancel(process.kill)
+        return process
+
+
+def decrypt_file(encrypted_file_path, input_encryption_key, output_dir, token: Optional[CancelToken] = None,
+                 digest=None):
+    """
+    Decrypt a downloaded file using the input encryption key.
+    :param encrypted_file_path: Path to the encrypted file
+    :param input_encryption_key: Base64 encoded encrypted symmetric key
+    :param output_dir: Directory to save the decrypted file to
+    :param token: Cancels the decryption by killing gpg
+    :param digest: A ``hashlib`` hash, e.g. ``hashlib.sha256()``, updated with the decrypted data as it is written
+    :return: Path to the decrypted file
+    """
+    file_extension = os.path.splitext(encrypted_file_path)[1]
 
     # Decode symmetric key from base64 and decrypt it using private key
     encrypted_symmetric_key = base64.b64decode(input_encryption_key)
@@ -62,7 +157,7 @@ def download_and_decrypt_file(input_url, input_encryption_key):
     private_key_bytes = base64.b64decode(private_key_base64)
 
     # Import the private key into the gnupg keyring
-    gpg = gnupg.GPG()
+    gpg = _CancellableGPG(token) if token else gnupg.GPG()
     import_result = gpg.import_keys(private_key_bytes)
     vana.logging.info(f"Private key import result: {import_result}")
 
@@ -70,32 +165,47 @@ def download_and_decrypt_file(input_url, input_encryption_key):
     decrypted_symmetric_key = gpg.decrypt(encrypted_symmetric_key)
 
     # Decrypt the file using the symmetric key
-    decrypted_file_path = os.path.join(temp_dir, f"decrypted_file{file_extension}")
+    decrypted_file_path = os.path.join(output_dir, f"decrypted_file{file_extension}")
     with open(encrypted_file_path, 'rb') as encrypted_file, open(decrypted_file_path, 'wb') as decrypted_file:
         decrypted_data = gpg.decrypt_file(encrypted_file,
                                           passphrase=decrypted_symmetric_key.data.decode('utf-8'))
         vana.logging.info(f"Decryption status: {decrypted_data.status}")
-        decrypted_file.write(decrypted_data.data)
+        if token:
+            token.check()
+        data = memoryview(decrypted_data.data)
+        for start in range(0, len(data), DOWNLOAD_CHUNK_SIZE):
+            chunk = data[start:start + DOWNLOAD_CHUNK_SIZE]
+            if digest is not None:
+                digest.update(chunk)
+            decrypted_file.write(chunk)
 
     vana.logging.info(f"Successfully decrypted file: {decrypted_file_path}")
     return decrypted_file_path
 
 
-def proof_of_quality(decrypted_file_path) -> float:
+@traced()
+def proof_of_quality(decrypted_file_path, token: Optional[CancelToken] = None,
+                     llm_timeout: Optional[float] = None) -> float:
     """
     Validate the decrypted file.
     :param decrypted_file_path:
+    :param token: Cancels the validation
+    :param llm_timeout: Timeout of each LLM request in seconds
     :return:  quality_score
     """
     try:
-        validation_result = evaluate_chatgpt_zip(decrypted_file_path)
+        validation_result = evaluate_chatgpt_zip(decrypted_file_path, token=token, llm_timeout=llm_timeout,
+                                                 store=get_conversation_store())
         return validation_result["score"]
+    except Cancelled:
+        raise
     except Exception as e:
         vana.logging.error(f"Error during validation, assuming file is invalid: {e}")
         vana.logging.error(traceback.format_exc())
         return 0.0
 
 
+@traced()
 def proof_of_ownership(decrypted_file_path) -> float:
     """
     Check the ownership of the decrypted file.
@@ -107,17 +217,68 @@ def proof_of_ownership(decrypted_file_path) -> float:
     return 0.0
 
 
-def proof_of_uniqueness(decrypted_file_path) -> float:
+@traced()
+def uniqueness_fingerprints(decrypted_file_path) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Computes what the uniqueness indexes store of a file.
+    :param decrypted_file_path:
+    :return: The file's fingerprint and the MinHash signatures of its conversations, or None if the file cannot be read
+    """
+    try:
+        return fingerprint_zip(decrypted_file_path), conversation_signatures(decrypted_file_path)
+    except Exception as e:
+        vana.logging.error(f"Error while fingerprinting file: {e}")
+        vana.logging.error(traceback.format_exc())
+        return None
+
+
+@traced()
+def index_validated_file(file_id: int, fingerprint: np.ndarray, signatures: np.ndarray):
+    """
+    Adds a validated file to the uniqueness indexes, so later files are compared against it.
+    A failure is only logged, the file's contribution does not depend on it and must not be evaluated again.
+    """
+    try:
+        get_fingerprint_index().add(file_id, fingerprint)
+        get_conversation_index().add(file_id, signatures)
+    except Exception as e:
+        vana.logging.error(f"Error while indexing file {file_id}: {e}")
+        vana.logging.error(traceback.format_exc())
+
+
+@traced()
+def proof_of_uniqueness(decrypted_file_path, file_id: Optional[int] = None,
+                        fingerprints: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> float:
     """
     Check the similarity of the decrypted file with previously validated files.
+    The file is not added to the indexes here, ``score_file`` adds it once it is known to be valid.
     :param decrypted_file_path:
-    :return: uniqueness score
+    :param file_id: ID of the file on the DLP contract, to skip the file itself if it was indexed before
+    :param fingerprints: The file's ``uniqueness_fingerprints``, if they were already computed
+    :return: uniqueness score, the lower of 1 minus the cosine similarity to the closest previously validated file,
+        and the fraction of the file's conversations that are not near-duplicates of already seen ones
     """
-    # TODO: Implement a similarity check to ensure the file is not a duplicate
-    #  (or very similar) to a previously validated file
-    return 0.0
+    try:
+        fingerprints = fingerprints if fingerprints is not None else uniqueness_fingerprints(decrypted_file_path)
+        if fingerprints is None:
+            return 0.0
+        fingerprint, signatures = fingerprints
+
+        matches = get_fingerprint_index().query(fingerprint, k=3, exclude=file_id)
+        vana.logging.info(f"Most similar previously validated files: {matches}")
+
+        duplicate_fraction = get_conversation_index().duplicate_fraction(signatures, exclude=file_id)
+        vana.logging.info(f"{duplicate_fraction:.0%} of {len(signatures)} conversations were seen before")
+
+        file_uniqueness = max(0.0, 1.0 - matches[0][1]) if matches else 1.0
+        return min(file_uniqueness, 1.0 - duplicate_fraction)
+    except Exception as e:
+        vana.logging.error(f"Error during uniqueness check, assuming file is not unique: {e}")
+        vana.logging.error(traceback.format_exc())
+        return 0.0
 
 
+@traced()
 def proof_of_authenticity(decrypted_file_path) -> float:
     """
     Check the authenticity of the decrypted file.
@@ -0,0 +1,231 @@
+# The MIT License (MIT)
+# Copyright © 2024 Corsali, Inc. dba Vana
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import json
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+import requests
+import vana
+from requests.adapters import HTTPAdapter
+from web3.providers.base import JSONBaseProvider
+from web3.types import RPCEndpoint, RPCResponse
+
+from chatgpt.utils.metrics import RPC_REQUESTS
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. ``acquire`` blocks until a token is available, so callers are spread out to at most
+    ``rate`` requests per second with bursts of up to ``capacity``.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class EndpointUnavailable(Exception):
+    """
+    The endpoint could not serve the request (connection error, timeout, HTTP 429/5xx) and another should be tried.
+    """
+
+
+@dataclass
+class Endpoint:
+    uri: str
+    session: requests.Session
+    latency: Optional[float] = None
+    failures: int = 0
+    unavailable_until: float = 0.0
+    requests: int = 0
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self.unavailable_until
+
+
+# JSON-RPC error codes that mean the node is overloaded rather than that the request is invalid
+RATE_LIMIT_ERROR_CODES = {-32005, 429}
+
+
+class ProviderPool(JSONBaseProvider):
+    """
+    Web3 provider that spreads requests over several HTTP endpoints.
+
+    Reads go to the available endpoint with the lowest observed latency (an exponentially weighted moving average),
+    and fail over to the next one on connection errors, timeouts, HTTP 429/5xx or rate-limit errors. A failing
+    endpoint is skipped for an exponentially growing cool-down. Every endpoint keeps its HTTP connections alive, and
+    all requests share one token bucket.
+
+    Transactions, nonce reads and receipt lookups are pinned to a single endpoint so that a freshly sent transaction
+    is visible to the follow-up calls. The pin only moves when that endpoint fails.
+    """
+
+    PINNED_METHODS = {
+        "eth_sendRawTransaction",
+        "eth_sendTransaction",
+        "eth_getTransactionCount",
+        "eth_getTransactionReceipt",
+        "eth_getTransactionByHash",
+    }
+
+    def __init__(self, endpoint_uris: Sequence[str], rate_limit: float = 0, timeout: float = 30,
+                 latency_smoothing: float = 0.2, max_cooldown: float = 60, pool_size: int = 16):
+        super().__init__()
+        if not endpoint_uris:
+            raise ValueError("At least one endpoint is required")
+
+        self.timeout = timeout
+        self.latency_smoothing = latency_smoothing
+        self.max_cooldown = max_cooldown
+        self.rate_limiter = TokenBucket(rate_limit) if rate_limit > 0 else None
+
+        self.endpoints: List[Endpoint] = []
+        for uri in dict.fromkeys(endpoint_uris):
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update({"Content-Type": "application/json"})
+            self.endpoints.append(Endpoint(uri=uri, session=session))
+
+        self._pinned = self.endpoints[0]
+        self._lock = threading.Lock()
+
+    def __str__(self) -> str:
+        return f"RPC provider pool {[endpoint.uri for endpoint in self.endpoints]}"
+
+    @property
+    def endpoint_uri(self) -> str:
+        """
+        The pinned endpoint, for code that expects a single HTTP provider.
+        """
+        return self._pinned.uri
+
+    def is_connected(self, show_traceback: bool = False) -> bool:
+        try:
+            return "result" in self.make_request(RPCEndpoint("web3_clientVersion"), [])
+        except Exception:
+            if show_traceback:
+                raise
+            return False
+
+    def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        RPC_REQUESTS.labels(method=method).inc()
+        request_data = self.encode_rpc_request(method, params)
+        raw_response = self._send(request_data, pinned=method in self.PINNED_METHODS)
+        return self.decode_rpc_response(raw_response)
+
+    def make_batch_request(self, payload: List[Dict[str, Any]]) -> Any:
+        """
+        Sends a JSON-RPC batch (a list of requests) and returns the decoded JSON response.
+        """
+        RPC_REQUESTS.labels(method="batch").inc()
+        return json.loads(self._send(json.dumps(payload).encode(), pinned=False))
+
+    def _send(self, request_data: bytes, pinned: bool) -> bytes:
+        errors = []
+        for endpoint in self._candidates(pinned):
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            try:
+                raw_response = self._post(endpoint, request_data)
+            except EndpointUnavailable as e:
+                errors.append(f"{endpoint.uri}: {e}")
+                self._record_failure(endpoint)
+                continue
+
+            if pinned and endpoint is not self._pinned:
+                vana.logging.warning(f"Pinning transactions to {endpoint.uri}")
+                self._pinned = endpoint
+            return raw_response
+        raise ConnectionError(f"All RPC endpoints failed: {'; '.join(errors)}")
+
+    def _candidates(self, pinned: bool) -> List[Endpoint]:
+        """
+        Endpoints in the order they should be tried. Unavailable endpoints are only tried as a last resort.
+        """
+        with self._lock:
+            if pinned:
+                ordered = [self._pinned] + [endpoint for endpoint in self.endpoints if endpoint is not self._pinned]
+            else:
+                # Endpoints without a measurement are tried first, so every endpoint gets measured
+                ordered = sorted(self.endpoints, key=lambda endpoint: endpoint.latency or 0.0)
+            return [e for e in ordered if e.available] + [e for e in ordered if not e.available]
+
+    def _post(self, endpoint: Endpoint, request_data: bytes) -> bytes:
+        start = time.monotonic()
+        try:
+            response = endpoint.session.post(endpoint.uri, data=request_data, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise EndpointUnavailable(str(e)) from e
+
+        if response.status_code == 429 or response.status_code >= 500:
+            raise EndpointUnavailable(f"HTTP {response.status_code}")
+        response.raise_for_status()
+        if self._is_rate_limited(response):
+            raise EndpointUnavailable("rate limited")
+
+        self._record_success(endpoint, time.monotonic() - start)
+        return response.content
+
+    @staticmethod
+    def _is_rate_limited(response: requests.Response) -> bool:
+        try:
+            body = response.json()
+        except ValueError:
+            return False
+        responses = body if isinstance(body, list) else [body]
+        return any(
+            isinstance(item, dict) and isinstance(item.get("error"), dict)
+            and item["error"].get("code") in RATE_LIMIT_ERROR_CODES
+            for item in responses
+        )
+
+    def _record_success(self, endpoint: Endpoint, latency: float):
+        with self._lock:
+            endpoint.requests += 1
+            endpoint.failures = 0
+            if endpoint.latency is None:
+                endpoint.latency = latency
+            else:
+                endpoint.latency += self.latency_smoothing * (latency - endpoint.latency)
+
+    def _record_failure(self, endpoint: Endpoint):
+        with self._lock:
+            endpoint.failures += 1
+            cooldown = min(self.max_cooldown, 2 ** (endpoint.failures - 1))
+            endpoint.unavailable_until = time.monotonic() + cooldown
+        vana.logging.warning(f"RPC endpoint {endpoint.uri} failed, skipping it for {cooldown}s")
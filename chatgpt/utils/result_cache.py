@@ -0,0 +1,131 @@
+# The MIT License (MIT)
+# Copyright © 2024 Corsali, Inc. dba Vana
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+
+from chatgpt.models.contribution import Contribution
+from chatgpt.utils.journal import AppendOnlyLog
+from chatgpt.utils.metrics import CACHE_LOOKUPS
+
+EMPTY_SHA256 = hashlib.sha256().hexdigest()
+
+
+def sha256_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Hex SHA-256 of a file's content, read in chunks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Contributions of previously evaluated files, keyed by the SHA-256 of their decrypted content.
+
+    The same export is sometimes submitted several times, under several file IDs or by several wallets. A copy is
+    answered from the cache without evaluating it again, and its uniqueness is set to 0 since the content was already
+    contributed by another file.
+
+    Results are persisted to an append-only file, so that duplicates of files evaluated before a restart are found
+    too. Empty content, e.g. from a file that failed to decrypt, is never cached.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        :param path: File to persist results to, or None to keep them in memory only
+        """
+        self.hits = 0
+        self.misses = 0
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+        self._log = AppendOnlyLog(path) if path else None
+        if self._log:
+            for record in self._log:
+                self._results.setdefault(record["content_hash"], record)
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def __contains__(self, content_hash: str) -> bool:
+        return content_hash in self._results
+
+    def get(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns what was recorded for the first file with this content: its ``file_id``, ``contribution`` and when
+        it was ``evaluated_at``, or None.
+        """
+        with self._lock:
+            return self._results.get(content_hash)
+
+    def lookup(self, content_hash: str, file_id: int) -> Optional[Contribution]:
+        """
+        Returns the contribution of ``file_id`` if a file with the same content was evaluated before.
+        :param content_hash: Hex SHA-256 of the decrypted file
+        :param file_id: ID of the file being verified
+        :return: The prior contribution for ``file_id``, with a uniqueness of 0 if it was recorded for another file,
+            or None if the content was not seen before
+        """
+        if content_hash == EMPTY_SHA256:
+            return None
+        with self._lock:
+            record = self._results.get(content_hash)
+            if record is None:
+                self.misses += 1
+                CACHE_LOOKUPS.labels(cache="results", result="miss").inc()
+                return None
+            self.hits += 1
+        CACHE_LOOKUPS.labels(cache="results", result="hit").inc()
+
+        contribution = Contribution(**record["contribution"])
+        contribution.file_id = file_id
+        if record["file_id"] != file_id:
+            contribution.scores.uniqueness = 0.0
+        return contribution
+
+    def put(self, content_hash: str, contribution: Contribution, evaluated_at: Optional[float] = None) -> bool:
+        """
+        Records the contribution of a file. Only the first file with a given content is recorded.
+        :param content_hash: Hex SHA-256 of the decrypted file
+        :param contribution: The file's contribution, as evaluated
+        :param evaluated_at: Timestamp of the evaluation
+        :return: Whether the result was recorded
+        """
+        if content_hash == EMPTY_SHA256:
+            return False
+        record = {
+            "content_hash": content_hash,
+            "file_id": contribution.file_id,
+            "contribution": contribution.model_dump(),
+            "evaluated_at": evaluated_at,
+        }
+        with self._lock:
+            if content_hash in self._results:
+                return False
+            self._results[content_hash] = record
+            if self._log:
+                self._log.append(record)
+        return True
+
+    def close(self):
+        if self._log:
+            self._log.close()
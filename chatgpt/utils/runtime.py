@@ -0,0 +1,102 @@
+# The MIT License (MIT)
+# Copyright © 2024 Corsali, Inc. dba Vana
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import asyncio
+import traceback
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import vana
+
+
+class ServiceRunner:
+    """
+    Runs independent background services on a single event loop until stopped.
+
+    A service is a coroutine function performing one unit of work, e.g. verifying one file. The runner calls it again
+    and again, each service in its own task, so a slow or failing service does not hold up the others. A service that
+    raises is logged and restarted with exponential backoff.
+
+    ``stop`` may be called from any thread. Services are then allowed to finish their current step for up to
+    ``shutdown_timeout`` seconds before they are cancelled.
+    """
+
+    def __init__(self, restart_delay: float = 1, max_restart_delay: float = 60, shutdown_timeout: float = 30):
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.shutdown_timeout = shutdown_timeout
+
+        self._services: Dict[str, Callable[[], Awaitable[Any]]] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._stop_requested = False
+
+    def add(self, name: str, step: Callable[[], Awaitable[Any]]):
+        self._services[name] = step
+
+    @property
+    def stopping(self) -> bool:
+        return self._stop_requested
+
+    async def run(self):
+        """
+        Starts every service and returns once all of them have stopped.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        if self._stop_requested:
+            self._stopping.set()
+
+        self._tasks = [asyncio.create_task(self._supervise(name, step), name=name)
+                       for name, step in self._services.items()]
+        try:
+            await self._stopping.wait()
+        finally:
+            await self._shutdown()
+
+    def stop(self):
+        self._stop_requested = True
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._stopping.set)
+
+    async def _supervise(self, name: str, step: Callable[[], Awaitable[Any]]):
+        delay = self.restart_delay
+        while not self._stopping.is_set():
+            try:
+                await step()
+                delay = self.restart_delay
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                vana.logging.error(f"Service {name} failed, restarting in {delay}s: {e}")
+                vana.logging.debug(traceback.format_exc())
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                delay = min(self.max_restart_delay, delay * 2)
+
+    async def _shutdown(self):
+        self._stop_requested = True
+        self._stopping.set()
+        if not self._tasks:
+            return
+        _, pending = await asyncio.wait(self._tasks, timeout=self.shutdown_timeout)
+        for task in pending:
+            vana.logging.warning(f"Service {task.get_name()} did not stop in time, cancelling it")
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
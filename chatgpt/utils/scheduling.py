@@ -0,0 +1,203 @@
+# The MIT License (MIT)
+# Copyright © 2024 Corsali, Inc. dba Vana
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import heapq
+import itertools
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+import vana
+
+SMALL_LANE = "small"
+LARGE_LANE = "large"
+
+
+def probe_file_size(url: str, session: Optional[requests.Session] = None, timeout: float = 5) -> Optional[int]:
+    """
+    Learns a file's size from its Content-Length header without downloading it.
+    :return: The size in bytes, or None if the server does not say
+    """
+    try:
+        response = (session or requests).head(url, allow_redirects=True, timeout=timeout)
+        content_length = response.headers.get("Content-Length")
+        if response.status_code == 200 and content_length is not None:
+            return int(content_length)
+    except (requests.RequestException, ValueError) as e:
+        vana.logging.debug(f"Could not probe the size of {url}: {e}")
+    return None
+
+
+class ProcessingTimeEstimator:
+    """
+    Estimates how long a file takes to process from its size, as ``overhead + size * seconds_per_byte``.
+
+    The two coefficients are fitted by least squares over past observations, with older observations decaying by
+    ``decay`` per new one so the estimate follows changes in bandwidth or LLM latency.
+    """
+
+    def __init__(self, overhead: float = 10.0, seconds_per_byte: float = 1e-6, decay: float = 0.95):
+        self.overhead = overhead
+        self.seconds_per_byte = seconds_per_byte
+        self.decay = decay
+        self._n = self._sx = self._sy = self._sxx = self._sxy = 0.0
+
+    def estimate(self, size: int) -> float:
+        return self.overhead + size * self.seconds_per_byte
+
+    def observe(self, size: int, seconds: float):
+        d = self.decay
+        self._n = d * self._n + 1
+        self._sx = d * self._sx + size
+        self._sy = d * self._sy + seconds
+        self._sxx = d * self._sxx + size * size
+        self._sxy = d * self._sxy + size * seconds
+
+        variance = self._n * self._sxx - self._sx * self._sx
+        if variance > 1e-9 * self._sxx * self._n:
+            slope = (self._n * self._sxy - self._sx * self._sy) / variance
+            if slope > 0:
+                self.seconds_per_byte = slope
+        self.overhead = max(0.0, (self._sy - self.seconds_per_byte * self._sx) / self._n)
+
+
+@dataclass(order=True)
+class ScheduledFile:
+    size: int
+    file_id: int
+    added_at_block: int = field(compare=False)
+    data: Any = field(default=None, compare=False)
+
+
+class DeadlineScheduler:
+    """
+    Orders files so that as many as possible are reported while the speed score is still high.
+
+    The speed score falls linearly from the block a file is added to ``max_wait_blocks`` later, so the total score is
+    maximized by shortest-processing-time-first. Files are kept in size order (processing time grows with size), and a
+    file that can no longer be finished before its deadline is demoted behind the ones that still can, oldest first.
+
+    Files at least ``large_file_size`` bytes go to a separate lane, so workers on the small lane are not held up by a
+    single huge export. A worker whose lane is empty takes work from the other lane.
+    """
+
+    def __init__(self, estimator: ProcessingTimeEstimator, max_wait_blocks: int, block_time: float,
+                 large_file_size: int = 50 * 1024 * 1024):
+        self.estimator = estimator
+        self.max_wait_blocks = max_wait_blocks
+        self.block_time = block_time
+        self.large_file_size = large_file_size
+
+        self._lanes: Dict[str, List[ScheduledFile]] = {SMALL_LANE: [], LARGE_LANE: []}
+        self._late: List[Tuple[int, int, ScheduledFile]] = []
+        self._late_order = itertools.count()
+        self._scheduled: Dict[int, ScheduledFile] = {}
+        self._in_progress: Dict[int, int] = {}
+        self._available = threading.Condition()
+        self._known_sizes = 0
+        self._total_size = 0
+
+    def __len__(self) -> int:
+        with self._available:
+            return len(self._scheduled)
+
+    def __contains__(self, file_id: int) -> bool:
+        return file_id in self._scheduled
+
+    def lane_of(self, size: int) -> str:
+        return LARGE_LANE if size >= self.large_file_size else SMALL_LANE
+
+    def add(self, file_id: int, added_at_block: int, size: Optional[int], data: Any = None):
+        """
+        Schedules a file. Files of unknown size are treated as average-sized.
+        """
+        with self._available:
+            if file_id in self._scheduled:
+                return
+            if size is None:
+                size = self._total_size // self._known_sizes if self._known_sizes else 0
+            else:
+                self._known_sizes += 1
+                self._total_size += size
+            scheduled = ScheduledFile(size=size, file_id=file_id, added_at_block=added_at_block, data=data)
+            self._scheduled[file_id] = scheduled
+            heapq.heappush(self._lanes[self.lane_of(size)], scheduled)
+            self._available.notify_all()
+
+    def discard(self, file_id: int):
+        with self._available:
+            # Discarded files are skipped lazily when they reach the top of a heap
+            self._scheduled.pop(file_id, None)
+
+    def next(self, lane: str, current_block: int) -> Optional[ScheduledFile]:
+        """
+        Removes and returns the file a worker on ``lane`` should process next, or None if nothing is scheduled.
+        """
+        with self._available:
+            return self._next(lane, current_block)
+
+    def wait_next(self, lane: str, current_block: Callable[[], int],
+                  timeout: Optional[float] = None) -> Optional[ScheduledFile]:
+        """
+        Like ``next``, but waits up to ``timeout`` seconds for a file to be scheduled.
+        """
+        with self._available:
+            if not self._available.wait_for(lambda: self._scheduled, timeout=timeout):
+                return None
+            return self._next(lane, current_block())
+
+    def completed(self, file_id: int, seconds: float):
+        """
+        Records how long a file handed out by ``next`` took, to refine the processing time estimate.
+        """
+        with self._available:
+            size = self._in_progress.pop(file_id, None)
+        if size is not None:
+            self.estimator.observe(size, seconds)
+
+    def _next(self, lane: str, current_block: int) -> Optional[ScheduledFile]:
+        scheduled = self._take(lane, current_block)
+        if scheduled:
+            self._in_progress[scheduled.file_id] = scheduled.size
+        return scheduled
+
+    def _take(self, lane: str, current_block: int) -> Optional[ScheduledFile]:
+        other_lane = LARGE_LANE if lane == SMALL_LANE else SMALL_LANE
+        for candidate_lane in (lane, other_lane):
+            scheduled = self._pop_on_time(candidate_lane, current_block)
+            if scheduled:
+                return scheduled
+        # Every remaining file will be late, the oldest ones lose the least by waiting longer
+        while self._late:
+            _, _, scheduled = heapq.heappop(self._late)
+            if self._scheduled.pop(scheduled.file_id, None):
+                return scheduled
+        return None
+
+    def _pop_on_time(self, lane: str, current_block: int) -> Optional[ScheduledFile]:
+        heap = self._lanes[lane]
+        while heap:
+            scheduled = heapq.heappop(heap)
+            if scheduled.file_id not in self._scheduled:
+                continue
+            remaining = (scheduled.added_at_block + self.max_wait_blocks - current_block) * self.block_time
+            if self.estimator.estimate(scheduled.size) <= remaining:
+                del self._scheduled[scheduled.file_id]
+                return scheduled
+            heapq.heappush(self._late, (scheduled.added_at_block, next(self._late_order), scheduled))
+        return None
@@ -0,0 +1,172 @@
+# The MIT License (MIT)
+# Copyright © 2024 Corsali, Inc. dba Vana
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+from typing import Any, Dict, List
+
+import numpy as np
+
+DIMENSIONS = ["score", "authenticity", "ownership", "quality", "uniqueness"]
+
+# Relative weight of each dimension, and of how quickly the peer reported
+DIMENSION_WEIGHTS = np.array([50, 10, 10, 10, 10], dtype=np.float64)
+SPEED_WEIGHT = 10.0
+
+
+def score_performance(own: np.ndarray, own_mask: np.ndarray, peer: np.ndarray, peer_mask: np.ndarray,
+                      added_at_block: np.ndarray, reported_at_block: np.ndarray, max_wait_blocks: int) -> np.ndarray:
+    """
+    Scores how closely each peer submission matches our own, for many (file, validator) pairs at once.
+
+    Only the dimensions we scored ourselves count, weighted by ``DIMENSION_WEIGHTS`` and normalized per row together
+    with a speed component that decays linearly to 0 over ``max_wait_blocks``.
+
+    :param own: (n, len(DIMENSIONS)) array of our own scores
+    :param own_mask: Boolean array of the same shape, set where we have a score for the dimension
+    :param peer: (n, len(DIMENSIONS)) array of the peer's scores
+    :param peer_mask: Boolean array of the same shape, set where the peer has a score for the dimension
+    :param added_at_block: (n,) block each file was added at
+    :param reported_at_block: (n,) block each peer reported its score at
+    :param max_wait_blocks: Number of blocks after which a report no longer counts as fast
+    :return: (n,) array of performance scores between 0 and 1
+    """
+    weights = np.where(own_mask, DIMENSION_WEIGHTS, 0.0)
+    total_weight = weights.sum(axis=1) + SPEED_WEIGHT
+
+    agreement = np.where(peer_mask, 1.0 - np.abs(own - peer), 0.0)
+
+    delay = reported_at_block - added_at_block
+    speed = np.where(delay >= 0, np.maximum(0.0, 1.0 - delay / max_wait_blocks), 0.0)
+
+    return ((weights * agreement).sum(axis=1) + SPEED_WEIGHT * speed) / total_weight
+
+
+def mean_by_group(scores: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """
+    Averages consecutive groups of scores, e.g. the concatenated scores of each validator.
+    :param scores: (n,) array of scores, grouped
+    :param counts: Number of scores in each group, none of them 0
+    :return: The mean of each group
+    """
+    if len(counts) == 0:
+        return np.zeros(0)
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    return np.add.reduceat(scores, offsets) / counts
+
+
+def exponential_moving_average(previous: Dict[str, float], current: Dict[str, float],
+                               alpha: float) -> Dict[str, float]:
+    """
+    Blends this tempo's scores into the previous averages. Validators without a previous average start from 0.
+    """
+    validators = list(current)
+    previous_values = np.fromiter((previous.get(v, 0.0) for v in validators), dtype=np.float64, count=len(validators))
+    current_values = np.fromiter((current[v] for v in validators), dtype=np.float64, count=len(validators))
+    updated = alpha * current_values + (1 - alpha) * previous_values
+    return dict(zip(validators, updated.tolist()))
+
+
+class PerformanceBatch:
+    """
+    Collects the peer submissions seen during one scoring pass and scores them together.
+
+    Rows are appended to flat lists while the pass reads the chain, then converted to arrays once in ``scores``.
+    Validators are stored as indices into ``validators`` so that aggregating needs no string comparisons.
+    """
+
+    def __init__(self, max_wait_blocks: int):
+        self.max_wait_blocks = max_wait_blocks
+        self.validators: List[str] = []
+        self._validator_index: Dict[str, int] = {}
+        self._rows: List[int] = []
+        self._own: List[float] = []
+        self._own_mask: List[bool] = []
+        self._peer: List[float] = []
+        self._peer_mask: List[bool] = []
+        self._added_at_block: List[int] = []
+        self._reported_at_block: List[int] = []
+        self._missed: List[bool] = []
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _add_validator(self, validator: str):
+        index = self._validator_index.get(validator)
+        if index is None:
+            index = self._validator_index[validator] = len(self.validators)
+            self.validators.append(validator)
+        self._rows.append(index)
+
+    def add(self, validator: str, own_submission: Dict[str, Any], validator_score: Dict[str, Any],
+            file_data: Dict[str, Any]):
+        self._add_validator(validator)
+        for dimension in DIMENSIONS:
+            self._own.append(own_submission.get(dimension, 0.0))
+            self._own_mask.append(dimension in own_submission)
+            self._peer.append(validator_score.get(dimension, 0.0))
+            self._peer_mask.append(dimension in validator_score)
+        self._added_at_block.append(file_data.get("addedAtBlock", 0))
+        self._reported_at_block.append(validator_score.get("reportedAtBlock", 0))
+        self._missed.append(False)
+
+    def add_missed(self, validator: str):
+        """
+        Records a validator that did not report in time, which scores 0.
+        """
+        self._add_validator(validator)
+        self._own.extend([0.0] * len(DIMENSIONS))
+        self._own_mask.extend([False] * len(DIMENSIONS))
+        self._peer.extend([0.0] * len(DIMENSIONS))
+        self._peer_mask.extend([False] * len(DIMENSIONS))
+        self._added_at_block.append(0)
+        self._reported_at_block.append(0)
+        self._missed.append(True)
+
+    def scores(self) -> np.ndarray:
+        if not self._rows:
+            return np.zeros(0)
+        shape = (len(self._rows), len(DIMENSIONS))
+        scores = score_performance(
+            np.array(self._own, dtype=np.float64).reshape(shape),
+            np.array(self._own_mask, dtype=bool).reshape(shape),
+            np.array(self._peer, dtype=np.float64).reshape(shape),
+            np.array(self._peer_mask, dtype=bool).reshape(shape),
+            np.array(self._added_at_block, dtype=np.float64),
+            np.array(self._reported_at_block, dtype=np.float64),
+            self.max_wait_blocks,
+        )
+        return np.where(np.array(self._missed, dtype=bool), 0.0, scores)
+
+    def scores_by_validator(self) -> Dict[str, np.ndarray]:
+        """
+        Groups the performance scores of the pass by validator.
+        """
+        if not self._rows:
+            return {}
+        rows = np.array(self._rows)
+        order = np.argsort(rows, kind="stable")
+        sorted_rows = rows[order]
+        starts = np.flatnonzero(np.diff(sorted_rows)) + 1
+        groups = np.split(self.scores()[order], starts)
+        first_rows = sorted_rows[np.concatenate(([0], starts))]
+        return {self.validators[row]: group for row, group in zip(first_rows.tolist(), groups)}
+
+    def mean_by_validator(self) -> Dict[str, float]:
+        if not self._rows:
+            return {}
+        rows = np.array(self._rows)
+        means = np.bincount(rows, weights=self.scores()) / np.bincount(rows)
+        return dict(zip(self.validators, means.tolist()))
@@ -0,0 +1,442 @@
+# The MIT License (MIT)
+# Copyright © 2024 Corsali, Inc. dba Vana
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import fcntl
+import json
+import os
+import threading
+import traceback
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Set
+
+import numpy as np
+import vana
+
+from chatgpt.utils.journal import write_json_atomically
+
+# Builds additional per-segment arrays, e.g. a lookup structure, from a segment's IDs and rows
+ExtrasBuilder = Callable[[np.ndarray, np.ndarray], Dict[str, np.ndarray]]
+
+
+@dataclass(eq=False)
+class Segment:
+    """
+    An immutable run of fixed-width rows, each tagged with an int64 ID. Arrays of sealed segments are read-only
+    memory maps, and sealed segments store their distinct IDs as the ``unique_ids`` extra.
+    """
+    name: str
+    ids: np.ndarray
+    rows: np.ndarray
+    extras: Dict[str, np.ndarray] = field(default_factory=dict)
+    sealed: bool = True
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def unique_ids(self) -> np.ndarray:
+        unique_ids = self.extras.get("unique_ids")
+        # Segments written before the extra existed compute them
+        return unique_ids if unique_ids is not None else np.unique(self.ids)
+
+
+class SegmentIds:
+    """
+    Tracks which segments of a set of stores have already been read, so that only the IDs of new segments, and of
+    the active segments, which keep growing, are read again on ``new_ids``.
+    """
+
+    def __init__(self, stores: List["SegmentStore"]):
+        self.stores = stores
+        self._seen: List[Set[str]] = [set() for _ in stores]
+        self._lock = threading.Lock()
+
+    def new_ids(self) -> List[np.ndarray]:
+        """
+        :return: The distinct IDs of every segment not returned before. IDs may repeat across arrays
+        """
+        new_ids = []
+        with self._lock:
+            for store, seen in zip(self.stores, self._seen):
+                segments = store.segments()
+                new_ids.extend(segment.unique_ids() for segment in segments
+                               if not (segment.sealed and segment.name in seen))
+                # Segments merged away by compaction are forgotten, their IDs live on in the merged segment
+                seen.intersection_update(segment.name for segment in segments)
+                seen.update(segment.name for segment in segments if segment.sealed)
+        return new_ids
+
+
+class SegmentStore:
+    """
+    Append-only storage of fixed-width rows, e.g. fingerprint vectors or MinHash signatures, in segment files.
+
+    New rows are appended to an active segment, which is kept in memory and mirrored to an append-only file. Once it
+    holds ``segment_rows`` rows it is sealed: written to its own files and listed in a small JSON manifest. Sealed
+    segments are never modified and are read through ``np.memmap``, so reading them copies nothing and several
+    processes on a host share the same page-cached index. Opening a large store only maps its files.
+
+    Background compaction merges segments of the same size tier, ``fanout`` at a time, so a store of n rows has
+    O(log n) segments and each row is rewritten O(log n) times. Merged files replace their inputs through the
+    manifest. Processes that still map the old files keep reading them until they ``refresh``.
+
+    ``build_extras`` derives additional arrays stored with each segment, e.g. sorted lookup keys.
+
+    Without a ``directory`` everything is kept in memory. With ``readonly``, the store only reads, e.g. in a
+    process that shares the index of a validator running on the same host. A directory has a single writer, which
+    holds an exclusive lock on ``<name>.lock`` until it is closed.
+    """
+
+    def __init__(self, directory: Optional[str], name: str, width: int, dtype, segment_rows: int = 65536,
+                 fanout: int = 4, build_extras: Optional[ExtrasBuilder] = None, readonly: bool = False,
+                 background_compaction: bool = True):
+        self.directory = directory
+        self.name = name
+        self.width = width
+        self.dtype = np.dtype(dtype)
+        self.segment_rows = segment_rows
+        self.fanout = fanout
+        self.build_extras = build_extras
+        self.readonly = readonly
+
+        self._lock = threading.RLock()
+        self._compaction_lock = threading.Lock()
+        self._compaction_due = threading.Event()
+        self._stopped = threading.Event()
+        self._compaction_thread = None
+        self._segments: List[Segment] = []
+        self._next_seq = 0
+        self._manifest_mtime = None
+
+        # The active segment, with its cached extras until the next append
+        self._active_name = None
+        self._active_ids = np.zeros(segment_rows, dtype=np.int64)
+        self._active_rows = np.zeros((segment_rows, width), dtype=self.dtype)
+        self._active_count = 0
+        self._active_segment: Optional[Segment] = None
+        self._active_ids_file = None
+        self._active_rows_file = None
+        self._lock_file = None
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            if not readonly:
+                self._acquire_writer_lock()
+            self._load()
+        if not readonly:
+            self._open_active()
+            if self._active_count == self.segment_rows:
+                # Interrupted while sealing a full active segment
+                with self._lock:
+                    self._seal()
+
+        if background_compaction and not readonly:
+            self._compaction_thread = threading.Thread(target=self._compaction_loop, daemon=True)
+            self._compaction_thread.start()
+            self._compaction_due.set()
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.directory, f"{self.name}-manifest.json")
+
+    def _path(self, segment_name: str, part: str) -> str:
+        return os.path.join(self.directory, f"{segment_name}.{part}")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(segment) for segment in self._segments) + self._active_count
+
+    def _acquire_writer_lock(self):
+        self._lock_file = open(os.path.join(self.directory, f"{self.name}.lock"), "a")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock_file.close()
+            self._lock_file = None
+            raise RuntimeError(f"Segment store {self.name} in {self.directory} is already open for writing by "
+                               f"another process")
+
+    def _new_name(self, kind: str) -> str:
+        name = f"{self.name}-{kind}-{self._next_seq:08d}"
+        self._next_seq += 1
+        return name
+
+    def _load(self):
+        if not os.path.exists(self.manifest_path):
+            return
+        self._manifest_mtime = os.path.getmtime(self.manifest_path)
+        with open(self.manifest_path) as f:
+            manifest = json.load(f)
+        self._next_seq = manifest["next_seq"]
+        self._segments = [self._map_segment(entry) for entry in manifest["segments"]]
+        self._active_name = manifest.get("active")
+        self._load_active()
+        if not self.readonly:
+            self._remove_unreferenced_files()
+
+    def _map_segment(self, entry: dict) -> Segment:
+        count = entry["count"]
+        extras = {
+            key: np.memmap(self._path(entry["name"], key), dtype=spec["dtype"], mode="r", shape=tuple(spec["shape"]))
+            for key, spec in entry.get("extras", {}).items()
+        }
+        return Segment(
+            name=entry["name"],
+            ids=np.memmap(self._path(entry["name"], "ids"), dtype=np.int64, mode="r", shape=(count,)),
+            rows=np.memmap(self._path(entry["name"], "rows"), dtype=self.dtype, mode="r", shape=(count, self.width)),
+            extras=extras,
+        )
+
+    def _load_active(self):
+        self._active_count = 0
+        self._active_segment = None
+        if not self._active_name:
+            return
+        ids_path = self._path(self._active_name, "ids")
+        rows_path = self._path(self._active_name, "rows")
+        if not (os.path.exists(ids_path) and os.path.exists(rows_path)):
+            return
+        ids = np.fromfile(ids_path, dtype=np.int64)
+        rows = np.fromfile(rows_path, dtype=self.dtype)
+        count = min(len(ids), len(rows) // self.width, self.segment_rows)
+        if not self.readonly:
+            # Cut both files back to the last complete row, so new appends line up again
+            with open(ids_path, "r+b") as f:
+                f.truncate(count * 8)
+            with open(rows_path, "r+b") as f:
+                f.truncate(count * self.width * self.dtype.itemsize)
+        self._active_ids[:count] = ids[:count]
+        self._active_rows[:count] = rows[:count * self.width].reshape(count, self.width)
+        self._active_count = count
+
+    def _remove_unreferenced_files(self):
+        """
+        Deletes files left behind by a seal or compaction that was interrupted before the manifest was written.
+        """
+        referenced = {segment.name for segment in self._segments} | {self._active_name}
+        for file_name in os.listdir(self.directory):
+            segment_name = file_name.split(".", 1)[0]
+            if segment_name.startswith(f"{self.name}-") and segment_name not in referenced \
+                    and not file_name.endswith("manifest.json"):
+                os.remove(os.path.join(self.directory, file_name))
+
+    def _write_manifest(self):
+        if not self.directory:
+            return
+        write_json_atomically(self.manifest_path, {
+            "next_seq": self._next_seq,
+            "active": self._active_name,
+            "segments": [
+                {
+                    "name": segment.name,
+                    "count": len(segment),
+                    "extras": {key: {"dtype": value.dtype.str, "shape": list(value.shape)}
+                               for key, value in segment.extras.items()},
+                }
+                for segment in self._segments
+            ],
+        })
+        self._manifest_mtime = os.path.getmtime(self.manifest_path)
+
+    def _open_active(self):
+        if not self.directory:
+            return
+        if not self._active_name:
+            self._active_name = self._new_name("active")
+            self._write_manifest()
+        self._active_ids_file = open(self._path(self._active_name, "ids"), "ab")
+        self._active_rows_file = open(self._path(self._active_name, "rows"), "ab")
+
+    def append(self, ids: np.ndarray, rows: np.ndarray):
+        """
+        Appends rows with their IDs, sealing the active segment each time it fills up.
+        """
+        if self.readonly:
+            raise RuntimeError(f"Segment store {self.name} is read-only")
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        rows = np.asarray(rows, dtype=self.dtype).reshape(-1, self.width)
+        with self._lock:
+            offset = 0
+            while offset < len(ids):
+                take = min(len(ids) - offset, self.segment_rows - self._active_count)
+                start = self._active_count
+                self._active_ids[start:start + take] = ids[offset:offset + take]
+                self._active_rows[start:start + take] = rows[offset:offset + take]
+                self._active_count += take
+                self._active_segment = None
+                if self._active_ids_file:
+                    self._active_ids_file.write(ids[offset:offset + take].tobytes())
+                    self._active_ids_file.flush()
+                    self._active_rows_file.write(rows[offset:offset + take].tobytes())
+                    self._active_rows_file.flush()
+                offset += take
+                if self._active_count == self.segment_rows:
+                    self._seal()
+
+    def _seal(self):
+        ids = self._active_ids[:self._active_count].copy()
+        rows = self._active_rows[:self._active_count].copy()
+        segment = self._write_segment(self._new_name("segment"), [ids], [rows])
+
+        old_active = self._active_name
+        if self._active_ids_file:
+            self._active_ids_file.close()
+            self._active_rows_file.close()
+        self._segments.append(segment)
+        self._active_name = None
+        self._active_count = 0
+        self._active_segment = None
+        self._open_active()
+        if self.directory:
+            os.remove(self._path(old_active, "ids"))
+            os.remove(self._path(old_active, "rows"))
+        self._compaction_due.set()
+
+    def _write_segment(self, name: str, id_chunks: List[np.ndarray], row_chunks: List[np.ndarray]) -> Segment:
+        """
+        Writes a sealed segment from consecutive chunks of IDs and rows, one chunk in memory at a time.
+        """
+        if not self.directory:
+            ids, rows = np.concatenate(id_chunks), np.concatenate(row_chunks)
+            extras = self.build_extras(ids, rows) if self.build_extras else {}
+            return Segment(name=name, ids=ids, rows=rows, extras={**extras, "unique_ids": np.unique(ids)})
+
+        for part, chunks in [("ids", id_chunks), ("rows", row_chunks)]:
+            with open(self._path(name, part), "wb") as f:
+                for chunk in chunks:
+                    f.write(np.ascontiguousarray(chunk).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        segment = self._map_segment({"name": name, "count": sum(len(chunk) for chunk in id_chunks)})
+
+        extras = self.build_extras(segment.ids, segment.rows) if self.build_extras else {}
+        extras["unique_ids"] = np.unique(segment.ids)
+        for part, array in extras.items():
+            with open(self._path(name, part), "wb") as f:
+                f.write(np.ascontiguousarray(array).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        return self._map_segment({
+            "name": name,
+            "count": len(segment),
+            "extras": {key: {"dtype": value.dtype.str, "shape": list(value.shape)} for key, value in extras.items()},
+        })
+
+    def segments(self) -> List[Segment]:
+        """
+        Returns every segment, the active one last. Arrays of sealed segments are not copied.
+        """
+        with self._lock:
+            segments = list(self._segments)
+            if self._active_count:
+                if self._active_segment is None:
+                    ids = self._active_ids[:self._active_count].copy()
+                    rows = self._active_rows[:self._active_count].copy()
+                    extras = self.build_extras(ids, rows) if self.build_extras else {}
+                    self._active_segment = Segment(name=self._active_name or "active", ids=ids, rows=rows,
+                                                   extras=extras, sealed=False)
+                segments.append(self._active_segment)
+            return segments
+
+    def refresh(self) -> bool:
+        """
+        Picks up segments written by another process since the manifest was last read.
+        :return: Whether the manifest had changed
+        """
+        if not self.directory or not os.path.exists(self.manifest_path):
+            return False
+        with self._lock:
+            if os.path.getmtime(self.manifest_path) == self._manifest_mtime:
+                # The active segment may still have grown
+                self._load_active()
+                return False
+            self._load()
+            return True
+
+    def _tier(self, segment: Segment) -> int:
+        units, tier = max(1, len(segment) // self.segment_rows), 0
+        while units >= self.fanout:
+            units //= self.fanout
+            tier += 1
+        return tier
+
+    def _next_run(self) -> Optional[List[Segment]]:
+        """
+        Finds the ``fanout`` oldest segments of the smallest size tier that has that many.
+        """
+        with self._lock:
+            segments = list(self._segments)
+        tiers: Dict[int, List[Segment]] = {}
+        for segment in segments:
+            tiers.setdefault(self._tier(segment), []).append(segment)
+        for tier in sorted(tiers):
+            if len(tiers[tier]) >= self.fanout:
+                return tiers[tier][:self.fanout]
+        return None
+
+    def compact(self) -> int:
+        """
+        Merges segments until no ``fanout`` consecutive ones share a size tier.
+        :return: Number of merges done
+        """
+        merges = 0
+        with self._compaction_lock:
+            while True:
+                run = self._next_run()
+                if not run:
+                    return merges
+                with self._lock:
+                    name = self._new_name("segment")
+                merged = self._write_segment(name, [segment.ids for segment in run],
+                                             [segment.rows for segment in run])
+                with self._lock:
+                    merged_names = {segment.name for segment in run}
+                    position = [segment.name for segment in self._segments].index(run[0].name)
+                    remaining = [segment for segment in self._segments if segment.name not in merged_names]
+                    self._segments = remaining[:position] + [merged] + remaining[position:]
+                    self._write_manifest()
+                if self.directory:
+                    # Processes that still map these files keep reading them until they refresh
+                    for segment in run:
+                        for part in ["ids", "rows", *segment.extras]:
+                            os.remove(self._path(segment.name, part))
+                merges += 1
+
+    def _compaction_loop(self):
+        while not self._stopped.is_set():
+            self._compaction_due.wait()
+            self._compaction_due.clear()
+            if self._stopped.is_set():
+                return
+            try:
+                self.compact()
+            except Exception as e:
+                vana.logging.error(f"Error compacting segment store {self.name}: {e}")
+                vana.logging.error(traceback.format_exc())
+
+    def close(self):
+        self._stopped.set()
+        self._compaction_due.set()
+        if self._compaction_thread:
+            self._compaction_thread.join()
+        with self._lock:
+            if self._active_ids_file:
+                self._active_ids_file.close()
+                self._active_rows_file.close()
+                self._active_ids_file = self._active_rows_file = None
+            if self._lock_file:
+                self._lock_file.close()
+                self._lock_file = None
@@ -0,0 +1,295 @@
+# The MIT License (MIT)
+# Copyright © 2024 Corsali, Inc. dba Vana
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import contextvars
+import functools
+import json
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import vana
+
+# OTLP status codes
+STATUS_UNSET = 0
+STATUS_ERROR = 2
+
+# The innermost open span of the current thread or task. asyncio.to_thread copies it into the worker thread
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("chatgpt_current_span", default=None)
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    # int64 fields are strings in the OTLP JSON encoding
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+class Span:
+    """
+    A timed step of a trace, with attributes and the span it is nested in.
+    """
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str] = None,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.status = STATUS_UNSET
+        self.status_message = ""
+
+    @property
+    def duration(self) -> float:
+        """
+        Duration in seconds, up to now while the span is open.
+        """
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def set(self, **attributes: Any):
+        self.attributes.update(attributes)
+
+    def fail(self, error: BaseException):
+        self.status = STATUS_ERROR
+        self.status_message = f"{type(error).__name__}: {error}"
+
+    def end(self):
+        self.end_ns = time.time_ns()
+        self.trace.add(self)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        record = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": _otlp_attributes(self.attributes),
+            "status": {"code": self.status, "message": self.status_message} if self.status else {},
+        }
+        if self.parent_id:
+            record["parentSpanId"] = self.parent_id
+        return record
+
+
+class Trace:
+    """
+    The spans of one file, held until the file is done so that the decision to keep them can depend on how long it
+    took. Spans that end after the trace, e.g. in a thread left running after a timeout, are dropped.
+    """
+
+    def __init__(self, file_id: Optional[int] = None):
+        self.trace_id = os.urandom(16).hex()
+        self.file_id = file_id
+        self.spans: List[Span] = []
+        self.finished = False
+        self._lock = threading.Lock()
+
+    def add(self, span: Span):
+        with self._lock:
+            if not self.finished:
+                self.spans.append(span)
+
+    def finish(self) -> List[Span]:
+        with self._lock:
+            self.finished = True
+            return self.spans
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Records the enclosed block as a span of the current trace, nested in the innermost open span. An exception
+    leaving the block marks the span as failed.
+
+    Outside of a trace nothing is recorded and None is yielded, so instrumented code costs next to nothing when it is
+    not traced, e.g. in the backfill.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(parent.trace, name, parent.span_id, {"file_id": parent.trace.file_id, **attributes})
+    reset_token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.fail(e)
+        raise
+    finally:
+        _current_span.reset(reset_token)
+        child.end()
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """
+    Decorates a function so that each call is a span of the current trace, named after the function by default.
+    """
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name or fn.__name__):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class SpanExporter:
+    """
+    Writes traces to a local file from a background thread, one OTLP JSON ``ExportTraceServiceRequest`` per line, as
+    read by the OpenTelemetry Collector's ``otlpjsonfile`` receiver.
+
+    The file is rotated once it reaches ``max_bytes``, keeping ``backup_count`` older files next to it with the
+    suffixes ``.1``, ``.2``, and so on. Traces are dropped rather than slowing down the validator when the writer
+    falls more than ``max_queue`` traces behind.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 50 * 1024 * 1024, backup_count: int = 5, max_queue: int = 1000,
+                 service_name: str = "chatgpt-validator"):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.dropped = 0
+        self._resource = {"attributes": _otlp_attributes({"service.name": service_name})}
+        self._queue: "queue.Queue[Optional[List[Span]]]" = queue.Queue(max_queue)
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "ab")
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, spans: List[Span]) -> bool:
+        """
+        Queues the spans of a trace to be written.
+        :return: Whether they were queued
+        """
+        try:
+            self._queue.put_nowait(spans)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def to_otlp(self, spans: List[Span]) -> Dict[str, Any]:
+        return {"resourceSpans": [{
+            "resource": self._resource,
+            "scopeSpans": [{"scope": {"name": "chatgpt"}, "spans": [span.to_otlp() for span in spans]}],
+        }]}
+
+    def _run(self):
+        while True:
+            spans = self._queue.get()
+            try:
+                if spans is None:
+                    return
+                self._write((json.dumps(self.to_otlp(spans), separators=(",", ":")) + "\n").encode())
+            except Exception as e:
+                vana.logging.warning(f"Failed to write a trace to {self.path}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, line: bytes):
+        if self._file.tell() and self._file.tell() + len(line) > self.max_bytes:
+            self._rotate()
+        self._file.write(line)
+        self._file.flush()
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, "ab")
+
+    def flush(self):
+        """
+        Waits until every queued trace is written.
+        """
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(timeout=10)
+        self._file.close()
+
+
+class Tracer:
+    """
+    Traces the processing of files: each ``trace`` is the root span of a file, and ``span``s opened while it runs,
+    in the same task or in threads started with ``asyncio.to_thread``, are nested in it.
+
+    Whether a trace is kept is decided once the file is done. A ``sample_rate`` fraction of files are kept, and every
+    file that took at least ``slow_seconds``, so that slow files can always be looked into.
+    """
+
+    def __init__(self, exporter: Optional[SpanExporter], sample_rate: float = 0.0,
+                 slow_seconds: Optional[float] = None):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+
+    def should_export(self, root: Span) -> bool:
+        if self.slow_seconds is not None and root.duration >= self.slow_seconds:
+            return True
+        return random.random() < self.sample_rate
+
+    @contextmanager
+    def trace(self, name: str, file_id: Optional[int] = None, **attributes: Any) -> Iterator[Optional[Span]]:
+        """
+        Opens the root span of a file's trace, and exports the trace when it closes if it is kept.
+        """
+        if self.exporter is None:
+            yield None
+            return
+        trace = Trace(file_id)
+        root = Span(trace, name, attributes={"file_id": file_id, **attributes})
+        reset_token = _current_span.set(root)
+        try:
+            yield root
+        except BaseException as e:
+            root.fail(e)
+            raise
+        finally:
+            _current_span.reset(reset_token)
+            root.end()
+            spans = trace.finish()
+            if self.should_export(root):
+                self.exporter.export(spans)
+
+    def close(self):
+        if self.exporter is not None:
+            self.exporter.close()
@@ -0,0 +1,304 @@
+# The MIT License (MIT)
+# Copyright © 2024 Corsali, Inc. dba Vana
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import math
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import vana
+from web3.exceptions import TransactionNotFound
+
+from chatgpt.utils.deadlines import CancelToken
+from chatgpt.utils.tracing import span
+
+
+@dataclass
+class PendingTransaction:
+    nonce: int
+    function: Any
+    gas: int
+    gas_price: int
+    value: int = 0
+    tx_hash: Optional[str] = None
+    submitted_at: float = field(default_factory=time.time)
+    replacements: int = 0
+    receipt: Optional[Any] = None
+    callbacks: List[Callable[["PendingTransaction"], None]] = field(default_factory=list)
+
+    @property
+    def succeeded(self) -> bool:
+        return self.receipt is not None and self.receipt.get("status", 1) == 1
+
+
+def _is_nonce_error(error: Exception) -> bool:
+    message = str(error).lower()
+    return "nonce too low" in message or "replacement transaction underpriced" in message
+
+
+def _is_already_known(error: Exception) -> bool:
+    # The node already has this exact signed transaction, e.g. from a send that timed out and was retried
+    return "already known" in str(error).lower()
+
+
+class TransactionManager:
+    """
+    Submits contract transactions without waiting for their receipts.
+
+    Nonces are assigned locally so that several transactions (e.g. ``verifyFile`` for consecutive files followed by
+    ``updateWeights``) can be in flight at once. Receipts are collected by ``poll``, which is called periodically from
+    a background thread once ``start`` has been called. Transactions that are not mined within ``replace_after``
+    seconds are re-sent with the same nonce and a bumped gas price, up to ``max_replacements`` times before they are
+    given up on. The local nonce is re-synced from the chain whenever the node reports a nonce conflict.
+    """
+
+    def __init__(self, chain_manager: "vana.ChainManager", account, replace_after: float = 60,
+                 gas_bump: float = 1.2, max_replacements: int = 3, max_pending: int = 64,
+                 poll_interval: float = 2):
+        self.chain_manager = chain_manager
+        self.account = account
+        self.replace_after = replace_after
+        self.gas_bump = gas_bump
+        self.max_replacements = max_replacements
+        self.max_pending = max_pending
+        self.poll_interval = poll_interval
+
+        self._lock = threading.RLock()
+        self._drained = threading.Condition(self._lock)
+        self._next_nonce: Optional[int] = None
+        self._pending: Dict[int, PendingTransaction] = {}
+        self._should_exit = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def web3(self):
+        return self.chain_manager.web3
+
+    @property
+    def pending_count(self) -> int:
+        """
+        Number of submitted transactions whose receipts have not been seen yet.
+        """
+        with self._lock:
+            return len(self._pending)
+
+    def submit(self, function, on_receipt: Optional[Callable[[PendingTransaction], None]] = None,
+               value: int = 0, token: Optional[CancelToken] = None) -> Optional[PendingTransaction]:
+        """
+        Signs and broadcasts a contract transaction and returns immediately.
+        :param function: Contract function to call, e.g. ``dlp_contract.functions.verifyFile(...)``
+        :param on_receipt: Called with the ``PendingTransaction`` once its receipt is available
+        :param value: Amount of VANA (in ether) to send with the transaction
+        :param token: Bounds the wait for room in the mempool. It is not checked once the transaction is being
+            broadcast, so a cancelled submit has never sent anything.
+        :return: The pending transaction, or None if it could not be submitted
+        """
+        with span(f"contract.{getattr(function, 'fn_name', 'transaction')}") as submit_span:
+            tx = self._submit(function, on_receipt, value, token)
+            if submit_span and tx:
+                submit_span.set(nonce=tx.nonce, tx_hash=tx.tx_hash)
+            return tx
+
+    def _submit(self, function, on_receipt: Optional[Callable[[PendingTransaction], None]],
+                value: int, token: Optional[CancelToken]) -> Optional[PendingTransaction]:
+        try:
+            tx_params = {"from": self.account.address, "value": self.web3.to_wei(value, "ether")}
+            gas = function.estimate_gas(tx_params) * 2
+            gas_price = self.web3.eth.gas_price
+        except Exception as e:
+            vana.logging.error(f"Failed to prepare transaction: {e}")
+            return None
+
+        with self._lock:
+            # Backpressure: do not let the mempool grow without bound if the chain is not keeping up
+            while len(self._pending) >= self.max_pending:
+                if token:
+                    token.check()
+                vana.logging.warning(f"{len(self._pending)} transactions pending, waiting for receipts")
+                wait = token.remaining(self.poll_interval) if token else self.poll_interval
+                if not self._drained.wait(timeout=wait):
+                    self._poll_locked()
+            if token:
+                token.check()
+
+            for attempt in range(2):
+                nonce = self._reserve_nonce()
+                tx = PendingTransaction(nonce=nonce, function=function, gas=gas, gas_price=gas_price, value=value)
+                if on_receipt:
+                    tx.callbacks.append(on_receipt)
+                try:
+                    self._broadcast(tx)
+                    self._pending[nonce] = tx
+                    return tx
+                except Exception as e:
+                    if _is_already_known(e):
+                        # Broadcasting again under another nonce would send a duplicate, track the one in the mempool
+                        vana.logging.warning(f"Transaction {tx.tx_hash} with nonce {nonce} was already known")
+                        self._pending[nonce] = tx
+                        return tx
+                    # Whatever happened, the locally tracked nonce can no longer be trusted
+                    self._next_nonce = None
+                    if attempt == 0 and _is_nonce_error(e):
+                        vana.logging.warning(f"Nonce {nonce} rejected ({e}), re-syncing nonce from chain")
+                        continue
+                    vana.logging.error(f"Failed to submit transaction: {e}")
+                    return None
+
+    def poll(self):
+        """
+        Collects receipts for pending transactions, replacing those that appear to be stuck.
+        """
+        with self._lock:
+            self._poll_locked()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Blocks until every pending transaction has a receipt.
+        :param timeout: Maximum number of seconds to wait
+        :return: True if no transactions are pending
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._lock:
+            while self._pending:
+                remaining = self.poll_interval if deadline is None else min(self.poll_interval, deadline - time.time())
+                if remaining <= 0:
+                    return False
+                if not self._drained.wait(timeout=remaining):
+                    self._poll_locked()
+            return True
+
+    def start(self):
+        """
+        Starts tracking receipts in a background thread.
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._should_exit.clear()
+        self._thread = threading.Thread(target=self._run, name="TransactionManager", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        """
+        Stops the background receipt tracker. Pending transactions are kept and can still be polled.
+        """
+        self._should_exit.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._should_exit.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception as e:
+                vana.logging.error(f"Error while polling transaction receipts: {e}")
+
+    def _reserve_nonce(self) -> int:
+        if self._next_nonce is None:
+            self._sync_nonce()
+        nonce = self._next_nonce
+        self._next_nonce += 1
+        return nonce
+
+    def _sync_nonce(self):
+        chain_nonce = self.web3.eth.get_transaction_count(self.account.address, "pending")
+        local_nonce = max(self._pending) + 1 if self._pending else 0
+        self._next_nonce = max(chain_nonce, local_nonce)
+
+    def _broadcast(self, tx: PendingTransaction):
+        """
+        Signs and sends ``tx``. Its hash is computed locally before sending, so that it is known even if the node
+        reports the transaction as already known.
+        """
+        transaction = tx.function.build_transaction({
+            "from": self.account.address,
+            "value": self.web3.to_wei(tx.value, "ether"),
+            "gas": tx.gas,
+            "gasPrice": tx.gas_price,
+            "nonce": tx.nonce,
+        })
+        signed_tx = self.web3.eth.account.sign_transaction(transaction, private_key=self.account.key)
+        tx.tx_hash = signed_tx.hash.hex() if hasattr(signed_tx.hash, "hex") else str(signed_tx.hash)
+        tx.submitted_at = time.time()
+        self.web3.eth.send_raw_transaction(signed_tx.rawTransaction)
+        vana.logging.info(f"Submitted transaction {tx.tx_hash} with nonce {tx.nonce}")
+
+    def _poll_locked(self):
+        if not self._pending:
+            return
+
+        confirmed_nonce = self.web3.eth.get_transaction_count(self.account.address, "latest")
+        for nonce in sorted(self._pending):
+            tx = self._pending[nonce]
+            try:
+                tx.receipt = self.web3.eth.get_transaction_receipt(tx.tx_hash)
+            except TransactionNotFound:
+                tx.receipt = None
+
+            if tx.receipt is not None:
+                self._complete(tx)
+            elif nonce < confirmed_nonce:
+                # The nonce was consumed by a different transaction (e.g. a replacement we lost track of, or
+                # another process signing with the same key).
+                vana.logging.warning(f"Transaction {tx.tx_hash} with nonce {nonce} was superseded on-chain")
+                self._complete(tx)
+                self._next_nonce = None
+            elif time.time() - tx.submitted_at >= self.replace_after:
+                self._replace(tx)
+
+        if not self._pending:
+            self._drained.notify_all()
+
+    def _replace(self, tx: PendingTransaction):
+        if tx.replacements >= self.max_replacements:
+            # Give up, so that the transaction stops holding a pending slot. Its callbacks see no receipt, and its
+            # nonce is re-synced from the chain for the next transaction
+            vana.logging.error(
+                f"Giving up on transaction {tx.tx_hash} with nonce {tx.nonce}, still pending after "
+                f"{tx.replacements} replacements")
+            self._next_nonce = None
+            self._complete(tx)
+            return
+
+        previous_hash = tx.tx_hash
+        tx.gas_price = max(self.web3.eth.gas_price, math.ceil(tx.gas_price * self.gas_bump))
+        tx.replacements += 1
+        try:
+            self._broadcast(tx)
+            vana.logging.info(f"Replaced stuck transaction {previous_hash} with {tx.tx_hash}")
+        except Exception as e:
+            if _is_already_known(e):
+                # The replacement reached the node before, it is tracked by its hash
+                pass
+            elif _is_nonce_error(e):
+                # The original transaction got mined in the meantime, its receipt will be picked up on the next poll
+                tx.tx_hash = previous_hash
+            else:
+                tx.tx_hash = previous_hash
+                vana.logging.error(f"Failed to replace transaction {previous_hash}: {e}")
+
+    def _complete(self, tx: PendingTransaction):
+        self._pending.pop(tx.nonce, None)
+        if tx.receipt is not None and not tx.succeeded:
+            vana.logging.error(f"Transaction {tx.tx_hash} reverted: {tx.receipt}")
+        for callback in tx.callbacks:
+            try:
+                callback(tx)
+            except Exception as e:
+                vana.logging.error(f"Error in transaction receipt callback: {e}")
+        self._drained.notify_all()
@@ -15,29 +15,39 @@
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
+import hashlib
 import json
 import math
 import os
 import random
 import zipfile
-from typing import List, Dict, Any, Iterable
-from openai import OpenAI
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+from openai import NOT_GIVEN, APITimeoutError, OpenAI
 from chatgpt.models.chatgpt import ChatGPTData
+from chatgpt.utils.conversation_store import ConversationResultStore
+from chatgpt.utils.deadlines import CancelToken, StageTimeout
+from chatgpt.utils.metrics import CACHE_LOOKUPS, LLM_TOKENS, STAGE_SECONDS
+from chatgpt.utils.tracing import span
 import vana as opendata
 import tiktoken
 from chatgpt.utils.config import get_validation_config
 
 
-def evaluate_chatgpt_zip(zip_file_path):
+def evaluate_chatgpt_zip(zip_file_path, token: Optional[CancelToken] = None, llm_timeout: Optional[float] = None,
+                         store: Optional[ConversationResultStore] = None):
     """
     Validate a ChatGPT data zip file.
     :param zip_file_path:  Path to the zip file containing ChatGPT data
-    :return: Object containing metadata, validation result and a score
+    :param token: Cancels the validation, including pending LLM requests
+    :param llm_timeout: Timeout of each LLM request in seconds
+    :param store: Results of conversations evaluated before. Unchanged conversations reuse their metrics and LLM
+        score instead of being parsed and scored again
+    :return: Object containing metadata, validation result, a score, and how many results were reused
     """
     required_files = ['chat.html', 'conversations.json', 'message_feedback.json', 'model_comparisons.json', 'user.json']
 
     # Load data from zip file and validate that it contains the required files
-    with zipfile.ZipFile(zip_file_path, 'r') as zip_ref:
+    with span("load_conversations"), zipfile.ZipFile(zip_file_path, 'r') as zip_ref:
         file_names = zip_ref.namelist()
         if not all(file in file_names for file in required_files):
             raise ValueError(f"Zip file does not contain all required files: {required_files}")
@@ -49,46 +59,81 @@ def evaluate_chatgpt_zip(zip_file_path):
         if not validate_file_structure(zip_ref, required_files):
             raise ValueError("Validation failed for one or more files")
 
-    # Load and parse the data
-    parsed_data = load_chatgpt_data(data)
-
-    # Analyze the structure and content of conversations.json
-    metadata = analyze_data(parsed_data)
-
-    # Perform validation and scoring
-    # Check file metadata using the validation config thresholds
-    validation_response = calculate_score_from_metadata(metadata)
+    # Parse the conversations that have no stored metrics. The LLM validation parses the ones it samples
+    metrics = []
+    reused = {"conversations": len(data), "metrics": 0, "llm_scores": 0}
+    with STAGE_SECONDS.labels(stage="parse").time(), span("parse", conversations=len(data)) as parse_span:
+        for item in data:
+            key = conversation_key(item) if store is not None else None
+            stored_metrics = store.get(*key).get("metrics") if store is not None else None
+            if stored_metrics:
+                metrics.append(stored_metrics)
+                reused["metrics"] += 1
+                continue
+            metrics.append(conversation_metrics(ChatGPTData(**item)))
+            if store is not None:
+                store.put(*key, metrics=metrics[-1])
+        if parse_span:
+            parse_span.set(reused_metrics=reused["metrics"])
+    if store is not None:
+        CACHE_LOOKUPS.labels(cache="conversation_metrics", result="hit").inc(reused["metrics"])
+        CACHE_LOOKUPS.labels(cache="conversation_metrics", result="miss").inc(len(data) - reused["metrics"])
+
+    with STAGE_SECONDS.labels(stage="analyze").time(), span("analyze"):
+        # Analyze the structure and content of conversations.json
+        metadata = aggregate_metrics(metrics)
+
+        # Perform validation and scoring
+        # Check file metadata using the validation config thresholds
+        validation_response = calculate_score_from_metadata(metadata)
 
     # If optional LLM check is enabled and the API key is set, perform LLM validation
     if "OPENAI_API_KEY" in os.environ and validation_response["is_valid"]:
         opendata.logging.info("OPENAI_API_KEY is set. Performing LLM validation.")
-        validation_response = validate_sample(parsed_data)
+        with span("llm_validation"):
+            validation_response = validate_sample(data, token=token, llm_timeout=llm_timeout, store=store)
+        reused["llm_scores"] = validation_response.get("reused_llm_scores", 0)
+
+    if store is not None:
+        opendata.logging.info(f"Reused the metrics of {reused['metrics']} of {reused['conversations']} "
+                              f"conversations and {reused['llm_scores']} LLM scores")
 
     return {
         'is_valid': validation_response["is_valid"],
         'score': validation_response["score"] / 100,
         'metadata': metadata,
+        'reused': reused,
     }
 
 
+def conversation_key(conversation: ChatGPTData | dict) -> Tuple[Optional[str], Optional[float], str]:
+    """
+    The ``conversation_id``, ``update_time`` and content hash of a conversation, parsed or as a dict from
+    conversations.json. The hash is the SHA-256 of the conversation's canonical JSON, so that stored results are not
+    reused for edited content under the same ID and timestamp.
+    """
+    if isinstance(conversation, ChatGPTData):
+        conversation = conversation.model_dump(mode="json")
+    canonical = json.dumps(conversation, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    content_hash = hashlib.sha256(canonical.encode()).hexdigest()
+    return conversation.get("conversation_id"), conversation.get("update_time"), content_hash
+
+
 def analyze_data(data: List[ChatGPTData]) -> Dict[str, Any]:
     """
     Analyze the structure and content of ChatGPT data.
     :param data: List of ChatGPTData objects
     :return: Dictionary containing metadata analysis
     """
-    num_conversations = len(data)
-    total_messages = 0
-
-    for conv in data:
-        for node in conv.mapping.values():
-            if node.message and node.message.content.parts:
-                message_text = ' '.join(str(part) for part in node.message.content.parts)
-                if len(message_text) > 0:
-                    total_messages += 1
+    return aggregate_metrics([conversation_metrics(conv) for conv in data])
 
-    avg_messages_per_conversation = round(total_messages / num_conversations, 2)
 
+def conversation_metrics(conv: ChatGPTData) -> Dict[str, int]:
+    """
+    Counts what ``aggregate_metrics`` needs from a single conversation.
+    :param conv: ChatGPTData object
+    :return: Number of messages with text, their total length, and number of messages with content parts
+    """
     def get_message_length(node):
         if node.message and isinstance(node.message.content.parts, Iterable):
             length = 0
@@ -100,29 +145,40 @@ def analyze_data(data: List[ChatGPTData]) -> Dict[str, Any]:
             return length
         return 0
 
-    total_message_length = sum(
-        get_message_length(node)
-        for conv in data
-        for node in conv.mapping.values()
-        if node.message and node.message.content.parts
-    )
+    messages = 0
+    message_length = 0
+    messages_with_parts = 0
+    for node in conv.mapping.values():
+        if node.message and node.message.content.parts:
+            message_text = ' '.join(str(part) for part in node.message.content.parts)
+            if len(message_text) > 0:
+                messages += 1
+            message_length += get_message_length(node)
+            messages_with_parts += 1
+
+    return {
+        'messages': messages,
+        'message_length': message_length,
+        'messages_with_parts': messages_with_parts,
+    }
+
+
+def aggregate_metrics(metrics: List[Dict[str, int]]) -> Dict[str, Any]:
+    """
+    Combines the metrics of each conversation into the metadata of a whole export.
+    :param metrics: ``conversation_metrics`` of each conversation
+    :return: Dictionary containing metadata analysis
+    """
+    num_conversations = len(metrics)
+    total_messages = sum(m['messages'] for m in metrics)
+    avg_messages_per_conversation = round(total_messages / num_conversations, 2)
+
+    total_message_length = sum(m['message_length'] for m in metrics)
     avg_message_length = round(total_message_length / total_messages, 2) if total_messages > 0 else 0
 
     # Additional metadata analysis
-    max_messages_per_conversation = max(
-        sum(
-            1 for node in conv.mapping.values()
-            if node.message and node.message.content.parts
-        )
-        for conv in data
-    )
-    min_messages_per_conversation = min(
-        sum(
-            1 for node in conv.mapping.values()
-            if node.message and node.message.content.parts
-        )
-        for conv in data
-    )
+    max_messages_per_conversation = max(m['messages_with_parts'] for m in metrics)
+    min_messages_per_conversation = min(m['messages_with_parts'] for m in metrics)
     total_characters = total_message_length
 
     return {
@@ -135,13 +191,20 @@ def analyze_data(data: List[ChatGPTData]) -> Dict[str, Any]:
     }
 
 
-def validate_sample(data: List[ChatGPTData]) -> bool | dict[str, float | bool]:
+def validate_sample(data: List[ChatGPTData | dict], token: Optional[CancelToken] = None,
+                    llm_timeout: Optional[float] = None,
+                    store: Optional[ConversationResultStore] = None) -> bool | dict[str, float | bool]:
     """
     Validate a sample of ChatGPT data using a language model evaluation.
-    :param data:
+    :param data: Conversations, parsed or as dicts from conversations.json that are parsed when sampled
+    :param token: Cancels the validation. Closing the client aborts the request in flight
+    :param llm_timeout: Timeout of each LLM request in seconds
+    :param store: Results of conversations evaluated before. Sampled conversations with a stored LLM score reuse it
     :return:
     """
+    token = token or CancelToken()
     client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+    token.on_cancel(client.close)
 
     validation_config = get_validation_config()
 
@@ -151,6 +214,7 @@ def validate_sample(data: List[ChatGPTData]) -> bool | dict[str, float | bool]:
 
     sample = random.sample(data, sample_size)
     scores = []
+    reused_llm_scores = 0
 
     encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
     system_message = ("You are an AI language model that evaluates the coherence and relevance of a conversation. "
@@ -161,6 +225,17 @@ def validate_sample(data: List[ChatGPTData]) -> bool | dict[str, float | bool]:
     system_message_tokens = encoding.encode(system_message)
 
     for conversation in sample:
+        key = conversation_key(conversation) if store is not None else None
+        stored_score = store.get(*key).get("llm_score") if store is not None else None
+        if store is not None:
+            CACHE_LOOKUPS.labels(cache="llm_scores", result="miss" if stored_score is None else "hit").inc()
+        if stored_score is not None:
+            scores.append(stored_score)
+            reused_llm_scores += 1
+            continue
+        if not isinstance(conversation, ChatGPTData):
+            conversation = ChatGPTData(**conversation)
+
         context = []
         for node in conversation.mapping.values():
             if node.message:
@@ -177,46 +252,63 @@ def validate_sample(data: List[ChatGPTData]) -> bool | dict[str, float | bool]:
         context_chunks = [context_tokens[i:i+max_chunk_size] for i in range(0, len(context_tokens), max_chunk_size)]
 
         chunk_scores = []
-        for chunk in context_chunks:
-            chunk_text = encoding.decode(chunk)
-            max_retries = 3
-            retry_count = 0
-            while retry_count < max_retries:
-                response = client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": system_message},
-                        {"role": "user", "content": f"# Conversation to evaluate:\n\n{chunk_text}"}
-                    ],
-                )
-
-                score_json = response.choices[0].message.content
-                opendata.logging.info(f"LLM validation response: {score_json}")
-
-                try:
-                    score_data = json.loads(score_json)
-                    score = int(score_data["score"])
-                    chunk_scores.append(score)
-                    # Exit the retry loop if a valid JSON response is received
-                    break
-                except (json.JSONDecodeError, KeyError, ValueError):
-                    retry_count += 1
-                    if retry_count == max_retries:
-                        opendata.logging.info(f"Failed to get a valid JSON response after {max_retries} retries.")
-                        return {
-                            'is_valid': False,
-                            'score': 0
-                        }
+        for chunk_index, chunk in enumerate(context_chunks):
+            with span("llm_chunk", conversation_id=conversation.conversation_id, chunk=chunk_index,
+                      tokens=len(chunk)) as chunk_span:
+                chunk_text = encoding.decode(chunk)
+                max_retries = 3
+                retry_count = 0
+                while retry_count < max_retries:
+                    token.check()
+                    request_timeout = token.remaining(llm_timeout)
+                    try:
+                        with STAGE_SECONDS.labels(stage="llm").time():
+                            response = client.chat.completions.create(
+                                model="gpt-3.5-turbo",
+                                messages=[
+                                    {"role": "system", "content": system_message},
+                                    {"role": "user", "content": f"# Conversation to evaluate:\n\n{chunk_text}"}
+                                ],
+                                timeout=NOT_GIVEN if request_timeout is None else request_timeout,
+                            )
+                    except APITimeoutError:
+                        raise StageTimeout("llm")
+                    if response.usage:
+                        LLM_TOKENS.labels(kind="prompt").inc(response.usage.prompt_tokens)
+                        LLM_TOKENS.labels(kind="completion").inc(response.usage.completion_tokens)
+                    if chunk_span:
+                        chunk_span.set(attempts=retry_count + 1)
+
+                    score_json = response.choices[0].message.content
+                    opendata.logging.info(f"LLM validation response: {score_json}")
+
+                    try:
+                        score_data = json.loads(score_json)
+                        score = int(score_data["score"])
+                        chunk_scores.append(score)
+                        # Exit the retry loop if a valid JSON response is received
+                        break
+                    except (json.JSONDecodeError, KeyError, ValueError):
+                        retry_count += 1
+                        if retry_count == max_retries:
+                            opendata.logging.info(f"Failed to get a valid JSON response after {max_retries} retries.")
+                            return {
+                                'is_valid': False,
+                                'score': 0
+                            }
 
         avg_conversation_score = sum(chunk_scores) / len(chunk_scores)
         scores.append(avg_conversation_score)
+        if store is not None:
+            store.put(*key, llm_score=avg_conversation_score)
 
     avg_score = sum(scores) / len(scores)
     opendata.logging.info(f"Average LLM validation score: {avg_score}")
 
     return {
         'is_valid': avg_score >= threshold_score,
-        'score': avg_score
+        'score': avg_score,
+        'reused_llm_scores': reused_llm_scores
     }
 
 
@@ -0,0 +1,91 @@
+# The MIT License (MIT)
+# Copyright © 2024 Corsali, Inc. dba Vana
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import threading
+import time
+from typing import List, Optional
+
+import vana
+
+from chatgpt.utils.events import ContractEventFollower
+
+
+class ValidatorRegistry:
+    """
+    In-memory copy of the DLP's active validator list.
+
+    The list is read from the contract once and served from memory until it is invalidated by a validator or epoch
+    event, or until ``ttl`` seconds have passed. If a refresh fails, the previous list keeps being served.
+    """
+
+    INVALIDATING_EVENTS = [
+        "ValidatorRegistered",
+        "ValidatorApproved",
+        "ValidatorDeregistered",
+        "ValidatorDeregisteredByOwner",
+        "ValidatorUnregistered",
+        "EpochCreated",
+    ]
+
+    def __init__(self, chain_manager: "vana.ChainManager", dlp_contract, ttl: float = 300):
+        self.chain_manager = chain_manager
+        self.dlp_contract = dlp_contract
+        self.ttl = ttl
+
+        self._validators: Optional[List[str]] = None
+        self._loaded_at = 0.0
+        self._stale = True
+        self._lock = threading.Lock()
+
+    def follow(self, follower: ContractEventFollower):
+        """
+        Invalidates the cached list whenever the validator set may have changed on-chain.
+        """
+        for event_name in self.INVALIDATING_EVENTS:
+            follower.subscribe(event_name, lambda event: self.invalidate())
+
+    def invalidate(self):
+        self._stale = True
+
+    def validators(self) -> List[str]:
+        """
+        Returns the active validator addresses, reading them from the contract only if the cache is stale.
+        """
+        with self._lock:
+            if self._stale or time.monotonic() - self._loaded_at >= self.ttl:
+                self._refresh()
+            return list(self._validators or [])
+
+    def __contains__(self, address: str) -> bool:
+        return address in self.validators()
+
+    def _refresh(self):
+        # Cleared before reading, so that an event arriving during the read marks the result stale again
+        self._stale = False
+        validator_count = self.chain_manager.read_contract_fn(self.dlp_contract.functions.activeValidatorsListsCount())
+        validators = None
+        if validator_count is not None:
+            validators = self.chain_manager.read_contract_fn(
+                self.dlp_contract.functions.activeValidatorsLists(validator_count))
+
+        if validators is None:
+            vana.logging.warning("Failed to read the active validators, using the cached list")
+            self._stale = self._validators is None
+            return
+
+        self._validators = list(validators)
+        self._loaded_at = time.monotonic()
@@ -0,0 +1,104 @@
+# The MIT License (MIT)
+# Copyright © 2024 Corsali, Inc. dba Vana
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the “Software”), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of
+# the Software.
+
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO
+# THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import vana
+
+
+class WeightPublisher:
+    """
+    Decides when the validator's weights are worth writing on-chain.
+
+    Tracks the weights last confirmed on-chain and only publishes when the total absolute change since then reaches
+    ``threshold``, or when ``max_interval`` blocks have passed since the last publication. At most one publication is
+    in flight at a time.
+
+    With ``partial`` set, only the entries that changed are sent. This is only correct if the contract's
+    ``updateWeights`` merges the given entries into the stored ones rather than replacing them.
+    """
+
+    # Differences smaller than this are rounding noise from the WAD conversion
+    EPSILON = 1e-9
+
+    def __init__(self, threshold: float = 0.05, max_interval: int = 1000, partial: bool = False):
+        self.threshold = threshold
+        self.max_interval = max_interval
+        self.partial = partial
+
+        self.published: Dict[str, float] = {}
+        self.published_at_block: Optional[int] = None
+        self._in_flight: Optional[Tuple[Dict[str, float], int]] = None
+        self._lock = threading.Lock()
+
+    def load(self, validators: List[str], weights: List[float], block: Optional[int] = None):
+        """
+        Starts from the weights currently stored on-chain, e.g. those returned by ``validatorWeights``.
+        """
+        with self._lock:
+            self.published = dict(zip(validators, weights))
+            self.published_at_block = block
+
+    def change(self, weights: Dict[str, float]) -> float:
+        """
+        Total absolute difference between ``weights`` and the published weights.
+        """
+        validators = set(weights) | set(self.published)
+        return sum(abs(weights.get(v, 0.0) - self.published.get(v, 0.0)) for v in validators)
+
+    def changed(self, weights: Dict[str, float]) -> Dict[str, float]:
+        return {v: w for v, w in weights.items() if abs(w - self.published.get(v, 0.0)) > self.EPSILON}
+
+    def should_publish(self, weights: Dict[str, float], block: int) -> bool:
+        with self._lock:
+            if self._in_flight is not None:
+                return False
+            if not self.changed(weights):
+                return False
+            if self.published_at_block is None or block - self.published_at_block >= self.max_interval:
+                return True
+            return self.change(weights) >= self.threshold
+
+    def payload(self, weights: Dict[str, float]) -> Tuple[List[str], List[float]]:
+        """
+        The validators and weights to send, either all of them or only the changed ones.
+        """
+        entries = self.changed(weights) if self.partial else weights
+        return list(entries.keys()), list(entries.values())
+
+    def started(self, weights: Dict[str, float], block: int):
+        """
+        Records that a transaction publishing ``weights`` was submitted at ``block``.
+        """
+        with self._lock:
+            self._in_flight = (dict(weights), block)
+
+    def finished(self, succeeded: bool):
+        """
+        Records the outcome of the in-flight publication.
+        """
+        with self._lock:
+            if self._in_flight is None:
+                return
+            weights, block = self._in_flight
+            self._in_flight = None
+            if succeeded:
+                self.published = weights
+                self.published_at_block = block
+            else:
+                vana.logging.warning("Publishing weights failed, they will be sent again")
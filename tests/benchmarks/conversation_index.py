@@ -0,0 +1,60 @@
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from chatgpt.utils.minhash import NUM_PERM, ConversationIndex
+
+
+def benchmark(directory, num_conversations, conversations_per_file, queries):
+    rng = np.random.default_rng(0)
+    index = ConversationIndex(directory)
+
+    # Random signatures stand in for real ones, computing MinHash of 10M texts would dominate the run
+    start = time.perf_counter()
+    samples = []
+    for file_id, offset in enumerate(range(0, num_conversations, conversations_per_file), start=1):
+        signatures = rng.integers(0, 2 ** 32, (min(conversations_per_file, num_conversations - offset), NUM_PERM),
+                                  dtype=np.uint32)
+        index.add(file_id, signatures)
+        if len(samples) < queries // 2 and rng.random() < queries / (num_conversations / conversations_per_file):
+            samples.append(signatures[0])
+    print(f"Indexed {len(index)} conversations in {time.perf_counter() - start:.1f}s")
+    index.store.compact()
+    index.close()
+
+    start = time.perf_counter()
+    index = ConversationIndex(directory, readonly=True)
+    print(f"Reopened {len(index)} conversations in {len(index.store.segments())} segments "
+          f"in {time.perf_counter() - start:.2f}s")
+
+    # A re-uploaded export: half of its conversations are lightly edited copies of indexed ones
+    copies = np.array(samples)
+    edited = rng.random(copies.shape) < 0.05
+    copies[edited] = rng.integers(0, 2 ** 32, edited.sum(), dtype=np.uint32)
+    export = np.concatenate((copies, rng.integers(0, 2 ** 32, (len(copies), NUM_PERM), dtype=np.uint32)))
+
+    # The first check pages the index in, later ones find it in the page cache
+    for run in ["cold", "warm"]:
+        start = time.perf_counter()
+        fraction = index.duplicate_fraction(export)
+        elapsed = time.perf_counter() - start
+        print(f"Checked {len(export)} conversations ({run}) in {elapsed * 1000:.1f}ms "
+              f"({elapsed / len(export) * 1e6:.0f}us each), duplicate fraction {fraction:.3f} (expected 0.5)")
+
+
+if __name__ == "__main__":
+    # Measures near-duplicate lookups against a large pool of indexed conversations
+    # Usage: poetry run python tests/benchmarks/conversation_index.py --conversations 10000000
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--conversations", type=int, default=10_000_000)
+    parser.add_argument("--conversations-per-file", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--directory", help="Where to store the index, a temporary directory by default")
+    args = parser.parse_args()
+    if args.directory:
+        benchmark(args.directory, args.conversations, args.conversations_per_file, args.queries)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            benchmark(directory, args.conversations, args.conversations_per_file, args.queries)
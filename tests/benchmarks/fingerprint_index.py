@@ -0,0 +1,49 @@
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from chatgpt.utils.fingerprint import N_FEATURES, FingerprintIndex
+
+
+def benchmark(directory, num_files, queries, k):
+    rng = np.random.default_rng(0)
+    index = FingerprintIndex(directory)
+
+    start = time.perf_counter()
+    # Fingerprints are non-negative term counts, like HashingVectorizer(alternate_sign=False) produces
+    for file_id, vector in enumerate(rng.random((num_files, N_FEATURES), dtype=np.float32), start=1):
+        index.add(file_id, vector)
+    print(f"Indexed {num_files} fingerprints in {time.perf_counter() - start:.2f}s")
+    index.store.compact()
+    index.close()
+
+    start = time.perf_counter()
+    index = FingerprintIndex(directory, readonly=True)
+    print(f"Reopened {len(index)} fingerprints in {len(index.store.segments())} segments "
+          f"in {time.perf_counter() - start:.2f}s")
+
+    timings = []
+    for vector in rng.random((queries, N_FEATURES), dtype=np.float32):
+        start = time.perf_counter()
+        index.query(vector, k=k)
+        timings.append(time.perf_counter() - start)
+    timings = np.array(timings) * 1000
+    print(f"Top-{k} query: median {np.median(timings):.1f}ms, p99 {np.percentile(timings, 99):.1f}ms")
+
+
+if __name__ == "__main__":
+    # Measures uniqueness queries against a large pool of previously validated files
+    # Usage: poetry run python tests/benchmarks/fingerprint_index.py --files 1000000
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--directory", help="Where to store the index, a temporary directory by default")
+    args = parser.parse_args()
+    if args.directory:
+        benchmark(args.directory, args.files, args.queries, args.k)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            benchmark(directory, args.files, args.queries, args.k)
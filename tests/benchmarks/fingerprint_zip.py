@@ -0,0 +1,59 @@
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+import numpy as np
+
+from chatgpt.utils.fingerprint import feature_hash_string, fingerprint_zip
+
+
+def make_export(path, size_mb):
+    rng = np.random.default_rng(0)
+    words = np.array(["".join(rng.choice(list("abcdefghijklmnopqrstuvwxyz"), rng.integers(2, 10)))
+                      for _ in range(20000)])
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zip_ref:
+        for i in range(max(1, size_mb // 8)):
+            text = " ".join(rng.choice(words, 8 * 1024 * 1024 // 6))
+            zip_ref.writestr(f"part-{i}/conversations.json", text)
+
+
+def extract_and_concatenate(zip_path):
+    # The previous approach: extract everything, then hash the contents as one string
+    with tempfile.TemporaryDirectory() as directory:
+        with zipfile.ZipFile(zip_path, "r") as zip_ref:
+            zip_ref.extractall(directory)
+        contents = ""
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            for name in sorted(files):
+                with open(os.path.join(root, name), "r", errors="ignore") as f:
+                    contents += f.read()
+        return feature_hash_string(contents)
+
+
+def measure(name, fn, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name}: {elapsed:.2f}s, peak {peak / 1024 / 1024:.0f} MiB")
+    return result
+
+
+if __name__ == "__main__":
+    # Compares fingerprinting an export by extracting it against streaming its members
+    # Usage: poetry run python tests/benchmarks/fingerprint_zip.py --size-mb 64
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=64)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        zip_path = os.path.join(directory, "export.zip")
+        make_export(zip_path, args.size_mb)
+        extracted = measure("Extract and concatenate", extract_and_concatenate, zip_path)
+        streamed = measure("Stream members", fingerprint_zip, zip_path)
+        print(f"Max difference: {np.abs(extracted - streamed).max():.2e}")
@@ -0,0 +1,80 @@
+import argparse
+import random
+import time
+
+from chatgpt.utils.scoring import DIMENSIONS, PerformanceBatch
+
+MAX_WAIT_BLOCKS = 100
+
+
+def per_pair_score(own_submission, validator_score, file_data):
+    """
+    The per-pair computation that score_validator_performance used to do
+    """
+    initial_weights = {'score': 50, 'authenticity': 10, 'ownership': 10, 'quality': 10, 'uniqueness': 10, 'speed': 10}
+    weights = {k: v for k, v in initial_weights.items() if k in own_submission or k == 'speed'}
+    total_weight = sum(weights.values())
+    weights = {k: v / total_weight for k, v in weights.items()}
+
+    scores = {}
+    for dimension in DIMENSIONS:
+        if dimension in own_submission and dimension in validator_score:
+            scores[dimension] = 1 - abs(own_submission[dimension] - validator_score[dimension])
+        else:
+            scores[dimension] = 0 if dimension in own_submission else 1
+
+    block_difference = validator_score['reportedAtBlock'] - file_data['addedAtBlock']
+    scores['speed'] = max(0, 1 - block_difference / MAX_WAIT_BLOCKS) if block_difference >= 0 else 0
+    return sum(weights[k] * scores[k] for k in weights)
+
+
+def simulate(num_validators, num_files, seed=0):
+    """
+    One tempo's worth of peer submissions: every validator reports on every file, with some noise around our score.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for file_id in range(num_files):
+        own = {dimension: rng.random() for dimension in DIMENSIONS}
+        file_data = {"addedAtBlock": file_id}
+        for v in range(num_validators):
+            peer = {dimension: min(1.0, max(0.0, own[dimension] + rng.gauss(0, 0.1))) for dimension in DIMENSIONS}
+            peer["reportedAtBlock"] = file_id + rng.randint(0, 2 * MAX_WAIT_BLOCKS)
+            rows.append((f"validator_{v}", own, peer, file_data))
+    return rows
+
+
+def benchmark(num_validators, num_files):
+    rows = simulate(num_validators, num_files)
+    print(f"{len(rows)} (file, validator) pairs from {num_validators} validators")
+
+    start = time.perf_counter()
+    validator_scores = {}
+    for validator, own, peer, file_data in rows:
+        validator_scores.setdefault(validator, []).append(per_pair_score(own, peer, file_data))
+    per_pair_weights = {v: sum(scores) / len(scores) for v, scores in validator_scores.items()}
+    per_pair_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = PerformanceBatch(MAX_WAIT_BLOCKS)
+    for validator, own, peer, file_data in rows:
+        batch.add(validator, own, peer, file_data)
+    pack_time = time.perf_counter() - start
+    start = time.perf_counter()
+    batch_weights = batch.mean_by_validator()
+    score_time = time.perf_counter() - start
+
+    max_error = max(abs(per_pair_weights[v] - batch_weights[v]) for v in per_pair_weights)
+    print(f"per pair: {per_pair_time * 1000:.0f}ms")
+    print(f"batch: {(pack_time + score_time) * 1000:.0f}ms (packing {pack_time * 1000:.0f}ms, "
+          f"scoring {score_time * 1000:.0f}ms), max difference {max_error:.2e}")
+
+
+if __name__ == "__main__":
+    # Compares per-pair peer performance scoring with the vectorized batch
+    # Usage: poetry run python tests/benchmarks/peer_scoring.py --validators 5000 --files 100
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--validators", type=int, default=5000)
+    parser.add_argument("--files", type=int, default=100)
+    args = parser.parse_args()
+    benchmark(args.validators, args.files)
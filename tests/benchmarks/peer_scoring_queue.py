@@ -0,0 +1,80 @@
+import argparse
+import random
+import time
+
+from chatgpt.utils.peer_scoring import PeerScoringQueue, PeerScoringTask
+
+MAX_WAIT_BLOCKS = 100
+
+
+def make_tasks(num_tasks, validators):
+    # Files are added at a steady rate, so deadlines are spread over the backlog
+    return [
+        PeerScoringTask(file_id=file_id, active_validators=list(validators), own_submission={"score": 0.5},
+                        added_at_block=file_id * MAX_WAIT_BLOCKS // 1000)
+        for file_id in range(1, num_tasks + 1)
+    ]
+
+
+def legacy_pass(tasks, reported, current_block):
+    """
+    The scan that process_peer_scoring_queue used to do over state.needs_peer_scoring
+    """
+    for task in tasks[:]:
+        for validator in task.active_validators[:]:
+            if validator in task.processed_validators:
+                continue
+            if (task.file_id, validator) in reported or current_block - task.added_at_block >= MAX_WAIT_BLOCKS:
+                task.active_validators.remove(validator)
+                task.processed_validators.append(validator)
+        if not task.active_validators:
+            tasks.remove(task)
+
+
+def queue_pass(queue, reported, current_block):
+    for file_id, validator in queue.pairs_to_check():
+        if (file_id, validator) in reported:
+            queue.mark_processed(file_id, validator)
+    queue.expire(current_block)
+
+
+def benchmark(num_tasks, num_validators, passes, legacy):
+    validators = [f"validator_{i}" for i in range(num_validators)]
+    rng = random.Random(0)
+
+    start = time.perf_counter()
+    queue = PeerScoringQueue(MAX_WAIT_BLOCKS, make_tasks(num_tasks, validators), event_driven=True)
+    queue.pairs_to_check()
+    print(f"Indexed {num_tasks} tasks x {num_validators} validators in {time.perf_counter() - start:.2f}s")
+
+    legacy_tasks = make_tasks(num_tasks, validators) if legacy else None
+    current_block = 0
+    for i in range(passes):
+        # Each pass, 1% of the pairs report and the chain advances by one tempo
+        reported = {(rng.randint(1, num_tasks), rng.choice(validators)) for _ in range(num_tasks * num_validators // 100)}
+        current_block += 10
+
+        start = time.perf_counter()
+        for file_id, validator in reported:
+            queue.mark_reported(file_id, validator)
+        queue_pass(queue, reported, current_block)
+        queue_time = time.perf_counter() - start
+
+        line = f"pass {i}: indexed queue {queue_time * 1000:.1f}ms ({len(queue)} tasks left)"
+        if legacy:
+            start = time.perf_counter()
+            legacy_pass(legacy_tasks, reported, current_block)
+            line += f", list scan {(time.perf_counter() - start) * 1000:.1f}ms"
+        print(line)
+
+
+if __name__ == "__main__":
+    # Measures one peer scoring pass over a large backlog
+    # Usage: poetry run python tests/benchmarks/peer_scoring_queue.py [--legacy]
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=100_000)
+    parser.add_argument("--validators", type=int, default=50)
+    parser.add_argument("--passes", type=int, default=5)
+    parser.add_argument("--legacy", action="store_true", help="Also time the previous list-based scan")
+    args = parser.parse_args()
+    benchmark(args.tasks, args.validators, args.passes, args.legacy)
@@ -0,0 +1,96 @@
+import argparse
+import heapq
+import random
+
+from chatgpt.utils.scheduling import (LARGE_LANE, SMALL_LANE, DeadlineScheduler, ProcessingTimeEstimator)
+
+BLOCK_TIME = 6
+MAX_WAIT_BLOCKS = 100
+
+
+def make_files(num_files, arrival_rate, seed):
+    """
+    Files arrive as a Poisson process, with log-normally distributed sizes (a few MB typically, some exports of
+    hundreds of MB). Processing time grows linearly with size.
+    """
+    rng = random.Random(seed)
+    files = []
+    now = 0.0
+    for file_id in range(1, num_files + 1):
+        now += rng.expovariate(arrival_rate)
+        size = int(min(rng.lognormvariate(15, 1.5), 800e6))
+        duration = (8 + size * 2e-7) * rng.uniform(0.8, 1.2)
+        files.append((now, file_id, size, duration))
+    return files
+
+
+def speed_score(added_at, finished_at):
+    delay_blocks = (finished_at - added_at) / BLOCK_TIME
+    return max(0.0, 1 - delay_blocks / MAX_WAIT_BLOCKS)
+
+
+def simulate(files, lanes, pick, on_done=lambda size, duration: None):
+    """
+    Runs one worker per lane entry. ``pick(lane, now, queued)`` chooses the next file from the queued ones.
+    """
+    workers = [(0.0, i) for i in range(len(lanes))]
+    heapq.heapify(workers)
+    scores = []
+    next_arrival = 0
+    queued = []
+    while len(scores) < len(files):
+        now, worker = heapq.heappop(workers)
+        while next_arrival < len(files) and files[next_arrival][0] <= now:
+            queued.append(files[next_arrival])
+            next_arrival += 1
+        chosen = pick(lanes[worker], now, queued)
+        if chosen is None:
+            # Idle until the next file arrives
+            heapq.heappush(workers, (files[next_arrival][0], worker))
+            continue
+        added_at, _, size, duration = chosen
+        finished_at = now + duration
+        on_done(size, duration)
+        scores.append(speed_score(added_at, finished_at))
+        heapq.heappush(workers, (finished_at, worker))
+    return sum(scores) / len(scores)
+
+
+def fifo(files, workers):
+    def pick(lane, now, queued):
+        return queued.pop(0) if queued else None
+    return simulate(files, [SMALL_LANE] * workers, pick)
+
+
+def scheduled(files, workers):
+    estimator = ProcessingTimeEstimator()
+    scheduler = DeadlineScheduler(estimator, MAX_WAIT_BLOCKS, BLOCK_TIME, large_file_size=50_000_000)
+    by_id = {}
+
+    def pick(lane, now, queued):
+        for file in queued:
+            added_at, file_id, size, _ = file
+            by_id[file_id] = file
+            scheduler.add(file_id, int(added_at / BLOCK_TIME), size)
+        queued.clear()
+        chosen = scheduler.next(lane, int(now / BLOCK_TIME))
+        return by_id.pop(chosen.file_id) if chosen else None
+
+    # One worker is reserved for large files, as the validator does with several concurrent forwards
+    lanes = [SMALL_LANE] * (workers - 1) + [LARGE_LANE] if workers > 1 else [SMALL_LANE]
+    return simulate(files, lanes, pick, on_done=estimator.observe)
+
+
+if __name__ == "__main__":
+    # Compares the average peer speed score of FIFO processing with the deadline-aware scheduler
+    # Usage: poetry run python tests/benchmarks/scheduling.py --workers 3 --rate 0.3
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--rate", type=float, default=0.3, help="Files added per second")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    files = make_files(args.files, args.rate, args.seed)
+    print(f"FIFO:      average speed score {fifo(files, args.workers):.3f}")
+    print(f"Scheduled: average speed score {scheduled(files, args.workers):.3f}")
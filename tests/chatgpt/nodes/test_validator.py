@@ -1,7 +1,22 @@
-import pytest
-from unittest.mock import patch, Mock, AsyncMock
+import asyncio
+import collections
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-from chatgpt.nodes.validator import Validator, PeerScoringTask
+import pytest
+from unittest.mock import patch, Mock, AsyncMock, ANY
+
+from chatgpt.models.contribution import Contribution, ScoreParts
+from chatgpt.nodes.validator import Validator, PeerScoringTask, transform_file_data
+from chatgpt.utils.batch_reads import BatchReader
+from chatgpt.utils.block_clock import BlockClock
+from chatgpt.utils.deadlines import CancelToken, StageTimeout, run_stage
+from chatgpt.utils.file_cache import FileRecordCache
+from chatgpt.utils.journal import FileProcessingJournal, StateJournal
+from chatgpt.utils.peer_scoring import PeerScoringQueue
+from chatgpt.utils.result_cache import ResultCache
+from chatgpt.utils.tracing import Tracer
 from vana.config import Config
 
 
@@ -72,7 +87,7 @@ class MockDLPContract:
         self.file_scores[file_id][validator] = score
 
 @pytest.fixture
-def setup_validator():
+def setup_validator(tmp_path):
     mock_dlp_contract = MockDLPContract()
     mock_chain_manager = MockChainManager(mock_dlp_contract)
 
@@ -97,7 +112,20 @@ def setup_validator():
             self.wallet = mock_wallet
             self.chain_manager = mock_chain_manager  # Directly assign the instance
             self.dlp_contract = mock_dlp_contract
+            self.batch_reader = BatchReader(mock_chain_manager)
+            self.block_clock = BlockClock(mock_chain_manager)
+            self.file_cache = FileRecordCache(self.batch_reader, mock_dlp_contract, transform_file_data)
             self.state = MockState()
+            self.state_lock = threading.RLock()
+            self.state.needs_peer_scoring = PeerScoringQueue(mock_config.node.max_wait_blocks)
+            self.journal = StateJournal(str(tmp_path))
+            self.file_journal = FileProcessingJournal(str(tmp_path))
+            self.result_cache = ResultCache()
+            self.tracer = Tracer(None)
+            self.file_discovery = None
+            self.scheduler = None
+            self.timed_out_files = collections.Counter()
+            self.failed_attempts = collections.Counter()
 
         with patch.object(Validator, '__init__', mock_init):
             validator = Validator()
@@ -108,7 +136,29 @@ def test_record_file_score(setup_validator):
     validator = setup_validator
     validator.record_file_score(1, {"score": 0.8})
     assert len(validator.state.needs_peer_scoring) == 1
-    assert validator.state.needs_peer_scoring[0].file_id == 1
+    assert validator.state.needs_peer_scoring.get(1).file_id == 1
+
+def test_scores_recorded_during_compaction_are_not_lost(setup_validator):
+    validator = setup_validator
+    validator.record_file_score(1, {"score": 0.8})
+    truncate = validator.journal.log.truncate
+    recorder = None
+
+    def truncate_while_recording():
+        nonlocal recorder
+        # The snapshot has been written, a score recorded now must not be emptied from the journal with it
+        recorder = threading.Thread(target=validator.record_file_score, args=(2, {"score": 0.5}))
+        recorder.start()
+        recorder.join(timeout=0.1)
+        truncate()
+
+    with patch.object(validator.journal.log, "truncate", side_effect=truncate_while_recording):
+        validator.compact_journal()
+    recorder.join()
+
+    tasks, _ = validator.journal.replay()
+    assert sorted(task.file_id for task in tasks) == [1, 2]
+
 
 @pytest.mark.asyncio
 @patch('chatgpt.nodes.validator.Validator.update_validator_weights')
@@ -123,6 +173,7 @@ async def test_process_peer_scoring_queue(mock_update_weights, setup_validator):
         1000,                 # addedTimestamp
         100,                  # addedAtBlock
         True,                 # valid
+        False,                # finalized
         int(0.8 * 1e18),      # score
         int(0.9 * 1e18),      # authenticity
         int(1.0 * 1e18),      # ownership
@@ -177,13 +228,131 @@ async def test_process_peer_scoring_queue(mock_update_weights, setup_validator):
         },
         added_at_block=100
     )
-    validator.state.needs_peer_scoring = [task]
+    validator.state.needs_peer_scoring = PeerScoringQueue(validator.config.node.max_wait_blocks, [task])
 
     await validator.process_peer_scoring_queue()
     assert len(validator.state.needs_peer_scoring) == 0
     mock_update_weights.assert_called_once()
     assert validator.chain_manager.read_contract_fn.called
 
+@pytest.mark.asyncio
+@patch('chatgpt.nodes.validator.score_file')
+@patch('chatgpt.nodes.validator.decrypt_file')
+@patch('chatgpt.nodes.validator.download_file')
+async def test_evaluate_file_resumes_from_last_stage(mock_download, mock_decrypt, mock_score, setup_validator):
+    validator = setup_validator
+    journal = validator.file_journal
+    encrypted_file_path = f"{journal.file_dir(1)}/encrypted_file.zip"
+    open(encrypted_file_path, "w").close()
+    journal.record(1, FileProcessingJournal.DOWNLOADED, encrypted_file_path=encrypted_file_path)
+
+    mock_decrypt.return_value = f"{journal.file_dir(1)}/decrypted_file.zip"
+    mock_score.return_value = Contribution(file_id=1, is_valid=True, scores=ScoreParts(quality=0.9))
+
+    contribution = await validator.evaluate_file(1, "url", "key")
+
+    mock_download.assert_not_called()
+    mock_decrypt.assert_called_once_with(encrypted_file_path, "key", journal.file_dir(1), token=ANY, digest=ANY)
+    assert contribution.scores.quality == 0.9
+    assert journal.reached(1, FileProcessingJournal.EVALUATED)
+
+    # Once evaluated, the stored contribution is reused without touching the file again
+    mock_score.reset_mock()
+    assert (await validator.evaluate_file(1, "url", "key")).scores.quality == 0.9
+    mock_score.assert_not_called()
+
+@pytest.mark.asyncio
+@patch('chatgpt.nodes.validator.score_file')
+@patch('chatgpt.nodes.validator.decrypt_file')
+@patch('chatgpt.nodes.validator.download_file')
+async def test_evaluate_file_reuses_result_of_identical_content(mock_download, mock_decrypt, mock_score,
+                                                                 setup_validator):
+    validator = setup_validator
+
+    def download(url, output_dir, token):
+        path = f"{output_dir}/encrypted_file.zip"
+        open(path, "w").close()
+        return path
+
+    def decrypt(encrypted_file_path, key, output_dir, token, digest):
+        digest.update(b"same export")
+        return f"{output_dir}/decrypted_file.zip"
+
+    mock_download.side_effect = download
+    mock_decrypt.side_effect = decrypt
+    mock_score.return_value = Contribution(file_id=1, is_valid=True, scores=ScoreParts(quality=0.9, uniqueness=1.0))
+
+    assert (await validator.evaluate_file(1, "url", "key")).scores.uniqueness == 1.0
+    duplicate = await validator.evaluate_file(2, "url", "key")
+
+    mock_score.assert_called_once()
+    assert duplicate.file_id == 2
+    assert duplicate.scores.quality == 0.9
+    assert duplicate.scores.uniqueness == 0.0
+    assert validator.result_cache.hits == 1
+
+@pytest.mark.asyncio
+@patch('chatgpt.nodes.validator.download_file')
+async def test_evaluate_file_stage_timeout(mock_download, setup_validator):
+    validator = setup_validator
+    validator.config.node.download_timeout = 0.05
+    mock_download.side_effect = lambda url, output_dir, token: time.sleep(1)
+
+    with pytest.raises(StageTimeout) as exc_info:
+        await validator.evaluate_file(1, "url", "key")
+    assert exc_info.value.stage == "download"
+
+@pytest.mark.asyncio
+async def test_forward_counts_timed_out_files(setup_validator):
+    validator = setup_validator
+    validator.next_file_to_verify = AsyncMock(return_value=(1, "owner", "url", "key") + (0,) * 12)
+    validator.evaluate_file = AsyncMock(side_effect=StageTimeout("llm"))
+    validator.file_journal.record(1, FileProcessingJournal.DOWNLOADED, encrypted_file_path="path")
+
+    await validator.forward()
+
+    assert validator.timed_out_files == {"llm": 1}
+    assert validator.file_journal.unfinished() == []
+
+def test_failing_files_are_retried_a_limited_number_of_times(setup_validator):
+    validator = setup_validator
+    validator.config.node.max_file_attempts = 2
+    validator.file_discovery = Mock()
+    validator.file_journal.record(1, FileProcessingJournal.DOWNLOADED, encrypted_file_path="path")
+
+    validator.retry_file(1)
+    validator.file_discovery.add.assert_called_once_with(1)
+
+    validator.retry_file(1)
+    validator.file_discovery.add.assert_called_once_with(1)
+    assert validator.file_journal.unfinished() == []
+    assert validator.failed_attempts == {}
+
+def test_files_whose_score_was_submitted_are_not_retried(setup_validator):
+    validator = setup_validator
+    validator.config.node.max_file_attempts = 2
+    validator.file_discovery = Mock()
+    validator.file_journal.record(1, FileProcessingJournal.SUBMITTED, tx_hash="0x1")
+
+    validator.retry_file(1)
+
+    validator.file_discovery.add.assert_not_called()
+    assert validator.file_journal.get(1)["stage"] == FileProcessingJournal.SUBMITTED
+
+@pytest.mark.asyncio
+async def test_service_waits_do_not_hold_the_stage_threads(setup_validator):
+    validator = setup_validator
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=1))
+    validator.service_waits = ThreadPoolExecutor(max_workers=1)
+    validator.peer_scoring_due = threading.Event()
+
+    waiting = asyncio.create_task(validator.peer_scoring_step())
+    await asyncio.sleep(0.05)
+
+    # The only default executor thread is free for the stage while peer scoring waits for its event
+    assert await run_stage(CancelToken(), "download", 0.5, lambda token: "done") == "done"
+    await waiting
+
 def test_update_validator_weights(setup_validator):
     validator = setup_validator
     validator_scores = {
@@ -198,15 +367,15 @@ def test_update_validator_weights(setup_validator):
 
 @pytest.mark.asyncio
 @patch('chatgpt.nodes.validator.Validator.process_peer_scoring_queue')
-@patch('chatgpt.nodes.validator.Validator.concurrent_forward', new_callable=AsyncMock)
-async def test_run_processes_queue_on_tempo(mock_concurrent_forward, mock_process_queue, setup_validator):
+@patch('chatgpt.nodes.validator.Validator.forward', new_callable=AsyncMock)
+async def test_run_processes_queue_on_tempo(mock_forward, mock_process_queue, setup_validator):
     validator = setup_validator
     validator.sync = Mock()
     validator.should_exit = Mock(side_effect=[False] * 11 + [True])
 
     async def mock_run(self):
         while not self.should_exit():
-            await self.concurrent_forward()
+            await self.forward()
             if self.chain_manager.get_current_block() % self.config.dlp.tempo == 0:
                 await self.process_peer_scoring_queue()
             self.sync()
@@ -216,4 +385,4 @@ async def test_run_processes_queue_on_tempo(mock_concurrent_forward, mock_proces
         await validator.run()
 
     assert mock_process_queue.call_count == 2
-    assert mock_concurrent_forward.call_count == 11
+    assert mock_forward.call_count == 11
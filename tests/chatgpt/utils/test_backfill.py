@@ -0,0 +1,98 @@
+import json
+from unittest.mock import ANY, Mock, patch
+
+import numpy as np
+
+from chatgpt.utils.backfill import UniquenessBackfill
+from chatgpt.utils.fingerprint import FingerprintIndex
+from chatgpt.utils.minhash import NUM_PERM, ConversationIndex
+
+
+def make_backfill(directory, records, **kwargs):
+    batch_reader = Mock()
+    batch_reader.read.side_effect = lambda functions: [records.get(function) for function in functions]
+    dlp_contract = Mock()
+    dlp_contract.functions.files.side_effect = lambda file_id: file_id
+    return UniquenessBackfill(batch_reader, dlp_contract, lambda record: record, FingerprintIndex(),
+                              ConversationIndex(), str(directory / "checkpoint.json"), workers=2, batch_size=2,
+                              **kwargs)
+
+
+def file_record(file_id, valid=True):
+    return {"fileId": file_id, "url": f"https://storage/{file_id}", "encryptedKey": "key", "valid": valid}
+
+
+@patch("chatgpt.utils.backfill.conversation_signatures", return_value=np.ones((2, NUM_PERM), dtype=np.uint32))
+@patch("chatgpt.utils.backfill.fingerprint_zip", side_effect=lambda path: np.ones(128))
+@patch("chatgpt.utils.backfill.decrypt_file", side_effect=lambda path, key, output_dir, token: path)
+@patch("chatgpt.utils.backfill.download_file")
+def test_backfill_indexes_files_and_checkpoints(mock_download, mock_decrypt, mock_fingerprint, mock_signatures,
+                                                tmp_path):
+    def download(url, output_dir, token):
+        if url.endswith("/3"):
+            return None
+        path = f"{output_dir}/encrypted_file.zip"
+        open(path, "w").close()
+        return path
+
+    mock_download.side_effect = download
+    records = {file_id: file_record(file_id) for file_id in [1, 2, 3, 4]}
+    records[6] = file_record(6, valid=False)
+    backfill = make_backfill(tmp_path, records)
+    backfill.fingerprint_index.add(2, np.ones(128))
+    backfill.conversation_index.add(2, np.ones((1, NUM_PERM)))
+
+    backfill.run(6)
+
+    assert backfill.indexed == 2
+    assert backfill.skipped == 1
+    # File 6 was rejected, so later files are not compared against it
+    assert backfill.not_valid == 1
+    assert 6 not in backfill.fingerprint_index
+    mock_download.assert_any_call("https://storage/3", ANY, token=ANY)
+    assert mock_download.call_count == 3
+    # File 3 could not be downloaded and file 5 does not exist
+    assert sorted(backfill.failed) == [3, 5]
+    assert 1 in backfill.fingerprint_index and 4 in backfill.conversation_index
+    with open(tmp_path / "checkpoint.json") as f:
+        assert json.load(f) == {"completed_up_to": 6, "failed": [3, 5]}
+
+    # A resumed run retries the failed files
+    mock_download.side_effect = lambda url, output_dir, token: download(url.replace("/3", "/0"), output_dir, token)
+    backfill.run(6)
+
+    assert 3 in backfill.fingerprint_index
+    with open(tmp_path / "checkpoint.json") as f:
+        assert json.load(f) == {"completed_up_to": 6, "failed": [5]}
+
+
+@patch("chatgpt.utils.backfill.UniquenessBackfill.index_file")
+def test_backfill_resumes_after_the_checkpoint(mock_index_file, tmp_path):
+    with open(tmp_path / "checkpoint.json", "w") as f:
+        json.dump({"completed_up_to": 3, "failed": [2]}, f)
+    backfill = make_backfill(tmp_path, {file_id: file_record(file_id) for file_id in range(1, 7)})
+
+    backfill.run(6)
+
+    # The file that failed before is retried first
+    assert [call.args[0] for call in mock_index_file.call_args_list] == [2, 4, 5, 6]
+    assert backfill.failed == [2]
+
+    mock_index_file.reset_mock()
+    backfill.run(6, resume=False)
+    assert mock_index_file.call_count == 6
+
+
+def test_indexes_search_backfilled_directories(tmp_path):
+    backfill_index = FingerprintIndex(str(tmp_path / "backfill"))
+    index = FingerprintIndex(str(tmp_path / "live"), extra_directories=[str(tmp_path / "backfill")],
+                             refresh_interval=0)
+
+    vector = np.arange(128, dtype=np.float32)
+    backfill_index.add(7, vector)
+
+    assert index.query(vector, k=1)[0][0] == 7
+    assert 7 in index
+    # Already searchable, so it is not added to the live index again
+    assert not index.add(7, vector)
+    assert len(index.store) == 0
@@ -0,0 +1,71 @@
+import json
+import os
+import pytest
+from unittest.mock import Mock
+from eth_abi import encode
+from web3 import Web3
+
+from chatgpt.utils.batch_reads import BatchReader
+
+ABI_PATH = os.path.join(os.path.dirname(__file__), "../../../chatgpt/dlp-implementation-abi.json")
+CONTRACT_ADDRESS = "0xa0519f5ADc4e82729b21Ef1586d397260D9B9E45"
+
+
+@pytest.fixture
+def chain_manager():
+    chain_manager = Mock()
+    chain_manager.web3 = Web3(Web3.HTTPProvider("http://localhost:8545"))
+    return chain_manager
+
+
+@pytest.fixture
+def dlp_contract(chain_manager):
+    with open(ABI_PATH) as f:
+        return chain_manager.web3.eth.contract(address=CONTRACT_ADDRESS, abi=json.load(f))
+
+
+def file_score_result(score):
+    return "0x" + encode(
+        ["(bool,uint256,uint256,uint256,uint256,uint256,uint256)"],
+        [(True, score, 105, 0, 0, 0, 0)]
+    ).hex()
+
+
+def test_read_batches_calls(chain_manager, dlp_contract):
+    reader = BatchReader(chain_manager, batch_size=2)
+    reader.session = Mock()
+    # Answer out of order, with the score set to the fileId argument encoded in the call data
+    reader.session.post.side_effect = lambda url, json, **kwargs: Mock(json=Mock(return_value=[
+        {"jsonrpc": "2.0", "id": request["id"], "result": file_score_result(int(request["params"][0]["data"][10:74], 16))}
+        for request in reversed(json)
+    ]))
+
+    validator = "0x0000000000000000000000000000000000000001"
+    results = reader.read([dlp_contract.functions.fileScores(file_id, validator) for file_id in range(5)])
+
+    assert reader.session.post.call_count == 3
+    assert [result[1] for result in results] == [0, 1, 2, 3, 4]
+    assert results[0][2] == 105
+
+
+def test_read_reports_failed_calls_as_none(chain_manager, dlp_contract):
+    reader = BatchReader(chain_manager)
+    reader.session = Mock()
+    reader.session.post.return_value = Mock(json=Mock(return_value=[
+        {"jsonrpc": "2.0", "id": 0, "error": {"code": -32000, "message": "execution reverted"}},
+        {"jsonrpc": "2.0", "id": 1, "result": "0x" + encode(["uint256"], [7]).hex()},
+    ]))
+
+    results = reader.read([dlp_contract.functions.fileScores(1, CONTRACT_ADDRESS), dlp_contract.functions.filesCount()])
+    assert results == [None, 7]
+
+
+def test_read_falls_back_without_batch_support(chain_manager, dlp_contract):
+    reader = BatchReader(chain_manager)
+    reader.session = Mock()
+    reader.session.post.return_value = Mock(json=Mock(return_value={"error": "batch requests are not supported"}))
+    chain_manager.read_contract_fn = Mock(return_value=3)
+
+    results = reader.read([dlp_contract.functions.filesCount(), dlp_contract.functions.filesCount()])
+    assert results == [3, 3]
+    assert chain_manager.read_contract_fn.call_count == 2
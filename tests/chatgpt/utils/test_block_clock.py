@@ -0,0 +1,44 @@
+from unittest.mock import Mock
+
+from chatgpt.utils.block_clock import BlockClock
+
+
+def test_callbacks_fire_for_skipped_blocks():
+    chain_manager = Mock()
+    chain_manager.get_current_block.return_value = 98
+    clock = BlockClock(chain_manager)
+    seen, tempo = [], []
+    clock.on_block(seen.append)
+    clock.every(10, tempo.append)
+
+    assert clock.block == 98
+
+    # Several blocks are produced between two polls, the tempo boundary must not be missed
+    chain_manager.get_current_block.return_value = 103
+    assert clock.block == 103
+    assert seen == [98, 99, 100, 101, 102, 103]
+    assert tempo == [100]
+
+
+def test_block_never_goes_backwards():
+    chain_manager = Mock()
+    chain_manager.get_current_block.return_value = 50
+    clock = BlockClock(chain_manager)
+    clock.refresh()
+
+    # A lagging RPC node can report an older head
+    chain_manager.get_current_block.return_value = 49
+    assert clock.refresh() == 50
+
+
+def test_started_clock_serves_block_from_memory():
+    chain_manager = Mock()
+    chain_manager.get_current_block.return_value = 7
+    clock = BlockClock(chain_manager, poll_interval=60)
+    clock.start()
+    try:
+        for _ in range(10):
+            assert clock.block == 7
+        assert chain_manager.get_current_block.call_count == 1
+    finally:
+        clock.stop()
@@ -0,0 +1,99 @@
+import json
+import os
+import zipfile
+from unittest.mock import MagicMock, patch
+
+from chatgpt.utils.conversation_store import ConversationResultStore
+from chatgpt.utils.validator import evaluate_chatgpt_zip
+
+EXPORT = os.path.join(os.path.dirname(__file__), "..", "..", "data", "chatgpt_5_conversations.zip")
+
+
+def test_results_are_only_reused_for_the_same_update_time_and_content():
+    store = ConversationResultStore()
+    store.put("a", 1.0, "h1", metrics={"messages": 2})
+    store.put("a", 1.0, "h1", llm_score=80)
+
+    assert store.get("a", 1.0, "h1") == {"conversation_id": "a", "update_time": 1.0, "content_hash": "h1",
+                                         "metrics": {"messages": 2}, "llm_score": 80}
+    assert store.get("a", 2.0, "h1") == {}
+    assert store.get("a", 1.0, "h2") == {}
+    assert store.get("b", 1.0, "h1") == {}
+
+    # An updated conversation replaces what was stored for its earlier version
+    store.put("a", 2.0, "h1", metrics={"messages": 3})
+    assert store.get("a", 1.0, "h1") == {}
+    assert "llm_score" not in store.get("a", 2.0, "h1")
+
+
+def test_results_survive_a_restart_and_superseded_ones_are_dropped(tmp_path):
+    path = str(tmp_path / "conversations.jsonl")
+    store = ConversationResultStore(path)
+    for update_time in range(5):
+        store.put("a", float(update_time), "h", metrics={"messages": update_time})
+    store.close()
+
+    store = ConversationResultStore(path)
+    assert len(store) == 1
+    assert store.get("a", 4.0, "h")["metrics"] == {"messages": 4}
+    with open(path) as f:
+        assert len(f.readlines()) == 1
+
+
+def test_resubmitted_export_reuses_metrics():
+    store = ConversationResultStore()
+    first = evaluate_chatgpt_zip(EXPORT, store=store)
+    second = evaluate_chatgpt_zip(EXPORT, store=store)
+
+    assert first["reused"] == {"conversations": 5, "metrics": 0, "llm_scores": 0}
+    assert second["reused"] == {"conversations": 5, "metrics": 5, "llm_scores": 0}
+    assert second["metadata"] == first["metadata"] == evaluate_chatgpt_zip(EXPORT)["metadata"]
+
+
+@patch.dict("os.environ", {"OPENAI_API_KEY": "key", "OD_CHAIN_NETWORK": "satori"})
+@patch("chatgpt.utils.validator.tiktoken")
+@patch("chatgpt.utils.validator.OpenAI")
+def test_resubmitted_export_reuses_llm_scores(mock_openai, mock_tiktoken):
+    # One token per character, without downloading the real encoding
+    mock_tiktoken.encoding_for_model.return_value.encode.side_effect = list
+    mock_tiktoken.encoding_for_model.return_value.decode.side_effect = "".join
+    response = MagicMock()
+    response.choices[0].message.content = '{"score": 90}'
+    response.usage = None
+    mock_openai.return_value.chat.completions.create.return_value = response
+    store = ConversationResultStore()
+
+    with patch("chatgpt.utils.validator.random.sample", side_effect=lambda data, k: data[:k]):
+        first = evaluate_chatgpt_zip(EXPORT, store=store)
+        requests = mock_openai.return_value.chat.completions.create.call_count
+        second = evaluate_chatgpt_zip(EXPORT, store=store)
+
+    assert first["score"] == second["score"] == 0.9
+    assert second["reused"]["llm_scores"] == 1
+    assert mock_openai.return_value.chat.completions.create.call_count == requests
+
+
+def test_edited_content_under_the_same_ids_is_evaluated_again(tmp_path):
+    store = ConversationResultStore()
+    evaluate_chatgpt_zip(EXPORT, store=store)
+
+    # Same conversation IDs and update times, with the messages of each conversation replaced
+    edited = str(tmp_path / "edited.zip")
+    with zipfile.ZipFile(EXPORT) as source, zipfile.ZipFile(edited, "w") as target:
+        for name in source.namelist():
+            data = source.read(name)
+            if name == "conversations.json":
+                conversations = json.loads(data)
+                for conversation in conversations:
+                    for node in conversation["mapping"].values():
+                        message = (node or {}).get("message") or {}
+                        parts = (message.get("content") or {}).get("parts")
+                        if parts:
+                            message["content"]["parts"] = ["x"]
+                data = json.dumps(conversations)
+            target.writestr(name, data)
+
+    result = evaluate_chatgpt_zip(edited, store=store)
+
+    assert result["reused"] == {"conversations": 5, "metrics": 0, "llm_scores": 0}
+    assert result["metadata"] == evaluate_chatgpt_zip(edited)["metadata"]
@@ -0,0 +1,108 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from chatgpt.utils.deadlines import Cancelled, CancelToken, StageTimeout, run_stage
+
+
+def test_child_deadline_is_bounded_by_the_parent():
+    parent = CancelToken(1)
+    assert parent.child(10).remaining() <= 1
+    assert parent.child(0.1).remaining() <= 0.1
+    assert CancelToken().remaining() is None
+    assert CancelToken().remaining(5) == 5
+
+
+def test_cancelling_the_parent_cancels_children_and_runs_callbacks():
+    parent = CancelToken()
+    child = parent.child(stage="download")
+    closed = []
+    child.on_cancel(lambda: closed.append("connection"))
+
+    parent.cancel(timed_out=True)
+
+    assert closed == ["connection"]
+    assert child.cancelled
+    with pytest.raises(StageTimeout) as exc_info:
+        child.check()
+    assert exc_info.value.stage == "download"
+
+    # Callbacks registered after cancellation run immediately
+    child.on_cancel(lambda: closed.append("process"))
+    assert closed == ["connection", "process"]
+
+
+def test_expired_token_raises_stage_timeout():
+    token = CancelToken(0, stage="decrypt")
+    with pytest.raises(StageTimeout):
+        token.check()
+
+    cancelled = CancelToken()
+    cancelled.cancel()
+    with pytest.raises(Cancelled) as exc_info:
+        cancelled.check()
+    assert not isinstance(exc_info.value, StageTimeout)
+
+
+@pytest.mark.asyncio
+async def test_run_stage_times_out_and_cancels_the_work():
+    released = threading.Event()
+
+    def hung_download(token):
+        token.on_cancel(released.set)
+        time.sleep(5)
+
+    start = time.monotonic()
+    with pytest.raises(StageTimeout) as exc_info:
+        await run_stage(CancelToken(10), "download", 0.05, hung_download)
+
+    assert exc_info.value.stage == "download"
+    assert time.monotonic() - start < 1
+    assert released.is_set()
+
+
+@pytest.mark.asyncio
+async def test_run_stage_can_wait_for_work_that_must_not_be_abandoned():
+    def broadcast(token):
+        time.sleep(0.1)
+        return "0xhash"
+
+    assert await run_stage(CancelToken(10), "submit", 0.05, broadcast, abandon=False) == "0xhash"
+
+
+@pytest.mark.asyncio
+async def test_run_stage_is_bounded_by_the_file_deadline():
+    def slow(token):
+        while True:
+            token.check()
+            time.sleep(0.01)
+
+    with pytest.raises(StageTimeout):
+        await run_stage(CancelToken(0.05), "evaluate", 10, slow)
+
+
+@pytest.mark.asyncio
+async def test_run_stage_passes_arguments_and_token():
+    def stage(a, b, token):
+        assert token.remaining() <= 1
+        return a + b
+
+    assert await run_stage(CancelToken(), "evaluate", 1, stage, 1, b=2) == 3
+
+
+@pytest.mark.asyncio
+async def test_cancelling_the_task_cancels_the_stage():
+    released = threading.Event()
+
+    def hung(token):
+        token.on_cancel(released.set)
+        released.wait(5)
+
+    task = asyncio.create_task(run_stage(CancelToken(), "download", 10, hung))
+    await asyncio.sleep(0.05)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert released.is_set()
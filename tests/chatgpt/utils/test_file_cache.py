@@ -0,0 +1,51 @@
+from unittest.mock import Mock
+
+from chatgpt.utils.file_cache import FileRecordCache
+
+
+def transform(result):
+    file_id, url, verifications_count = result
+    return {"fileId": file_id, "url": url, "addedAtBlock": 10 * file_id, "verificationsCount": verifications_count}
+
+
+def make_cache(path=None):
+    batch_reader = Mock()
+    batch_reader.read.side_effect = lambda functions: [function() for function in functions]
+    contract = Mock()
+    contract.functions.files = lambda file_id: lambda: (file_id, f"url_{file_id}", 1) if file_id < 100 else (0, "", 0)
+    return FileRecordCache(batch_reader, contract, transform, path), batch_reader
+
+
+def test_immutable_fields_are_read_once():
+    cache, batch_reader = make_cache()
+
+    assert cache.get_many([1, 2], block=5, fields=["addedAtBlock"]) == {
+        1: {"fileId": 1, "url": "url_1", "addedAtBlock": 10, "verificationsCount": 1},
+        2: {"fileId": 2, "url": "url_2", "addedAtBlock": 20, "verificationsCount": 1},
+    }
+    assert cache.get(1, block=6, fields=["addedAtBlock", "url"]) == {"fileId": 1, "url": "url_1", "addedAtBlock": 10}
+    assert batch_reader.read.call_count == 1
+
+
+def test_mutable_fields_are_read_again_in_a_new_block():
+    cache, batch_reader = make_cache()
+
+    cache.get(1, block=5)
+    cache.get(1, block=5)
+    assert batch_reader.read.call_count == 1
+    assert cache.get(1, block=6)["verificationsCount"] == 1
+    assert batch_reader.read.call_count == 2
+
+
+def test_immutable_fields_are_persisted(tmp_path):
+    path = str(tmp_path / "file-records.jsonl")
+    cache, _ = make_cache(path)
+    cache.get_many([1, 100], block=5)
+    cache.close()
+
+    cache, batch_reader = make_cache(path)
+    assert cache.get(1, block=7, fields=["addedAtBlock"])["addedAtBlock"] == 10
+    batch_reader.read.assert_not_called()
+    # Files that did not exist yet are not cached
+    cache.get(100, block=7, fields=["addedAtBlock"])
+    assert batch_reader.read.call_count == 1
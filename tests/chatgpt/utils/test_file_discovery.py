@@ -0,0 +1,89 @@
+import json
+import os
+import pytest
+from unittest.mock import Mock
+from eth_abi import encode
+from eth_utils import event_abi_to_log_topic
+from hexbytes import HexBytes
+from web3 import Web3
+
+from chatgpt.utils.events import ContractEventFollower
+from chatgpt.utils.file_discovery import FileDiscovery
+
+ABI_PATH = os.path.join(os.path.dirname(__file__), "../../../chatgpt/dlp-implementation-abi.json")
+CONTRACT_ADDRESS = "0xa0519f5ADc4e82729b21Ef1586d397260D9B9E45"
+VALIDATOR = "0x0000000000000000000000000000000000000001"
+OTHER_VALIDATOR = "0x0000000000000000000000000000000000000002"
+
+
+class MockChain:
+    def __init__(self, contract):
+        self.contract = contract
+        self.logs = []
+        self.get_logs_calls = []
+
+    def emit(self, block_number, event_name, indexed, data_types, data):
+        event_abi = getattr(self.contract.events, event_name)().abi
+        self.logs.append({
+            "address": CONTRACT_ADDRESS,
+            "topics": [HexBytes(event_abi_to_log_topic(event_abi))] + [HexBytes(encode(["address"], [a])) for a in indexed],
+            "data": HexBytes(encode(data_types, data)),
+            "blockNumber": block_number,
+            "blockHash": HexBytes(b"\x00" * 32),
+            "transactionHash": HexBytes(b"\x00" * 32),
+            "transactionIndex": 0,
+            "logIndex": len(self.logs),
+        })
+
+    def get_logs(self, params):
+        self.get_logs_calls.append((params["fromBlock"], params["toBlock"]))
+        return [log for log in self.logs if params["fromBlock"] <= log["blockNumber"] <= params["toBlock"]]
+
+
+@pytest.fixture
+def setup_discovery():
+    web3 = Web3()
+    with open(ABI_PATH) as f:
+        contract = web3.eth.contract(address=CONTRACT_ADDRESS, abi=json.load(f))
+    chain = MockChain(contract)
+    chain_manager = Mock()
+    chain_manager.web3.eth.get_logs = Mock(side_effect=chain.get_logs)
+    follower = ContractEventFollower(chain_manager, contract, start_block=100, max_block_range=10)
+    return chain, follower, FileDiscovery(follower, VALIDATOR)
+
+
+def test_file_added_events_are_queued_in_order(setup_discovery):
+    chain, follower, discovery = setup_discovery
+    chain.emit(101, "FileAdded", [OTHER_VALIDATOR], ["uint256"], [8])
+    chain.emit(103, "FileAdded", [OTHER_VALIDATOR], ["uint256"], [7])
+
+    assert follower.poll(105) == 2
+    assert discovery.next_file_id(timeout=0) == 7
+    assert discovery.next_file_id(timeout=0) == 8
+    assert discovery.next_file_id(timeout=0) is None
+
+
+def test_own_verifications_are_removed(setup_discovery):
+    chain, follower, discovery = setup_discovery
+    chain.emit(101, "FileAdded", [OTHER_VALIDATOR], ["uint256"], [1])
+    chain.emit(101, "FileAdded", [OTHER_VALIDATOR], ["uint256"], [2])
+    chain.emit(102, "FileVerified", [OTHER_VALIDATOR], ["uint256", "uint256"], [1, 0])
+    chain.emit(102, "FileVerified", [VALIDATOR], ["uint256", "uint256"], [2, 0])
+
+    discarded = []
+    discovery.on_discard(discarded.append)
+
+    follower.poll(102)
+    assert len(discovery) == 1
+    assert discovery.next_file_id(timeout=0) == 1
+    # Listeners, like the scheduler, drop the file too
+    assert discarded == [2]
+
+
+def test_poll_is_incremental(setup_discovery):
+    chain, follower, discovery = setup_discovery
+    follower.poll(125)
+    follower.poll(125)
+    follower.poll(126)
+
+    assert chain.get_logs_calls == [(100, 109), (110, 119), (120, 125), (126, 126)]
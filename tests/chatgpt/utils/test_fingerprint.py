@@ -0,0 +1,107 @@
+import os
+import zipfile
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from chatgpt.utils.fingerprint import FeatureHasher, FingerprintIndex, feature_hash_string, fingerprint_zip
+from chatgpt.utils.minhash import ConversationIndex
+from chatgpt.utils.proof_of_contribution import index_validated_file, proof_of_uniqueness, uniqueness_fingerprints
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "data")
+
+
+def unit(*values):
+    vector = np.zeros(128, dtype=np.float32)
+    vector[:len(values)] = values
+    return vector
+
+
+def test_query_returns_most_similar_first():
+    index = FingerprintIndex(segment_rows=2)
+    index.add(1, unit(1, 0))
+    index.add(2, unit(1, 1))
+    index.add(3, unit(0, 1))
+
+    matches = index.query(unit(1, 0.1), k=2)
+    assert [file_id for file_id, _ in matches] == [1, 2]
+    assert matches[0][1] == pytest.approx(1 / np.sqrt(1.01))
+    assert len(index.query(unit(1, 0), k=10)) == 3
+
+
+def test_query_excludes_the_file_itself_and_ignores_duplicates():
+    index = FingerprintIndex()
+    assert index.add(1, unit(1, 0))
+    assert not index.add(1, unit(0, 1))
+    index.add(2, unit(0, 1))
+
+    assert index.query(unit(1, 0), k=1, exclude=1) == [(2, 0.0)]
+    assert index.max_similarity(unit(1, 0), exclude=1) == 0.0
+    assert FingerprintIndex().max_similarity(unit(1, 0)) == 0.0
+
+
+def test_index_is_reloaded(tmp_path):
+    index = FingerprintIndex(str(tmp_path), segment_rows=2)
+    index.add(1, unit(1, 0))
+    index.add(2, unit(0, 1))
+    index.add(3, unit(1, 1))
+    index.close()
+
+    reloaded = FingerprintIndex(str(tmp_path), segment_rows=2)
+    assert len(reloaded) == 3
+    assert 2 in reloaded
+    assert not reloaded.add(3, unit(1, 1))
+    reloaded.add(4, unit(1, 2))
+    assert reloaded.query(unit(1, 1), k=1)[0][0] == 3
+    assert reloaded.query(unit(1, 2), k=1)[0][0] == 4
+
+
+def test_proof_of_uniqueness_detects_resubmitted_exports(tmp_path):
+    index = FingerprintIndex(str(tmp_path))
+    with patch('chatgpt.utils.proof_of_contribution.get_fingerprint_index', return_value=index), \
+            patch('chatgpt.utils.proof_of_contribution.get_conversation_index',
+                  return_value=ConversationIndex(str(tmp_path))):
+        original_path = os.path.join(DATA_DIR, "chatgpt_1_conversation.zip")
+        original = proof_of_uniqueness(original_path, file_id=1)
+        # Scoring a file does not index it, only validating it does
+        assert len(index) == 0
+        index_validated_file(1, *uniqueness_fingerprints(original_path))
+        # Scoring the same file again does not compare it with itself
+        rescored = proof_of_uniqueness(original_path, file_id=1)
+        similar = proof_of_uniqueness(os.path.join(DATA_DIR, "chatgpt_1_conversation_similar.zip"), file_id=2)
+
+    assert original == rescored == 1.0
+    assert similar < 0.01
+    assert len(index) == 1
+
+
+def test_fingerprint_is_normalized():
+    fingerprint = fingerprint_zip(os.path.join(DATA_DIR, "chatgpt_5_conversations.zip"))
+    assert fingerprint.dtype == np.float32
+    assert np.linalg.norm(fingerprint) == pytest.approx(1)
+
+
+def test_chunked_hashing_matches_hashing_the_whole_text():
+    text = "Ünïcode words split across chunks, repeated words words and a_very_long_identifier " * 50
+    expected = feature_hash_string(text)
+    data = text.encode()
+
+    for chunk_size in [1, 5, 64, 1000]:
+        hasher = FeatureHasher()
+        for start in range(0, len(data), chunk_size):
+            hasher.update(data[start:start + chunk_size])
+        assert np.allclose(hasher.fingerprint(), expected, atol=1e-6)
+
+
+def test_zip_members_are_hashed_in_extracted_directory_order(tmp_path):
+    zip_path = tmp_path / "export.zip"
+    with zipfile.ZipFile(zip_path, "w") as zip_ref:
+        zip_ref.writestr("b/nested.txt", "delta ")
+        zip_ref.writestr("z.txt", "beta ")
+        zip_ref.writestr("a.txt", "alpha ")
+        zip_ref.writestr("b/c/deep.txt", "gamma")
+
+    # os.walk with sorting visits a.txt, z.txt, then b/nested.txt and b/c/deep.txt
+    expected = feature_hash_string("alpha beta delta gamma")
+    assert np.allclose(fingerprint_zip(str(zip_path), chunk_size=3), expected, atol=1e-6)
@@ -0,0 +1,74 @@
+from chatgpt.utils.journal import FileProcessingJournal, StateJournal
+from chatgpt.utils.peer_scoring import PeerScoringQueue, PeerScoringTask
+
+VALIDATORS = ["validator_1", "validator_2"]
+
+
+def make_task(file_id):
+    return PeerScoringTask(file_id=file_id, active_validators=list(VALIDATORS), own_submission={"score": 0.5},
+                           added_at_block=100)
+
+
+def test_replay_restores_pending_tasks_and_weights(tmp_path):
+    journal = StateJournal(str(tmp_path))
+    for file_id in (1, 2, 3):
+        journal.task_added(make_task(file_id))
+    journal.validator_processed(1, "validator_1")
+    journal.validator_processed(2, "validator_1")
+    journal.validator_processed(2, "validator_2")
+    journal.task_expired(3)
+    journal.weight_set("validator_1", 0.4)
+    journal.weight_set("validator_1", 0.6)
+    journal.close()
+
+    tasks, weights = StateJournal(str(tmp_path)).replay()
+
+    assert [task.file_id for task in tasks] == [1]
+    assert tasks[0].processed_validators == ["validator_1"]
+    assert weights == {"validator_1": 0.6}
+
+
+def test_compact_folds_journal_into_snapshot(tmp_path):
+    journal = StateJournal(str(tmp_path))
+    queue = PeerScoringQueue(max_wait_blocks=5, tasks=[make_task(1)])
+    journal.task_added(queue.get(1))
+    journal.compact(queue, {"validator_2": 0.3})
+    assert journal.log.size == 0
+
+    journal.task_added(make_task(2))
+    journal.close()
+
+    tasks, weights = StateJournal(str(tmp_path)).replay()
+    assert [task.file_id for task in tasks] == [1, 2]
+    assert weights == {"validator_2": 0.3}
+
+
+def test_replay_ignores_a_truncated_last_record(tmp_path):
+    journal = StateJournal(str(tmp_path))
+    journal.task_added(make_task(1))
+    journal.close()
+    with open(journal.log.path, "a") as f:
+        f.write('{"op": "task", "ta')
+
+    journal = StateJournal(str(tmp_path))
+    journal.task_added(make_task(2))
+    journal.close()
+
+    tasks, _ = StateJournal(str(tmp_path)).replay()
+    assert [task.file_id for task in tasks] == [1, 2]
+
+
+def test_file_journal_drops_finished_files_on_reopen(tmp_path):
+    journal = FileProcessingJournal(str(tmp_path))
+    journal.record(1, FileProcessingJournal.DOWNLOADED, encrypted_file_path="/tmp/1")
+    journal.record(1, FileProcessingJournal.SUBMITTED, tx_hash="0x1")
+    journal.record(2, FileProcessingJournal.EVALUATED, contribution={"file_id": 2, "is_valid": True})
+    journal.record(2, FileProcessingJournal.CONFIRMED)
+    journal.close()
+
+    journal = FileProcessingJournal(str(tmp_path))
+    assert journal.unfinished() == [1]
+    assert journal.get(1) == {"file_id": 1, "stage": "submitted", "encrypted_file_path": "/tmp/1", "tx_hash": "0x1"}
+    assert journal.reached(1, FileProcessingJournal.DOWNLOADED)
+    assert not journal.reached(2, FileProcessingJournal.DOWNLOADED)
+    assert journal.log.size == 1
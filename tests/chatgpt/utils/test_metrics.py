@@ -0,0 +1,86 @@
+import threading
+import urllib.request
+
+import pytest
+
+from chatgpt.utils.metrics import Counter, Gauge, Histogram, MetricsRegistry, MetricsServer
+
+
+def test_render_uses_the_prometheus_text_format():
+    registry = MetricsRegistry()
+    files = Counter("files_total", "Files by outcome", ["outcome"], registry=registry)
+    depth = Gauge("queue_depth", "Queue depth", registry=registry)
+    files.labels(outcome="submitted").inc(2)
+    files.labels(outcome="error").inc()
+    depth.set_function(lambda: 7)
+
+    lines = registry.render().splitlines()
+
+    assert lines[:2] == ["# HELP files_total Files by outcome", "# TYPE files_total counter"]
+    assert 'files_total{outcome="submitted"} 2' in lines
+    assert 'files_total{outcome="error"} 1' in lines
+    assert "# TYPE queue_depth gauge" in lines
+    assert "queue_depth 7" in lines
+
+
+def test_histogram_buckets_are_cumulative_and_inclusive():
+    registry = MetricsRegistry()
+    latency = Histogram("latency_seconds", "Latency", ["stage"], registry=registry, buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 5):
+        latency.labels(stage="download").observe(value)
+
+    lines = registry.render().splitlines()
+
+    assert 'latency_seconds_bucket{stage="download",le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{stage="download",le="1"} 3' in lines
+    assert 'latency_seconds_bucket{stage="download",le="+Inf"} 4' in lines
+    assert 'latency_seconds_sum{stage="download"} 5.65' in lines
+    assert 'latency_seconds_count{stage="download"} 4' in lines
+
+
+def test_counter_adds_up_the_updates_of_every_thread():
+    counter = Counter("events_total", "Events")
+
+    def work():
+        for _ in range(10000):
+            counter.inc()
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert counter.value == 40000
+
+
+def test_values_of_exited_threads_are_folded_together():
+    registry = MetricsRegistry()
+    histogram = Histogram("latency_seconds", "Latency", registry=registry, buckets=(1,))
+
+    for _ in range(20):
+        thread = threading.Thread(target=histogram.observe, args=(0.5,))
+        thread.start()
+        thread.join()
+
+    assert len(histogram._values._cells) == 0
+    assert "latency_seconds_count 20" in registry.render().splitlines()
+
+
+def test_registering_a_name_twice_is_rejected():
+    registry = MetricsRegistry()
+    Counter("events_total", "Events", registry=registry)
+    with pytest.raises(ValueError):
+        Counter("events_total", "Events", registry=registry)
+
+
+def test_server_serves_the_registry():
+    registry = MetricsRegistry()
+    Counter("events_total", "Events", registry=registry).inc(3)
+    server = MetricsServer(0, registry=registry).start()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics", timeout=5) as response:
+            assert response.headers["Content-Type"].startswith("text/plain")
+            assert "events_total 3" in response.read().decode()
+    finally:
+        server.stop()
@@ -0,0 +1,62 @@
+import os
+
+import numpy as np
+
+from chatgpt.utils.minhash import (ConversationIndex, conversation_signatures, conversation_texts,
+                                   minhash_signatures)
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "data")
+
+TEXT = ("Can you help me plan a three day trip to Lisbon in spring with a focus on food markets, "
+        "old neighbourhoods and a day trip to Sintra")
+
+
+def test_signatures_estimate_jaccard_similarity():
+    edited = TEXT.replace("three day", "four day")
+    unrelated = "What is the time complexity of building a binary heap from an unsorted array of integers"
+    original, near_duplicate, other = minhash_signatures([TEXT, edited, unrelated])
+
+    assert (original == minhash_signatures([TEXT])[0]).all()
+    assert (original == near_duplicate).mean() > 0.6
+    assert (original == other).mean() < 0.1
+
+
+def test_index_finds_near_duplicate_conversations():
+    rng = np.random.default_rng(0)
+    indexed = rng.integers(0, 2 ** 32, (100, 64), dtype=np.uint32)
+    index = ConversationIndex(segment_rows=50)
+    index.add(1, indexed[:60])
+    index.add(2, indexed[60:])
+
+    # Half of the new export's conversations were already seen, with a few signature rows changed
+    seen = indexed[[5, 70]].copy()
+    seen[:, :4] = 0
+    new = rng.integers(0, 2 ** 32, (2, 64), dtype=np.uint32)
+    signatures = np.concatenate((seen, new))
+
+    similarities = index.similarities(signatures)
+    assert (similarities[:2] > 0.9).all()
+    assert (similarities[2:] == 0).all()
+    assert index.duplicate_fraction(signatures) == 0.5
+    assert index.duplicate_fraction(signatures, exclude=1) == 0.25
+    assert index.duplicate_fraction(signatures[:0]) == 0.0
+
+
+def test_index_is_reloaded_and_ignores_duplicate_files(tmp_path):
+    signatures = conversation_signatures(os.path.join(DATA_DIR, "chatgpt_5_conversations.zip"))
+    index = ConversationIndex(str(tmp_path))
+    assert index.add(1, signatures)
+    assert not index.add(1, signatures)
+    index.close()
+
+    reloaded = ConversationIndex(str(tmp_path))
+    assert len(reloaded) == len(signatures) == 5
+    assert 1 in reloaded
+    single = conversation_signatures(os.path.join(DATA_DIR, "chatgpt_1_conversation.zip"))
+    assert reloaded.duplicate_fraction(single) == 1.0
+
+
+def test_conversation_texts_include_titles_and_messages():
+    texts = conversation_texts(os.path.join(DATA_DIR, "chatgpt_1_conversation.zip"))
+    assert len(texts) == 1
+    assert len(texts[0].split()) > 10
@@ -0,0 +1,51 @@
+from chatgpt.utils.peer_scoring import PeerScoringQueue, PeerScoringTask
+
+VALIDATORS = ["validator_1", "validator_2", "validator_3"]
+
+
+def make_task(file_id, added_at_block=100):
+    return PeerScoringTask(file_id=file_id, active_validators=list(VALIDATORS), own_submission={"score": 0.5},
+                           added_at_block=added_at_block)
+
+
+def test_task_is_removed_once_all_validators_are_processed():
+    queue = PeerScoringQueue(max_wait_blocks=5, tasks=[make_task(1)])
+    assert queue.pending_count == 3
+
+    for validator in VALIDATORS:
+        queue.mark_processed(1, validator)
+
+    assert len(queue) == 0
+    assert queue.pending_count == 0
+
+
+def test_expire_returns_only_pending_pairs_past_their_deadline():
+    queue = PeerScoringQueue(max_wait_blocks=5, tasks=[make_task(1, 100), make_task(2, 110)])
+    queue.mark_processed(1, "validator_1")
+
+    assert queue.expire(104) == []
+    assert queue.expire(105) == [(1, "validator_2"), (1, "validator_3")]
+    assert 1 not in queue
+    assert 2 in queue
+    assert queue.get(2).processed_validators == []
+
+
+def test_event_driven_queue_only_checks_reported_pairs():
+    queue = PeerScoringQueue(max_wait_blocks=5, event_driven=True)
+    queue.add(make_task(1))
+
+    # Every pair is checked once when the task is added
+    assert len(queue.pairs_to_check()) == 3
+    assert queue.pairs_to_check() == []
+
+    queue.mark_reported(1, "validator_2")
+    queue.mark_reported(2, "validator_2")
+    assert queue.pairs_to_check() == [(1, "validator_2")]
+
+
+def test_processed_validators_are_not_pending_again():
+    task = make_task(1)
+    task.processed_validators = ["validator_1", "validator_2"]
+    queue = PeerScoringQueue(max_wait_blocks=5, tasks=[task])
+
+    assert queue.pairs_to_check() == [(1, "validator_3")]
@@ -1,6 +1,8 @@
 import pytest
-from unittest.mock import Mock, patch, mock_open, call
-from chatgpt.utils.proof_of_contribution import proof_of_contribution, download_and_decrypt_file
+from unittest.mock import MagicMock, Mock, patch, mock_open, call
+from chatgpt.utils.deadlines import CancelToken, StageTimeout
+from chatgpt.utils.proof_of_contribution import (proof_of_contribution, download_and_decrypt_file, download_file,
+                                                 score_file)
 
 @pytest.fixture
 def mock_file_content():
@@ -16,12 +18,15 @@ def mock_encryption_key():
 
 @pytest.mark.asyncio
 @patch('chatgpt.utils.proof_of_contribution.download_and_decrypt_file')
+@patch('chatgpt.utils.proof_of_contribution.get_conversation_store')
 @patch('chatgpt.utils.proof_of_contribution.evaluate_chatgpt_zip')
 @patch('chatgpt.utils.proof_of_contribution.proof_of_ownership')
 @patch('chatgpt.utils.proof_of_contribution.proof_of_uniqueness')
 @patch('chatgpt.utils.proof_of_contribution.proof_of_authenticity')
 @patch('chatgpt.utils.proof_of_contribution.os.remove')
-async def test_proof_of_contribution(mock_remove, mock_authenticity, mock_uniqueness, mock_ownership, mock_evaluate, mock_download, mock_file_content):
+@patch('chatgpt.utils.proof_of_contribution.uniqueness_fingerprints', return_value=('fingerprint', 'signatures'))
+@patch('chatgpt.utils.proof_of_contribution.index_validated_file')
+async def test_proof_of_contribution(mock_index, mock_fingerprints, mock_remove, mock_authenticity, mock_uniqueness, mock_ownership, mock_evaluate, mock_store, mock_download, mock_file_content):
     # Setup mock returns
     mock_download.return_value = 'mock_file_path'
     mock_evaluate.return_value = {
@@ -43,11 +48,37 @@ async def test_proof_of_contribution(mock_remove, mock_authenticity, mock_unique
 
     # Check that all mocks are called correctly
     mock_download.assert_called_once_with('mock_url', 'mock_key')
-    mock_evaluate.assert_called_once_with('mock_file_path')
+    mock_evaluate.assert_called_once_with('mock_file_path', token=None, llm_timeout=None,
+                                          store=mock_store.return_value)
     mock_ownership.assert_called_once_with('mock_file_path')
-    mock_uniqueness.assert_called_once_with('mock_file_path')
+    mock_uniqueness.assert_called_once_with('mock_file_path', file_id=1, fingerprints=('fingerprint', 'signatures'))
     mock_authenticity.assert_called_once_with('mock_file_path')
     mock_remove.assert_called_once_with('mock_file_path')
+    mock_index.assert_called_once_with(1, 'fingerprint', 'signatures')
+
+@patch('chatgpt.utils.proof_of_contribution.get_conversation_store')
+@patch('chatgpt.utils.proof_of_contribution.evaluate_chatgpt_zip', return_value={"score": 0.2})
+@patch('chatgpt.utils.proof_of_contribution.proof_of_uniqueness', return_value=1.0)
+@patch('chatgpt.utils.proof_of_contribution.uniqueness_fingerprints', return_value=('fingerprint', 'signatures'))
+@patch('chatgpt.utils.proof_of_contribution.index_validated_file')
+def test_invalid_files_are_not_indexed(mock_index, mock_fingerprints, mock_uniqueness, mock_evaluate, mock_store):
+    contribution = score_file(1, 'mock_file_path')
+
+    assert contribution.is_valid is False
+    mock_index.assert_not_called()
+
+@patch('chatgpt.utils.proof_of_contribution.get_conversation_store')
+@patch('chatgpt.utils.proof_of_contribution.evaluate_chatgpt_zip', return_value={"score": 0.8})
+@patch('chatgpt.utils.proof_of_contribution.proof_of_uniqueness', return_value=1.0)
+@patch('chatgpt.utils.proof_of_contribution.uniqueness_fingerprints', return_value=('fingerprint', 'signatures'))
+@patch('chatgpt.utils.proof_of_contribution.get_fingerprint_index',
+       side_effect=RuntimeError("Another process is writing to the index"))
+def test_indexing_failures_do_not_fail_the_file(mock_index, mock_fingerprints, mock_uniqueness, mock_evaluate,
+                                                mock_store):
+    contribution = score_file(1, 'mock_file_path')
+
+    assert contribution.is_valid is True
+    mock_index.assert_called_once()
 
 @patch.dict('os.environ', {'PRIVATE_FILE_ENCRYPTION_PUBLIC_KEY_BASE64': 'mock_private_key'})
 @patch('chatgpt.utils.proof_of_contribution.tempfile.mkdtemp')
@@ -59,7 +90,8 @@ def test_download_and_decrypt_file(mock_b64decode, mock_open, mock_gpg, mock_get
                                    mock_file_content, mock_decrypted_content, mock_encryption_key):
     # Set up mocks
     mock_mkdtemp.return_value = '/mock/temp/dir'
-    mock_response = Mock(status_code=200, content=mock_file_content)
+    mock_response = MagicMock(status_code=200)
+    mock_response.iter_content.return_value = [mock_file_content]
     mock_get.return_value = mock_response
     mock_gpg_instance = Mock()
     mock_gpg_instance.decrypt.return_value = Mock(data=b'mock_symmetric_key')
@@ -72,7 +104,7 @@ def test_download_and_decrypt_file(mock_b64decode, mock_open, mock_gpg, mock_get
 
     # Assertions
     assert result.endswith('decrypted_file.bin')
-    mock_get.assert_called_once_with('mock_url')
+    mock_get.assert_called_once_with('mock_url', stream=True, timeout=None)
     mock_gpg.assert_called_once()
     mock_gpg_instance.import_keys.assert_called_once()
     mock_gpg_instance.decrypt.assert_called_once()
@@ -83,6 +115,38 @@ def test_download_and_decrypt_file(mock_b64decode, mock_open, mock_gpg, mock_get
         call('mock_private_key')
     ])
 
+@patch('chatgpt.utils.proof_of_contribution.requests.get')
+def test_download_file_streams_chunks(mock_get, tmp_path):
+    mock_response = MagicMock(status_code=200)
+    mock_response.iter_content.return_value = [b'first', b'second']
+    mock_get.return_value = mock_response
+
+    path = download_file('https://storage/file.zip', str(tmp_path), token=CancelToken(10))
+
+    with open(path, 'rb') as f:
+        assert f.read() == b'firstsecond'
+    assert mock_get.call_args.kwargs["stream"] is True
+    assert 0 < mock_get.call_args.kwargs["timeout"] <= 10
+
+@patch('chatgpt.utils.proof_of_contribution.requests.get')
+def test_cancelled_download_closes_the_connection_and_removes_the_partial_file(mock_get, tmp_path):
+    token = CancelToken(stage="download")
+
+    def chunks():
+        yield b'first'
+        token.cancel(timed_out=True)
+        yield b'second'
+
+    mock_response = MagicMock(status_code=200)
+    mock_response.iter_content.return_value = chunks()
+    mock_get.return_value = mock_response
+
+    with pytest.raises(StageTimeout):
+        download_file('https://storage/file.zip', str(tmp_path), token=token)
+
+    mock_response.close.assert_called()
+    assert list(tmp_path.iterdir()) == []
+
 # TODO: Fix this test. @patch.dict('os.environ', {}) is not clearing os.environ
 # @patch.dict('os.environ', {})
 # @patch('chatgpt.utils.proof_of_contribution.tempfile.mkdtemp')
@@ -0,0 +1,85 @@
+import json
+from unittest.mock import Mock
+
+import requests
+from web3 import Web3
+
+from chatgpt.utils.providers import ProviderPool, TokenBucket
+
+
+def make_response(status_code=200, result="0x1", error=None):
+    response = Mock(status_code=status_code)
+    body = {"jsonrpc": "2.0", "id": 0}
+    body.update({"error": error} if error else {"result": result})
+    response.json.return_value = body
+    response.content = json.dumps(body).encode()
+    return response
+
+
+def make_pool(*behaviours):
+    """
+    Builds a pool where each endpoint's session answers with the given callable.
+    """
+    pool = ProviderPool([f"http://rpc{i}" for i in range(len(behaviours))])
+    for endpoint, behaviour in zip(pool.endpoints, behaviours):
+        endpoint.session.post = Mock(side_effect=behaviour)
+    return pool
+
+
+def test_fails_over_on_rate_limit_and_skips_the_endpoint():
+    pool = make_pool(lambda *a, **kw: make_response(429), lambda *a, **kw: make_response(result="0x5"))
+    w3 = Web3(pool)
+
+    assert w3.eth.chain_id == 5
+    assert w3.eth.chain_id == 5
+    first, second = pool.endpoints
+    assert first.session.post.call_count == 1
+    assert second.session.post.call_count == 2
+    assert not first.available
+
+
+def test_rate_limit_json_rpc_errors_fail_over_but_other_errors_do_not():
+    limited = make_pool(lambda *a, **kw: make_response(error={"code": -32005, "message": "limit exceeded"}),
+                        lambda *a, **kw: make_response(result="0x5"))
+    assert limited.make_request("eth_chainId", [])["result"] == "0x5"
+
+    reverted = make_pool(lambda *a, **kw: make_response(error={"code": 3, "message": "execution reverted"}),
+                         lambda *a, **kw: make_response(result="0x5"))
+    assert reverted.make_request("eth_call", [])["error"]["code"] == 3
+
+
+def test_reads_prefer_the_fastest_endpoint():
+    pool = make_pool(lambda *a, **kw: make_response(), lambda *a, **kw: make_response())
+    slow, fast = pool.endpoints
+    slow.latency, fast.latency = 0.5, 0.1
+
+    pool.make_request("eth_blockNumber", [])
+    assert fast.session.post.call_count == 1
+    assert slow.session.post.call_count == 0
+
+
+def test_transactions_stay_pinned_until_the_endpoint_fails():
+    def connection_error(*args, **kwargs):
+        raise requests.ConnectionError("down")
+
+    pool = make_pool(lambda *a, **kw: make_response(), lambda *a, **kw: make_response())
+    primary, secondary = pool.endpoints
+    primary.latency, secondary.latency = 0.5, 0.1
+
+    pool.make_request("eth_getTransactionCount", ["0x0", "pending"])
+    assert primary.session.post.call_count == 1
+
+    primary.session.post.side_effect = connection_error
+    pool.make_request("eth_sendRawTransaction", ["0x0"])
+    assert pool.endpoint_uri == secondary.uri
+
+
+def test_token_bucket_spaces_out_requests(monkeypatch):
+    clock = {"now": 0.0}
+    monkeypatch.setattr("chatgpt.utils.providers.time.monotonic", lambda: clock["now"])
+    monkeypatch.setattr("chatgpt.utils.providers.time.sleep", lambda seconds: clock.update(now=clock["now"] + seconds))
+
+    bucket = TokenBucket(rate=10, capacity=2)
+    for _ in range(4):
+        bucket.acquire()
+    assert abs(clock["now"] - 0.2) < 1e-9
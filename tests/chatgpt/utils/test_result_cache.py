@@ -0,0 +1,48 @@
+import hashlib
+
+from chatgpt.models.contribution import Contribution, ScoreParts
+from chatgpt.utils.result_cache import EMPTY_SHA256, ResultCache, sha256_file
+
+
+def make_contribution(file_id):
+    return Contribution(file_id=file_id, is_valid=True, scores=ScoreParts(quality=0.8, uniqueness=0.6))
+
+
+def test_copies_reuse_the_first_result_without_uniqueness():
+    cache = ResultCache()
+    assert cache.lookup("abc", 1) is None
+    assert cache.put("abc", make_contribution(1))
+    assert not cache.put("abc", make_contribution(2))
+
+    duplicate = cache.lookup("abc", 2)
+    assert duplicate.file_id == 2
+    assert duplicate.scores.quality == 0.8
+    assert duplicate.scores.uniqueness == 0.0
+
+    # The same file scored again keeps its own uniqueness
+    assert cache.lookup("abc", 1).scores.uniqueness == 0.6
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_results_survive_a_restart(tmp_path):
+    path = str(tmp_path / "results.jsonl")
+    cache = ResultCache(path)
+    cache.put("abc", make_contribution(1), evaluated_at=123.0)
+    cache.close()
+
+    cache = ResultCache(path)
+    assert "abc" in cache
+    assert cache.get("abc")["evaluated_at"] == 123.0
+    assert cache.lookup("abc", 2).scores.quality == 0.8
+
+
+def test_empty_content_is_not_cached():
+    cache = ResultCache()
+    assert not cache.put(EMPTY_SHA256, make_contribution(1))
+    assert cache.lookup(EMPTY_SHA256, 2) is None
+
+
+def test_sha256_file(tmp_path):
+    path = tmp_path / "file"
+    path.write_bytes(b"x" * 3000)
+    assert sha256_file(str(path), chunk_size=1000) == hashlib.sha256(b"x" * 3000).hexdigest()
@@ -0,0 +1,58 @@
+import asyncio
+import threading
+
+import pytest
+
+from chatgpt.utils.runtime import ServiceRunner
+
+
+@pytest.mark.asyncio
+async def test_services_run_independently_and_failures_are_restarted():
+    runner = ServiceRunner(restart_delay=0.01)
+    calls = {"fast": 0, "flaky": 0}
+
+    async def fast():
+        calls["fast"] += 1
+        await asyncio.sleep(0.001)
+
+    async def flaky():
+        calls["flaky"] += 1
+        if calls["flaky"] < 3:
+            raise RuntimeError("boom")
+        await asyncio.sleep(0.001)
+
+    async def slow():
+        # Never finishes a step, and must not hold up the other services
+        await asyncio.sleep(3600)
+
+    runner.add("fast", fast)
+    runner.add("flaky", flaky)
+    runner.add("slow", slow)
+    runner.shutdown_timeout = 0.05
+
+    task = asyncio.create_task(runner.run())
+    await asyncio.sleep(0.2)
+    runner.stop()
+    await asyncio.wait_for(task, timeout=1)
+
+    assert calls["fast"] > 10
+    assert calls["flaky"] > 3
+
+
+@pytest.mark.asyncio
+async def test_stop_from_another_thread_lets_the_current_step_finish():
+    runner = ServiceRunner()
+    finished = []
+
+    async def step():
+        await asyncio.sleep(0.05)
+        finished.append(True)
+
+    runner.add("step", step)
+    task = asyncio.create_task(runner.run())
+    await asyncio.sleep(0.01)
+    threading.Thread(target=runner.stop).start()
+    await asyncio.wait_for(task, timeout=1)
+
+    assert finished == [True]
+    assert runner.stopping
@@ -0,0 +1,86 @@
+import pytest
+
+from chatgpt.utils.scheduling import LARGE_LANE, SMALL_LANE, DeadlineScheduler, ProcessingTimeEstimator
+
+
+def make_scheduler(large_file_size=1000):
+    # 1 second plus 1 second per 100 bytes, 10 blocks of 6 seconds to report
+    estimator = ProcessingTimeEstimator(overhead=1, seconds_per_byte=0.01)
+    return DeadlineScheduler(estimator, max_wait_blocks=10, block_time=6, large_file_size=large_file_size)
+
+
+def test_smallest_files_come_first():
+    scheduler = make_scheduler()
+    scheduler.add(1, added_at_block=0, size=500)
+    scheduler.add(2, added_at_block=0, size=100)
+    scheduler.add(3, added_at_block=0, size=300)
+
+    assert [scheduler.next(SMALL_LANE, 0).file_id for _ in range(3)] == [2, 3, 1]
+    assert scheduler.next(SMALL_LANE, 0) is None
+
+
+def test_files_that_would_miss_the_deadline_go_last_oldest_first():
+    scheduler = make_scheduler()
+    scheduler.add(1, added_at_block=0, size=100)
+    scheduler.add(2, added_at_block=5, size=200)
+    scheduler.add(3, added_at_block=8, size=900)
+
+    # At block 8, file 1 has 12s left and takes 2s, file 3 has 60s left and takes 10s, file 2 has 42s and takes 3s
+    assert scheduler.next(SMALL_LANE, 8).file_id == 1
+    # At block 14, file 2 has 6s left and takes 3s, file 3 has 24s left and takes 10s
+    assert scheduler.next(SMALL_LANE, 14).file_id == 2
+    scheduler.add(4, added_at_block=0, size=50)
+    # File 4 can no longer make it and waits behind file 3
+    assert scheduler.next(SMALL_LANE, 14).file_id == 3
+    assert scheduler.next(SMALL_LANE, 14).file_id == 4
+
+
+def test_large_files_have_their_own_lane():
+    scheduler = make_scheduler(large_file_size=1000)
+    scheduler.add(1, added_at_block=0, size=5000)
+    scheduler.add(2, added_at_block=0, size=100)
+    scheduler.add(3, added_at_block=0, size=200)
+
+    assert scheduler.next(LARGE_LANE, 0).file_id == 1
+    assert scheduler.next(SMALL_LANE, 0).file_id == 2
+    # The large lane is empty, so its worker helps with small files
+    assert scheduler.next(LARGE_LANE, 0).file_id == 3
+
+
+def test_discarded_and_duplicate_files_are_skipped():
+    scheduler = make_scheduler()
+    scheduler.add(1, added_at_block=0, size=100, data="first")
+    scheduler.add(1, added_at_block=0, size=100, data="second")
+    scheduler.add(2, added_at_block=0, size=200)
+    scheduler.discard(1)
+
+    assert len(scheduler) == 1
+    assert 1 not in scheduler
+    assert scheduler.next(SMALL_LANE, 0).file_id == 2
+
+
+def test_unknown_sizes_count_as_average():
+    scheduler = make_scheduler()
+    scheduler.add(1, added_at_block=0, size=100)
+    scheduler.add(2, added_at_block=0, size=500)
+    scheduler.add(3, added_at_block=0, size=None)
+
+    assert [scheduler.next(SMALL_LANE, 0).file_id for _ in range(3)] == [1, 3, 2]
+
+
+def test_wait_next_times_out_when_nothing_is_scheduled():
+    scheduler = make_scheduler()
+    assert scheduler.wait_next(SMALL_LANE, lambda: 0, timeout=0.01) is None
+
+
+def test_estimator_learns_processing_time_from_completed_files():
+    estimator = ProcessingTimeEstimator(overhead=10, seconds_per_byte=1e-6)
+    scheduler = DeadlineScheduler(estimator, max_wait_blocks=10, block_time=6)
+    for file_id, size in enumerate([1_000_000, 5_000_000, 20_000_000, 2_000_000], start=1):
+        scheduler.add(file_id, added_at_block=0, size=size)
+        scheduled = scheduler.next(SMALL_LANE, 0)
+        scheduler.completed(scheduled.file_id, 5 + scheduled.size * 2e-7)
+
+    assert estimator.overhead == pytest.approx(5)
+    assert estimator.seconds_per_byte == pytest.approx(2e-7)
+    assert estimator.estimate(10_000_000) == pytest.approx(7)
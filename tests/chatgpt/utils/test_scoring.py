@@ -0,0 +1,63 @@
+import random
+
+import pytest
+
+from chatgpt.utils.scoring import DIMENSIONS, PerformanceBatch, exponential_moving_average
+
+MAX_WAIT_BLOCKS = 100
+
+
+def reference_score(own_submission, validator_score, file_data):
+    # The per-pair computation that score_validator_performance used to do
+    initial_weights = {'score': 50, 'authenticity': 10, 'ownership': 10, 'quality': 10, 'uniqueness': 10, 'speed': 10}
+    weights = {k: v for k, v in initial_weights.items() if k in own_submission or k == 'speed'}
+    total_weight = sum(weights.values())
+    weights = {k: v / total_weight for k, v in weights.items()}
+
+    scores = {}
+    for dimension in DIMENSIONS:
+        if dimension in own_submission and dimension in validator_score:
+            scores[dimension] = 1 - abs(own_submission[dimension] - validator_score[dimension])
+        else:
+            scores[dimension] = 0 if dimension in own_submission else 1
+
+    block_difference = validator_score['reportedAtBlock'] - file_data['addedAtBlock']
+    scores['speed'] = max(0, 1 - block_difference / MAX_WAIT_BLOCKS) if block_difference >= 0 else 0
+    return sum(weights[k] * scores[k] for k in weights)
+
+
+def random_submission(rng, dimensions):
+    return {dimension: rng.random() for dimension in dimensions}
+
+
+def test_batch_matches_per_pair_scoring():
+    rng = random.Random(0)
+    batch = PerformanceBatch(MAX_WAIT_BLOCKS)
+    expected = []
+    for i in range(200):
+        own = random_submission(rng, rng.sample(DIMENSIONS, rng.randint(1, len(DIMENSIONS))))
+        peer = random_submission(rng, rng.sample(DIMENSIONS, rng.randint(0, len(DIMENSIONS))))
+        peer["reportedAtBlock"] = rng.randint(0, 250)
+        file_data = {"addedAtBlock": rng.randint(0, 200)}
+        batch.add(f"validator_{i % 7}", own, peer, file_data)
+        expected.append(reference_score(own, peer, file_data))
+
+    assert batch.scores() == pytest.approx(expected)
+
+
+def test_missed_reports_score_zero_and_are_averaged_per_validator():
+    batch = PerformanceBatch(MAX_WAIT_BLOCKS)
+    submission = {"score": 0.5, "reportedAtBlock": 100}
+    batch.add("validator_1", submission, submission, {"addedAtBlock": 100})
+    batch.add_missed("validator_1")
+    batch.add("validator_2", submission, submission, {"addedAtBlock": 100})
+
+    assert batch.mean_by_validator() == pytest.approx({"validator_1": 0.5, "validator_2": 1.0})
+    grouped = batch.scores_by_validator()
+    assert grouped["validator_1"].tolist() == pytest.approx([1.0, 0.0])
+    assert grouped["validator_2"].tolist() == pytest.approx([1.0])
+
+
+def test_exponential_moving_average():
+    updated = exponential_moving_average({"validator_1": 1.0}, {"validator_1": 0.0, "validator_2": 1.0}, alpha=0.25)
+    assert updated == pytest.approx({"validator_1": 0.75, "validator_2": 0.25})
@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+
+from chatgpt.utils.segments import SegmentIds, SegmentStore
+
+
+def make_store(directory, **kwargs):
+    kwargs.setdefault("background_compaction", False)
+    return SegmentStore(directory, "test", width=2, dtype=np.float32, segment_rows=2, fanout=2, **kwargs)
+
+
+def rows_of(store):
+    segments = store.segments()
+    return np.concatenate([segment.ids for segment in segments]).tolist(), np.concatenate(
+        [segment.rows for segment in segments])
+
+
+def test_full_segments_are_sealed_and_memory_mapped(tmp_path):
+    store = make_store(str(tmp_path))
+    store.append([1, 2, 3], np.arange(6).reshape(3, 2))
+
+    sealed, active = store.segments()
+    assert isinstance(sealed.rows, np.memmap)
+    assert sealed.ids.tolist() == [1, 2]
+    assert active.ids.tolist() == [3]
+    assert len(store) == 3
+
+
+def test_store_is_reloaded_and_drops_partial_rows(tmp_path):
+    store = make_store(str(tmp_path))
+    store.append([1, 2, 3], np.arange(6).reshape(3, 2))
+    store.close()
+
+    # Simulate a crash in the middle of appending to the active segment
+    active_rows = next(tmp_path.glob("test-active-*.rows"))
+    with open(active_rows, "ab") as f:
+        f.write(b"\0" * 3)
+
+    reloaded = make_store(str(tmp_path))
+    ids, rows = rows_of(reloaded)
+    assert ids == [1, 2, 3]
+    assert rows.tolist() == [[0, 1], [2, 3], [4, 5]]
+    reloaded.append([4], [[6, 7]])
+    assert rows_of(reloaded)[0] == [1, 2, 3, 4]
+
+
+def test_compaction_merges_segments_of_the_same_tier(tmp_path):
+    store = make_store(str(tmp_path))
+    store.append(np.arange(8), np.arange(16).reshape(8, 2))
+    assert [len(segment) for segment in store.segments()] == [2, 2, 2, 2]
+
+    assert store.compact() == 3
+    assert [len(segment) for segment in store.segments()] == [8]
+    assert rows_of(store)[0] == list(range(8))
+
+    # Merged inputs are deleted, only the merged segment and the active segment remain
+    names = {path.name.split(".")[0] for path in tmp_path.iterdir()
+             if "manifest" not in path.name and not path.name.endswith(".lock")}
+    assert len(names) == 2
+
+    store.close()
+    reloaded = make_store(str(tmp_path))
+    assert rows_of(reloaded)[1].tolist() == np.arange(16).reshape(8, 2).tolist()
+
+
+def test_readonly_store_sees_rows_added_by_the_writer(tmp_path):
+    writer = make_store(str(tmp_path))
+    writer.append([1], [[1, 1]])
+    reader = make_store(str(tmp_path), readonly=True)
+    assert rows_of(reader)[0] == [1]
+
+    writer.append([2, 3], [[2, 2], [3, 3]])
+    writer.compact()
+    assert reader.refresh()
+    assert rows_of(reader)[0] == [1, 2, 3]
+
+
+def test_directory_has_a_single_writer(tmp_path):
+    writer = make_store(str(tmp_path))
+    with pytest.raises(RuntimeError):
+        make_store(str(tmp_path))
+
+    writer.close()
+    make_store(str(tmp_path)).close()
+
+
+def test_extras_are_stored_with_each_segment(tmp_path):
+    def build_extras(ids, rows):
+        return {"order": np.argsort(ids)}
+
+    store = make_store(str(tmp_path), build_extras=build_extras)
+    store.append([5, 4, 3], np.zeros((3, 2)))
+    store.close()
+
+    sealed, active = make_store(str(tmp_path), build_extras=build_extras).segments()
+    assert sealed.extras["order"].tolist() == [1, 0]
+    assert active.extras["order"].tolist() == [0]
+
+
+def test_only_new_and_active_segments_are_read_again(tmp_path):
+    store = make_store(str(tmp_path))
+    segment_ids = SegmentIds([store])
+    store.append([1, 1, 2], np.zeros((3, 2)))
+
+    assert [ids.tolist() for ids in segment_ids.new_ids()] == [[1], [2]]
+    assert store.segments()[0].extras["unique_ids"].tolist() == [1]
+
+    # Sealed segments are read once, the active one each time as it may have grown
+    store.append([3], np.zeros((1, 2)))
+    assert [ids.tolist() for ids in segment_ids.new_ids()] == [[2, 3]]
+    store.append([4], np.zeros((1, 2)))
+    assert [ids.tolist() for ids in segment_ids.new_ids()] == [[4]]
+    assert [ids.tolist() for ids in segment_ids.new_ids()] == [[4]]
+
+    store.compact()
+    assert [ids.tolist() for ids in segment_ids.new_ids()] == [[1, 2, 3], [4]]
+    store.close()
+
+
+def test_in_memory_store():
+    store = make_store(None)
+    store.append(np.arange(5), np.arange(10).reshape(5, 2))
+    store.compact()
+    assert rows_of(store)[0] == [0, 1, 2, 3, 4]
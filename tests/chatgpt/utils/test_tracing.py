@@ -0,0 +1,102 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from chatgpt.utils.deadlines import CancelToken, run_stage
+from chatgpt.utils.tracing import STATUS_ERROR, SpanExporter, Tracer, span, traced
+
+
+def read_spans(path):
+    spans = []
+    with open(path) as f:
+        for line in f:
+            for resource_spans in json.loads(line)["resourceSpans"]:
+                for scope_spans in resource_spans["scopeSpans"]:
+                    spans.extend(scope_spans["spans"])
+    return spans
+
+
+def attributes(otlp_span):
+    return {attribute["key"]: next(iter(attribute["value"].values())) for attribute in otlp_span["attributes"]}
+
+
+@traced()
+def proof_of_something(token=None):
+    with span("inner", rows=3):
+        return 1.0
+
+
+def test_spans_in_stage_threads_are_nested_in_the_file_trace(tmp_path):
+    path = str(tmp_path / "traces.jsonl")
+    tracer = Tracer(SpanExporter(path), sample_rate=1.0)
+
+    async def verify():
+        with tracer.trace("verify_file", file_id=7):
+            return await run_stage(CancelToken(), "evaluate", None, proof_of_something)
+
+    assert asyncio.run(verify()) == 1.0
+    tracer.close()
+
+    spans = {s["name"]: s for s in read_spans(path)}
+    assert set(spans) == {"verify_file", "evaluate", "proof_of_something", "inner"}
+    assert len({s["traceId"] for s in spans.values()}) == 1
+    assert "parentSpanId" not in spans["verify_file"]
+    assert spans["evaluate"]["parentSpanId"] == spans["verify_file"]["spanId"]
+    assert spans["proof_of_something"]["parentSpanId"] == spans["evaluate"]["spanId"]
+    assert spans["inner"]["parentSpanId"] == spans["proof_of_something"]["spanId"]
+    assert attributes(spans["inner"]) == {"file_id": "7", "rows": "3"}
+    assert int(spans["inner"]["endTimeUnixNano"]) >= int(spans["inner"]["startTimeUnixNano"])
+
+
+def test_only_sampled_or_slow_files_are_exported(tmp_path):
+    path = str(tmp_path / "traces.jsonl")
+    exporter = SpanExporter(path)
+
+    with Tracer(exporter, sample_rate=0.0).trace("verify_file", file_id=1):
+        pass
+    with Tracer(exporter, sample_rate=0.0, slow_seconds=0).trace("verify_file", file_id=2):
+        pass
+    exporter.close()
+
+    assert [attributes(s)["file_id"] for s in read_spans(path)] == ["2"]
+
+
+def test_failed_spans_record_the_error(tmp_path):
+    path = str(tmp_path / "traces.jsonl")
+    tracer = Tracer(SpanExporter(path), sample_rate=1.0)
+
+    with pytest.raises(ValueError):
+        with tracer.trace("verify_file", file_id=1):
+            with span("parse"):
+                raise ValueError("bad export")
+    tracer.close()
+
+    spans = {s["name"]: s for s in read_spans(path)}
+    assert spans["parse"]["status"] == {"code": STATUS_ERROR, "message": "ValueError: bad export"}
+    assert spans["verify_file"]["status"]["code"] == STATUS_ERROR
+
+
+def test_spans_outside_a_trace_are_not_recorded():
+    with span("parse") as parse_span:
+        assert parse_span is None
+    with Tracer(None).trace("verify_file", file_id=1) as root:
+        assert root is None
+
+
+def test_the_file_is_rotated(tmp_path):
+    path = str(tmp_path / "traces.jsonl")
+    exporter = SpanExporter(path, max_bytes=1000, backup_count=2)
+    tracer = Tracer(exporter, sample_rate=1.0)
+
+    for file_id in range(20):
+        with tracer.trace("verify_file", file_id=file_id):
+            pass
+        exporter.flush()
+    tracer.close()
+
+    assert os.path.getsize(path) <= 1000
+    assert os.path.exists(f"{path}.1") and os.path.exists(f"{path}.2")
+    assert not os.path.exists(f"{path}.3")
+    assert attributes(read_spans(path)[-1])["file_id"] == "19"
@@ -0,0 +1,165 @@
+import pytest
+from unittest.mock import Mock
+from web3.exceptions import TransactionNotFound
+
+from chatgpt.utils.deadlines import CancelToken, StageTimeout
+from chatgpt.utils.transactions import TransactionManager
+
+
+class MockEth:
+    def __init__(self, chain_nonce=5):
+        self.chain_nonce = chain_nonce
+        self.gas_price = 100
+        self.sent = []
+        self.receipts = {}
+        self.send_errors = []
+        self.account = Mock()
+        self.account.sign_transaction = Mock(side_effect=self._sign)
+
+    def _sign(self, tx, private_key=None):
+        signed = Mock()
+        signed.rawTransaction = tx
+        signed.hash = bytes([tx["nonce"], len(self.sent)])
+        return signed
+
+    def get_transaction_count(self, address, block_identifier="latest"):
+        return self.chain_nonce
+
+    def send_raw_transaction(self, raw_tx):
+        if self.send_errors:
+            raise self.send_errors.pop(0)
+        self.sent.append(raw_tx)
+        return bytes([raw_tx["nonce"], len(self.sent) - 1])
+
+    def get_transaction_receipt(self, tx_hash):
+        if tx_hash not in self.receipts:
+            raise TransactionNotFound(tx_hash)
+        return self.receipts[tx_hash]
+
+    def mine(self):
+        for tx in self.sent:
+            self.receipts[bytes([tx["nonce"], self.sent.index(tx)]).hex()] = {"status": 1}
+        self.chain_nonce = max(tx["nonce"] for tx in self.sent) + 1
+
+
+class MockChainManager:
+    def __init__(self):
+        self.web3 = Mock()
+        self.web3.eth = MockEth()
+        self.web3.to_wei = lambda value, unit: value
+
+
+def mock_function():
+    function = Mock()
+    function.estimate_gas = Mock(return_value=21000)
+    function.build_transaction = Mock(side_effect=lambda params: dict(params))
+    return function
+
+
+@pytest.fixture
+def tx_manager():
+    account = Mock()
+    account.address = "validator_1"
+    account.key = "key"
+    return TransactionManager(MockChainManager(), account, replace_after=60)
+
+
+def test_submit_pipelines_transactions(tx_manager):
+    eth = tx_manager.web3.eth
+    txs = [tx_manager.submit(mock_function()) for _ in range(3)]
+
+    assert [tx.nonce for tx in txs] == [5, 6, 7]
+    assert tx_manager.pending_count == 3
+    assert len(eth.sent) == 3
+
+
+def test_poll_collects_receipts(tx_manager):
+    on_receipt = Mock()
+    tx_manager.submit(mock_function(), on_receipt=on_receipt)
+    tx_manager.submit(mock_function())
+
+    tx_manager.poll()
+    assert tx_manager.pending_count == 2
+
+    tx_manager.web3.eth.mine()
+    tx_manager.poll()
+    assert tx_manager.pending_count == 0
+    on_receipt.assert_called_once()
+    assert on_receipt.call_args[0][0].succeeded
+
+
+def test_resyncs_nonce_on_conflict(tx_manager):
+    eth = tx_manager.web3.eth
+    tx_manager.submit(mock_function())
+
+    # Another process used the next nonces behind our back
+    eth.chain_nonce = 9
+    eth.send_errors.append(ValueError("nonce too low"))
+    tx = tx_manager.submit(mock_function())
+
+    assert tx.nonce == 9
+    assert tx_manager.pending_count == 2
+
+
+def test_replaces_stuck_transaction(tx_manager):
+    eth = tx_manager.web3.eth
+    tx = tx_manager.submit(mock_function())
+    original_hash = tx.tx_hash
+    tx.submitted_at -= 120
+
+    tx_manager.poll()
+
+    assert tx.replacements == 1
+    assert tx.tx_hash != original_hash
+    assert tx.gas_price == 120
+    assert eth.sent[-1]["nonce"] == tx.nonce
+
+
+def test_already_known_transaction_is_tracked_without_a_new_nonce(tx_manager):
+    eth = tx_manager.web3.eth
+    on_receipt = Mock()
+
+    # A previous send reached the node, e.g. through another endpoint after a timeout
+    eth.send_errors.append(ValueError("already known"))
+    tx = tx_manager.submit(mock_function(), on_receipt=on_receipt)
+
+    assert tx.nonce == 5
+    assert tx_manager.pending_count == 1
+    assert eth.sent == []
+    assert tx_manager.submit(mock_function()).nonce == 6
+
+    eth.receipts[tx.tx_hash] = {"status": 1}
+    tx_manager.poll()
+    on_receipt.assert_called_once()
+
+
+def test_replacements_keep_the_value_and_give_up_after_the_budget(tx_manager):
+    eth = tx_manager.web3.eth
+    on_receipt = Mock()
+    tx = tx_manager.submit(mock_function(), on_receipt=on_receipt, value=3)
+
+    for _ in range(tx_manager.max_replacements):
+        tx.submitted_at -= 120
+        tx_manager.poll()
+        assert eth.sent[-1]["value"] == 3
+    assert tx.replacements == tx_manager.max_replacements
+    assert tx_manager.pending_count == 1
+
+    tx.submitted_at -= 120
+    tx_manager.poll()
+
+    assert tx_manager.pending_count == 0
+    on_receipt.assert_called_once()
+    assert on_receipt.call_args[0][0].receipt is None
+
+
+def test_submit_gives_up_waiting_for_the_mempool_before_broadcasting(tx_manager):
+    tx_manager.max_pending = 1
+    tx_manager.poll_interval = 0.01
+    tx_manager.submit(mock_function())
+
+    with pytest.raises(StageTimeout):
+        tx_manager.submit(mock_function(), token=CancelToken(0.05, stage="submit"))
+
+    assert len(tx_manager.web3.eth.sent) == 1
+    assert tx_manager.pending_count == 1
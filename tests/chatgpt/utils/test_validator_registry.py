@@ -0,0 +1,64 @@
+from unittest.mock import Mock
+
+from chatgpt.utils.validator_registry import ValidatorRegistry
+
+
+class MockFunctions:
+    def __init__(self):
+        self.validators = ["validator_1", "validator_2"]
+
+    def activeValidatorsListsCount(self):
+        return lambda: 1
+
+    def activeValidatorsLists(self, _):
+        return lambda: list(self.validators)
+
+
+def make_registry(ttl=300):
+    contract = Mock()
+    contract.functions = MockFunctions()
+    chain_manager = Mock()
+    chain_manager.read_contract_fn = Mock(side_effect=lambda function: function())
+    return ValidatorRegistry(chain_manager, contract, ttl=ttl), contract, chain_manager
+
+
+def test_validators_are_read_once_until_invalidated():
+    registry, contract, chain_manager = make_registry()
+
+    assert registry.validators() == ["validator_1", "validator_2"]
+    assert "validator_1" in registry
+    assert chain_manager.read_contract_fn.call_count == 2
+
+    contract.functions.validators.append("validator_3")
+    assert "validator_3" not in registry
+    registry.invalidate()
+    assert "validator_3" in registry
+    assert chain_manager.read_contract_fn.call_count == 4
+
+
+def test_expired_cache_is_refreshed():
+    registry, _, chain_manager = make_registry(ttl=0)
+    registry.validators()
+    registry.validators()
+    assert chain_manager.read_contract_fn.call_count == 4
+
+
+def test_failed_refresh_keeps_previous_list():
+    registry, _, chain_manager = make_registry()
+    registry.validators()
+
+    chain_manager.read_contract_fn.side_effect = lambda function: None
+    registry.invalidate()
+    assert registry.validators() == ["validator_1", "validator_2"]
+
+
+def test_validator_events_invalidate_the_cache():
+    registry, _, _ = make_registry()
+    follower = Mock()
+    registry.follow(follower)
+    registry.validators()
+
+    subscribed = {call.args[0]: call.args[1] for call in follower.subscribe.call_args_list}
+    assert "ValidatorRegistered" in subscribed
+    subscribed["ValidatorDeregistered"]({"args": {"validatorAddress": "validator_2"}})
+    assert registry._stale
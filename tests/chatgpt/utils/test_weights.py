@@ -0,0 +1,48 @@
+from chatgpt.utils.weights import WeightPublisher
+
+
+def test_publishes_only_when_change_reaches_threshold():
+    publisher = WeightPublisher(threshold=0.1, max_interval=100)
+    publisher.load(["validator_1", "validator_2"], [0.5, 0.5], block=10)
+
+    assert not publisher.should_publish({"validator_1": 0.5, "validator_2": 0.5}, 20)
+    assert not publisher.should_publish({"validator_1": 0.55, "validator_2": 0.47}, 20)
+    assert publisher.should_publish({"validator_1": 0.65, "validator_2": 0.5}, 20)
+    # New validators count as a change from 0
+    assert publisher.should_publish({"validator_1": 0.5, "validator_2": 0.5, "validator_3": 0.2}, 20)
+
+
+def test_small_changes_are_published_after_max_interval():
+    publisher = WeightPublisher(threshold=0.1, max_interval=100)
+    publisher.load(["validator_1"], [0.5], block=10)
+    weights = {"validator_1": 0.51}
+
+    assert not publisher.should_publish(weights, 109)
+    assert publisher.should_publish(weights, 110)
+
+
+def test_one_publication_in_flight_and_failures_are_retried():
+    publisher = WeightPublisher(threshold=0.1, max_interval=100)
+    weights = {"validator_1": 0.5}
+
+    assert publisher.should_publish(weights, 10)
+    publisher.started(weights, 10)
+    assert not publisher.should_publish(weights, 11)
+
+    publisher.finished(False)
+    assert publisher.should_publish(weights, 12)
+    publisher.started(weights, 12)
+    publisher.finished(True)
+    assert publisher.published == weights
+    assert not publisher.should_publish(weights, 13)
+
+
+def test_partial_payload_only_contains_changed_entries():
+    weights = {"validator_1": 0.5, "validator_2": 0.7}
+
+    publisher = WeightPublisher(partial=True)
+    publisher.load(["validator_1", "validator_2"], [0.5, 0.5])
+    assert publisher.payload(weights) == (["validator_2"], [0.7])
+
+    publisher.partial = False
+    assert publisher.payload(weights) == (["validator_1", "validator_2"], [0.5, 0.7])
@@ -1,41 +1,8 @@
 import os
-import tempfile
-import zipfile
 
-from sklearn.feature_extraction.text import HashingVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.preprocessing import normalize
 
-
-def get_file_contents_as_string(directory):
-    """
-    Returns the contents of all files in a directory as a single, deterministic string
-    """
-    contents = []
-
-    for root, dirs, files in sorted(os.walk(directory)):
-        dirs.sort()
-        files.sort()
-
-        for file in files:
-            file_path = os.path.join(root, file)
-            with open(file_path, 'rb') as f:
-                contents.append(f.read())
-
-    return b"".join(contents).decode('utf-8', errors='ignore')
-
-
-def feature_hash_string(s, n_features=128):
-    """
-    Hashes a string into a fixed-size feature vector
-    :param s: String to hash
-    :param n_features: Higher number captures more details but increases the hash size.
-    :return:
-    """
-    vectorizer = HashingVectorizer(n_features=n_features, norm=None, alternate_sign=False)
-    hashed = vectorizer.transform([s])
-    hashed_normalized = normalize(hashed, norm='l2')
-    return hashed_normalized.toarray()[0]
+from chatgpt.utils.fingerprint import fingerprint_zip
 
 
 def calculate_similarity(hash1, hash2):
@@ -49,15 +16,9 @@ def calculate_similarity(hash1, hash2):
 
 
 def generate_feature_hash(zip_relative_path):
+    # Streams the zip members into the hashing vectorizer, without extracting them
     zip_path = os.path.join(os.getcwd(), zip_relative_path)
-
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(tmpdirname)
-
-        file_contents = get_file_contents_as_string(tmpdirname)
-        hash = feature_hash_string(file_contents)
-        return hash
+    return fingerprint_zip(zip_path)
 
 
 if __name__ == "__main__":